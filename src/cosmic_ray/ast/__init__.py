@@ -2,13 +2,19 @@
 
 import io
 from abc import ABC, abstractmethod
+from bisect import bisect_right
 from pathlib import Path
 
 import parso.python.tree
 import parso.tree
+from parso.utils import split_lines
 
+from cosmic_ray.ast.cache import ParseCache
 from cosmic_ray.util import read_python_source
 
+# The ParseCache used by `get_ast`, if any.
+_parse_cache = None
+
 
 class Visitor(ABC):
     """AST visitor for parso trees.
@@ -77,12 +83,52 @@ def get_ast_from_path(module_path: Path):
 def get_ast(source: str):
     """Parse the AST for a code string.
 
+    If a parse cache has been installed with `use_parse_cache`, the tree is taken from (or added to) that cache.
+
     Args:
         code (str): _description_
     """
+    if _parse_cache is not None:
+        return _parse_cache.parse(source)
     return parso.parse(source)
 
 
+def use_parse_cache(cache: ParseCache = None):
+    """Install the parse cache used by `get_ast` in this process.
+
+    Args:
+        cache: The `ParseCache` to use, or `None` to disable caching.
+    """
+    global _parse_cache  # pylint: disable=global-statement
+    _parse_cache = cache
+
+
+def parse_cache():
+    """The parse cache currently installed in this process, or `None`."""
+    return _parse_cache
+
+
+class LineOffsets:
+    """Conversion between parso `(line, column)` positions and offsets into a source string."""
+
+    def __init__(self, source: str):
+        self._line_starts = []
+        offset = 0
+        for line in split_lines(source, keepends=True):
+            self._line_starts.append(offset)
+            offset += len(line)
+
+    def offset(self, position):
+        "The offset in the source of a `(line, column)` position."
+        line, column = position
+        return self._line_starts[line - 1] + column
+
+    def position(self, offset):
+        "The `(line, column)` position of an offset in the source."
+        line_index = bisect_right(self._line_starts, offset) - 1
+        return line_index + 1, offset - self._line_starts[line_index]
+
+
 def is_none(node):
     "Determine if a node is the `None` keyword."
     return isinstance(node, parso.python.tree.Keyword) and node.value == "None"
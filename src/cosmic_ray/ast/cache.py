@@ -0,0 +1,159 @@
+"""An on-disk cache of parso parse trees.
+
+Parsing is one of the more expensive parts of both initializing a session and of running each job, and the same
+modules are parsed over and over again. A `ParseCache` stores pickled parse trees in a directory, keyed by a hash of
+the source code together with the parso and Python versions (since the tree depends on both). Because the key only
+depends on the source, a single cache directory can be shared by `init` and by any number of workers.
+
+The cache is bounded in size. When it grows beyond its limit, the least recently used entries are removed until it
+is comfortably below the limit again, so that the directory only needs to be scanned occasionally rather than on every
+write.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+
+import parso
+from attrs import define, field
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# The fraction of `max_size` that eviction reduces the cache to.
+_LOW_WATER = 0.9
+
+_SUFFIX = ".tree"
+
+
+@define
+class ParseCache:
+    """A size-bounded, on-disk cache of parse trees.
+
+    The size of the cache is measured when the first entry is written and then tracked as entries are added, so the
+    directory is only scanned again when the tracked size exceeds `max_size`. Entries written by other processes
+    sharing the directory are only noticed at that point, so the limit is approximate when the cache is shared.
+
+    Args:
+        directory: The directory in which cache entries are stored. It is created if necessary.
+        max_size: The maximum total size (bytes) of the cache entries.
+    """
+
+    directory: Path = field(converter=Path)
+    max_size: int = field(default=DEFAULT_MAX_SIZE, converter=int)
+    _size: int = field(default=None, init=False, eq=False, repr=False)
+
+    def parse(self, source: str):
+        """Get the parse tree for `source`, parsing and storing it if it's not in the cache."""
+        tree = self.get(source)
+        if tree is None:
+            tree = parso.parse(source)
+            self.put(source, tree)
+        return tree
+
+    def get(self, source: str):
+        """Get the cached parse tree for `source`.
+
+        Returns: The parse tree, or `None` if there is no usable entry for `source`.
+        """
+        path = self._entry_path(source)
+        try:
+            with path.open(mode="rb") as handle:
+                tree = pickle.load(handle)
+        except FileNotFoundError:
+            return None
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Discarding unreadable parse cache entry %s", path, exc_info=True)
+            path.unlink(missing_ok=True)
+            return None
+
+        # Mark the entry as recently used so that eviction removes it last.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return tree
+
+    def put(self, source: str, tree):
+        """Store the parse tree for `source`."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(source)
+
+        # Write to a temp file and move it into place so that concurrent readers never see a partial entry.
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, mode="wb") as temp_file:
+                pickle.dump(tree, temp_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except Exception:  # pylint: disable=broad-except
+            log.warning("Unable to write parse cache entry %s", path, exc_info=True)
+            Path(temp_path).unlink(missing_ok=True)
+            return
+
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._entries())
+        else:
+            try:
+                self._size += path.stat().st_size
+            except FileNotFoundError:
+                pass
+
+        if self._size > self.max_size:
+            self.evict(int(self.max_size * _LOW_WATER))
+
+    def evict(self, target_size=None):
+        """Remove least recently used entries until the cache is no larger than `target_size`.
+
+        Args:
+            target_size: The size (bytes) to reduce the cache to. Defaults to `max_size`.
+        """
+        if target_size is None:
+            target_size = self.max_size
+
+        entries = self._entries()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= target_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+        self._size = total_size
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for path in self.directory.glob(f"*{_SUFFIX}"):
+            path.unlink(missing_ok=True)
+        self._size = 0
+
+    def _entries(self):
+        "The (mtime, size, path) of each entry in the cache."
+        entries = []
+        for path in self.directory.glob(f"*{_SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _entry_path(self, source: str):
+        return self.directory / f"{cache_key(source)}{_SUFFIX}"
+
+
+def cache_key(source: str):
+    """The cache key for the parse tree of `source`.
+
+    This covers everything that the parse tree depends on: the source itself, the version of parso, and the version
+    of Python (which determines the grammar that parso uses).
+    """
+    digest = hashlib.sha256()
+    digest.update(f"parso-{parso.__version__};python-{sys.version_info[0]}.{sys.version_info[1]};".encode())
+    digest.update(source.encode("utf-8", errors="surrogatepass"))
+    return digest.hexdigest()
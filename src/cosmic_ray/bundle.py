@@ -0,0 +1,241 @@
+"""Content-addressed bundles of project files, so that workers don't need their own copy of the project.
+
+Normally every worker needs its own copy of the code under test, e.g. a clone of the project's repository. Instead,
+``init`` can store a *bundle* of the files which the tests need in the session (list them in the ``bundle`` setting).
+Each file in the bundle is identified by a hash of its contents, and the bundle as a whole by a hash of its list of
+files and their hashes (and of which files are executable).
+
+Before sending a worker any jobs, the coordinator sends it the bundle's list of files. The worker keeps the files it
+has been sent in a `BundleStore`, so it replies with the hashes of the files it doesn't have yet, and the coordinator
+sends just those. A worker which keeps its store between sessions is only sent the files which have changed. The worker
+then checks out the bundle - a tree of hard links into the store - and runs the jobs in copies of that tree (see
+:mod:`cosmic_ray.workspace`).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import zlib
+from pathlib import Path, PurePosixPath
+
+from attrs import define, field
+
+log = logging.getLogger(__name__)
+
+
+def file_digest(data: bytes) -> str:
+    "The hash which identifies a file with contents `data`."
+    return hashlib.sha256(data).hexdigest()
+
+
+@define(frozen=True)
+class Bundle:
+    """A bundle of project files.
+
+    Attributes:
+        files: A dict mapping the (POSIX-style, relative) path of each file to its hash.
+        blobs: A dict mapping the hash of each file to its zlib-compressed contents.
+        executable: The paths of the files which are executable.
+    """
+
+    files: dict[str, str] = field(factory=dict)
+    blobs: dict[str, bytes] = field(factory=dict)
+    executable: frozenset = field(factory=frozenset, converter=frozenset)
+
+    @property
+    def digest(self):
+        "The hash which identifies the bundle."
+        return manifest_digest(self.files, self.executable)
+
+    def contents(self, digest):
+        "The contents of the file with hash `digest`."
+        return zlib.decompress(self.blobs[digest])
+
+    @classmethod
+    def from_paths(cls, paths, exclude=()):
+        """Create a bundle of the files at `paths`.
+
+        Directories are included recursively, except for ``__pycache__`` directories and those whose names start with
+        ``.`` (such as ``.git`` or ``.venv``).
+
+        Args:
+            paths: The paths, relative to the current directory, of the files and directories to include.
+            exclude: Paths of files to leave out (e.g. the session file).
+
+        Raises:
+            ValueError: One of the paths is outside the current directory.
+        """
+        exclude = {Path(path).resolve() for path in exclude}
+        files = {}
+        blobs = {}
+        executable = set()
+        for file_path in _walk(paths):
+            if file_path.resolve() in exclude:
+                continue
+            data = file_path.read_bytes()
+            digest = file_digest(data)
+            files[bundle_path(file_path)] = digest
+            if file_path.stat().st_mode & stat.S_IXUSR:
+                executable.add(bundle_path(file_path))
+            if digest not in blobs:
+                blobs[digest] = zlib.compress(data)
+        return cls(files, blobs, executable)
+
+
+def manifest_digest(files, executable=()):
+    """The hash which identifies a bundle.
+
+    Args:
+        files: A dict mapping the paths of the bundle's files to their hashes.
+        executable: The paths of the files which are executable.
+    """
+    manifest = files
+    # Bundles without executable files keep the hash they had before executable files were recorded.
+    if executable:
+        manifest = {"files": files, "executable": sorted(executable)}
+    return file_digest(json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode("utf-8"))
+
+
+def bundle_path(path):
+    """Convert `path` to the form in which paths are stored in a bundle.
+
+    Raises:
+        ValueError: `path` is absolute or outside the current directory.
+    """
+    path = PurePosixPath(Path(os.path.normpath(path)).as_posix())
+    if path.is_absolute() or (path.parts and path.parts[0] == ".."):
+        raise ValueError(f"Bundled files must be inside the current directory: {path}")
+    return str(path)
+
+
+def _walk(paths):
+    for path in map(Path, paths):
+        if not path.is_dir():
+            yield path
+            continue
+
+        for directory, dirnames, filenames in os.walk(path):
+            dirnames[:] = sorted(name for name in dirnames if not name.startswith(".") and name != "__pycache__")
+            for name in sorted(filenames):
+                yield Path(directory) / name
+
+
+class BundleStore:
+    """A worker's store of bundled files, in which bundles are checked out.
+
+    The store has two parts: ``objects``, with a file for each hash, and ``trees``, with a checked out bundle for
+    each bundle hash. Both are kept indefinitely, so use a temporary directory to keep them for just one worker.
+
+    The files in ``objects`` aren't executable. The files in a tree are hard links to them, and so share their mode,
+    so executable files are linked to an executable copy of the object instead.
+
+    Args:
+        directory: The directory of the store. It's created if necessary.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._objects = self.directory / "objects"
+        self._trees = self.directory / "trees"
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._trees.mkdir(parents=True, exist_ok=True)
+
+    def missing(self, files):
+        "The hashes of the files in `files` (a dict mapping paths to hashes) which aren't in the store."
+        return sorted({digest for digest in files.values() if not self._object_path(digest).exists()})
+
+    def add(self, digest, blob):
+        """Add a file to the store.
+
+        Args:
+            digest: The hash of the file.
+            blob: The zlib-compressed contents of the file.
+
+        Raises:
+            ValueError: The contents of the file don't match `digest`.
+        """
+        data = zlib.decompress(blob)
+        if file_digest(data) != digest:
+            raise ValueError(f"Contents of bundled file don't match its hash {digest}")
+
+        handle, temp_path = tempfile.mkstemp(dir=self._objects, suffix=".tmp")
+        with os.fdopen(handle, mode="wb") as temp_file:
+            temp_file.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, self._object_path(digest))
+
+    def checkout(self, files, executable=()):
+        """Check out the bundle with the files `files` (a dict mapping paths to hashes).
+
+        The files in the tree are hard links to the files in the store, so they mustn't be modified. Make copies of
+        the tree (e.g. with `cosmic_ray.workspace.WorkspacePool`) to mutate them.
+
+        Args:
+            files: A dict mapping the paths of the bundle's files to their hashes.
+            executable: The paths of the files which are executable.
+
+        Returns: The root of the tree.
+
+        Raises:
+            ValueError: Some of the files are missing from the store, or one of the paths is outside the tree.
+        """
+        missing = self.missing(files)
+        if missing:
+            raise ValueError(f"{len(missing)} bundled files are missing from the store")
+
+        root = self._trees / manifest_digest(files, executable)
+        if root.exists():
+            return root
+
+        log.info("Checking out bundle %s with %s files", root.name, len(files))
+        temp_root = Path(tempfile.mkdtemp(dir=self._trees, prefix=".tmp-"))
+        try:
+            for path, digest in files.items():
+                target = temp_root / bundle_path(path)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                source = self._executable_path(digest) if path in executable else self._object_path(digest)
+                os.link(source, target)
+            os.replace(temp_root, root)
+        except BaseException:
+            shutil.rmtree(temp_root, ignore_errors=True)
+            raise
+        return root
+
+    def _executable_path(self, digest):
+        "The path of an executable copy of the object with hash `digest`, which is made if necessary."
+        path = self._object_path(digest).with_suffix(".x")
+        if not path.exists():
+            handle, temp_path = tempfile.mkstemp(dir=self._objects, suffix=".tmp")
+            os.close(handle)
+            shutil.copyfile(self._object_path(digest), temp_path)
+            os.chmod(temp_path, 0o755)
+            os.replace(temp_path, path)
+        return path
+
+    def _object_path(self, digest):
+        if not digest or not all(char in "0123456789abcdef" for char in digest):
+            raise ValueError(f"Invalid hash: {digest}")
+        return self._objects / digest
+
+
+# The bundle of the current session, if any.
+_bundle = None
+
+
+def use_bundle(session_bundle):
+    """Set the bundle which distributors send to workers.
+
+    Args:
+        session_bundle: A `Bundle`, or `None` if workers use their own copies of the project.
+    """
+    global _bundle  # pylint: disable=global-statement
+    _bundle = session_bundle
+
+
+def bundle():
+    "The bundle which distributors send to workers, or `None`."
+    return _bundle
@@ -0,0 +1,73 @@
+"""A bytecode cache for test runs.
+
+Python caches the compiled bytecode for each module in a ``.pyc`` file, and only recompiles the module if its source's
+modification time or size has changed. Mutating a module often changes neither: a mutation can keep the size of the
+source the same, and the modification time is only recorded to the second. So test runs could use stale bytecode for
+the mutated module, and by default they don't write bytecode at all. That means every test run compiles every module
+it imports - the code under test, its tests and their dependencies - from source.
+
+With a bytecode cache, test runs write their bytecode to a private directory (with ``PYTHONPYCACHEPREFIX``) instead.
+Whenever Cosmic Ray changes a module on disk, and again when it puts the original back, it discards the cached bytecode
+for that module. So the mutated module is always compiled from source, and everything else comes from the cache.
+"""
+
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# The directory for the bytecode cache, or `None` if there isn't one.
+_cache_dir = None
+
+
+def use_bytecode_cache(enabled=True):
+    """Set whether test runs should use a bytecode cache.
+
+    The cache is a temporary directory which is removed when it's disabled or when the process exits.
+    """
+    global _cache_dir  # pylint: disable=global-statement
+    if enabled:
+        if _cache_dir is None:
+            _cache_dir = Path(tempfile.mkdtemp(prefix="cosmic-ray-pycache-"))
+            atexit.register(shutil.rmtree, _cache_dir, ignore_errors=True)
+            log.info("Using bytecode cache in %s", _cache_dir)
+        return
+
+    if _cache_dir is not None:
+        shutil.rmtree(_cache_dir, ignore_errors=True)
+        _cache_dir = None
+
+
+def bytecode_cache():
+    "The directory of the bytecode cache, or `None` if there isn't one."
+    return _cache_dir
+
+
+def invalidate(module_path):
+    "Discard any cached bytecode for the module at `module_path`."
+    if _cache_dir is None:
+        return
+
+    for path in cached_bytecode(_cache_dir, module_path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def cached_bytecode(cache_dir, module_path):
+    """Find the cached bytecode for a module in a cache directory.
+
+    This finds the bytecode for any version of Python, since the tests might not be run with the same interpreter as
+    Cosmic Ray.
+    """
+    module_path = Path(module_path)
+    # The module might be imported through a symlink, so we check the real path as well.
+    for directory in {os.path.abspath(module_path.parent), os.path.realpath(module_path.parent)}:
+        # This follows the layout described for `sys.pycache_prefix`.
+        directory = os.path.splitdrive(directory)[1].lstrip(os.sep + (os.altsep or ""))
+        yield from (Path(cache_dir) / directory).glob(f"{module_path.stem}.*.pyc")
@@ -12,7 +12,7 @@ import subprocess
 import sys
 import tempfile
 from collections import defaultdict
-from contextlib import contextmanager, redirect_stdout
+from contextlib import ExitStack, contextmanager, redirect_stdout
 from importlib.metadata import PackageNotFoundError, version
 from pathlib import Path
 
@@ -23,13 +23,20 @@ from rich.logging import RichHandler
 
 import cosmic_ray.commands
 import cosmic_ray.distribution.http
+import cosmic_ray.distribution.stream
 import cosmic_ray.modules
 import cosmic_ray.mutating
 import cosmic_ray.plugins
+from cosmic_ray.ast import use_parse_cache
+from cosmic_ray.ast.cache import DEFAULT_MAX_SIZE, ParseCache
+from cosmic_ray.bundle import Bundle, use_bundle
+from cosmic_ray.bytecode import use_bytecode_cache
 from cosmic_ray.config import load_config, serialize_config
-from cosmic_ray.mutating import apply_mutation
+from cosmic_ray.mutating import DEFAULT_MAX_MODULES, ModuleCache, apply_mutation, use_module_cache
 from cosmic_ray.progress import report_progress
-from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.testing import use_max_output, use_resource_limits, use_test_daemon
+from cosmic_ray.tools.survival_rate import SUPPORTED_Z_SCORES, confidence_z_score
+from cosmic_ray.work_db import ConflictingResultsError, Lease, WorkDB, use_db
 from cosmic_ray.work_item import MutationSpec, TestOutcome, WorkItem
 
 log = logging.getLogger()
@@ -54,6 +61,13 @@ def cli(verbosity):
     logging.basicConfig(level=logging_level, handlers=[RichHandler()])
 
 
+def _use_configured_parse_cache(cfg):
+    "Install the parse cache described in `cfg`, if any."
+    cache_cfg = cfg.parse_cache_config
+    if "directory" in cache_cfg:
+        use_parse_cache(ParseCache(cache_cfg["directory"], cache_cfg.get("max-size", DEFAULT_MAX_SIZE)))
+
+
 @cli.command()
 @click.argument("config_file", type=click.File("wt"))
 def new_config(config_file):
@@ -74,7 +88,14 @@ click.argument()
     # help="The filename for the database in which the work order will be stored."
 )
 @click.option("--force", is_flag=True, help="Re-initialize the session even if it already contains results")
-def init(config_file, session_file, force):
+@click.option(
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="The number of processes to use for scanning modules",
+)
+def init(config_file, session_file, force, jobs):
     """Initialize a mutation testing session from a configuration. This
     primarily creates a session - a database of "work to be done" -
     which describes all of the mutations and test runs that need to be
@@ -85,9 +106,14 @@ def init(config_file, session_file, force):
     This command doesn't actually run any tests. Instead, it scans the
     modules-under-test and simply generates the work order which can be
     executed with other commands.
+
+    Scanning large code bases can be spread over several processes with
+    ``--jobs``. The resulting work order is the same regardless of the
+    number of jobs.
     """
     cfg = load_config(config_file)
     operators_cfg = cfg.operators_config
+    _use_configured_parse_cache(cfg)
 
     module_paths = [Path(cfg["module-path"])] if isinstance(cfg["module-path"], str) else map(Path, cfg["module-path"])
     modules = cosmic_ray.modules.find_modules(module_paths)
@@ -106,7 +132,8 @@ def init(config_file, session_file, force):
             log.error("Session file already contains results. Use --force to overwrite.")
             sys.exit(ExitCode.DATA_ERR)
 
-        cosmic_ray.commands.init(modules, database, operators_cfg)
+        bundle = Bundle.from_paths(cfg.bundle_paths, exclude=[session_file]) if cfg.bundle_paths else None
+        cosmic_ray.commands.init(modules, database, operators_cfg, jobs, bundle)
 
     sys.exit(ExitCode.OK)
 
@@ -114,15 +141,136 @@ def init(config_file, session_file, force):
 @cli.command(name="exec")
 @click.argument("config_file")
 @click.argument("session_file")
-def handle_exec(config_file, session_file):
+@click.option(
+    "--sample",
+    is_flag=True,
+    help="Run mutants in a stratified random order and stop once the survival rate is estimated precisely enough",
+)
+@click.option(
+    "--sample-width",
+    type=click.FloatRange(min=0, min_open=True),
+    default=5.0,
+    show_default=True,
+    help="With --sample, stop when the confidence interval of the survival rate is narrower than this "
+    "(percentage points)",
+)
+@click.option(
+    "--confidence",
+    type=click.Choice(sorted([str(z / 10) for z in SUPPORTED_Z_SCORES])),
+    default="95.0",
+    show_default=True,
+    help="The confidence level for the survival rate estimate",
+)
+@click.option(
+    "--fail-over",
+    type=click.FloatRange(0, 100),
+    default=None,
+    help="Stop as soon as the survival rate is known to be above or below this percentage (at the --confidence "
+    "level), and exit with a non-zero code if it's above.",
+)
+@click.option(
+    "--group-size",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Test up to this many mutants (from different modules) with a single test run",
+)
+@click.option(
+    "--shared",
+    is_flag=True,
+    default=False,
+    help="Claim work from the session in batches, so that several exec processes can share the session",
+)
+@click.option(
+    "--lease-batch",
+    type=click.IntRange(min=1),
+    default=10,
+    show_default=True,
+    help="With --shared, the number of work items to claim at once",
+)
+@click.option(
+    "--lease-duration",
+    type=click.FloatRange(min=0, min_open=True),
+    default=600.0,
+    show_default=True,
+    help="With --shared, the number of seconds after which claimed work can be claimed by another process, unless "
+    "a result has been recorded in the meantime",
+)
+def handle_exec(
+    config_file,
+    session_file,
+    sample,
+    sample_width,
+    confidence,
+    fail_over,
+    group_size,
+    shared,
+    lease_batch,
+    lease_duration,
+):
     """Perform the remaining work to be done in the specified session.
     This requires that the rest of your mutation testing
     infrastructure (e.g. worker processes) are already running.
+
+    With ``--sample``, this runs mutants in a random order (stratified by
+    module and operator) and stops as soon as the confidence interval for the
+    survival rate is narrower than ``--sample-width``. The remaining work is
+    left pending, so a later ``exec`` can complete the session. Use
+    ``cr-rate --estimate`` to report the estimate.
+
+    With ``--fail-over``, this stops as soon as the survival rate is known to
+    be above or below the threshold, and leaves the remaining work pending.
+    It exits with a non-zero code if the survival rate is above the threshold.
+
+    With ``--group-size``, several mutants are tested with one run of the
+    tests. Groups with killed mutants are split until each killed mutant has
+    been tested on its own. This can't be combined with ``--sample`` or
+    ``--fail-over``.
+
+    With ``--shared``, several ``exec`` processes (e.g. on different machines
+    with a shared file system) can work on the same session at once. Each
+    claims batches of work as it needs them, and only records results for the
+    work it has claimed. Work claimed by a process which doesn't record a
+    result within ``--lease-duration`` seconds is claimed again by another.
+    This can't be combined with ``--sample`` or ``--group-size``.
     """
+    if group_size > 1 and (sample or fail_over is not None):
+        raise click.UsageError("--group-size can't be combined with --sample or --fail-over")
+    if shared and (sample or group_size > 1):
+        raise click.UsageError("--shared can't be combined with --sample or --group-size")
+
     cfg = load_config(config_file)
+    if cfg.distributor_name == "local" and cfg.distributor_config.get("schemata", False):
+        if sample or fail_over is not None or shared:
+            raise click.UsageError("Mutant schemata can't be combined with --sample, --fail-over or --shared")
+    _use_configured_parse_cache(cfg)
+    use_test_daemon(cfg.test_daemon)
+    use_resource_limits(cfg.resource_limits)
+    use_max_output(cfg.max_output)
+    use_bytecode_cache(cfg.bytecode_cache)
+    use_module_cache(ModuleCache(cfg.module_cache) if cfg.module_cache > 0 else None)
 
-    with use_db(session_file, mode=WorkDB.Mode.open) as work_db:
-        cosmic_ray.commands.execute(work_db, cfg)
+    try:
+        with use_db(session_file, mode=WorkDB.Mode.open) as work_db:
+            use_bundle(work_db.bundle)
+            tracker = cosmic_ray.commands.execute(
+                work_db,
+                cfg,
+                sample_width=sample_width if sample else None,
+                confidence=float(confidence),
+                fail_over=fail_over,
+                group_size=group_size,
+                lease=Lease(batch_size=lease_batch, duration=lease_duration) if shared else None,
+            )
+    finally:
+        use_test_daemon(False)
+        use_bytecode_cache(False)
+        use_module_cache(None)
+        use_bundle(None)
+
+    if fail_over is not None and tracker.exceeds(fail_over, confidence_z_score(confidence)):
+        log.error("Survival rate %.2f%% is over the fail-over threshold of %s%%", tracker.rate, fail_over)
+        sys.exit(1)
     sys.exit(ExitCode.OK)
 
 
@@ -208,6 +356,70 @@ def dump(session_file):
     sys.exit(ExitCode.OK)
 
 
+@cli.command()
+@click.argument("session_file")
+@click.option("--count", type=click.IntRange(min=1), required=True, help="The number of shards")
+@click.option(
+    "--output-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="The directory for the shards (default: the directory of the session)",
+)
+@click.option(
+    "--history",
+    multiple=True,
+    help="An earlier session whose recorded durations are used to estimate costs (may be given more than once)",
+)
+def shard(session_file, count, output_dir, history):
+    """Split the pending work of a session into COUNT self-contained
+    sessions, e.g. to run them in the jobs of a CI matrix.
+
+    The shards are named like ``session-shard-1-of-4.sqlite``. Each is
+    given work with about the same total estimated cost. The estimates
+    come from the durations of completed work in the session and in any
+    ``--history`` sessions. Run each shard with ``exec``, then combine the
+    results with ``merge``.
+    """
+    paths = cosmic_ray.commands.shard_paths(session_file, count, output_dir)
+    if output_dir is not None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+
+    with ExitStack() as stack:
+        work_db = stack.enter_context(use_db(session_file, WorkDB.Mode.open))
+        history_dbs = [stack.enter_context(use_db(path, WorkDB.Mode.open)) for path in history]
+        costs = cosmic_ray.commands.shard(work_db, paths, history_dbs)
+
+    for path, cost in zip(paths, costs):
+        print(f"{path}\t{cost:.1f}")
+
+    sys.exit(ExitCode.OK)
+
+
+@cli.command()
+@click.argument("session_file")
+@click.argument("shard_files", nargs=-1, required=True)
+def merge(session_file, shard_files):
+    """Add the results from shards made with ``shard`` to a session.
+
+    Results which conflict with those already in the session (or from an
+    earlier shard) are an error, as are results for jobs which aren't in
+    the session. A shard with an error isn't merged at all.
+    """
+    with use_db(session_file, WorkDB.Mode.open) as work_db:
+        try:
+            added = cosmic_ray.commands.merge(work_db, shard_files)
+        except ConflictingResultsError as exc:
+            log.error("%s", exc)
+            for job_id in exc.conflicting_job_ids:
+                log.error("Conflicting result for job %s", job_id)
+            for job_id in exc.unknown_job_ids:
+                log.error("Result for unknown job %s", job_id)
+            sys.exit(ExitCode.DATA_ERR)
+
+    log.info("Merged %s results into %s", added, session_file)
+    sys.exit(ExitCode.OK)
+
+
 @cli.command()
 def operators():
     """List the available operator plugins."""
@@ -236,24 +448,99 @@ def apply(module_path, operator, occurrence):
     sys.exit(ExitCode.OK)
 
 
-@cli.command()
-@click.option("--port", type=int, default=None, help="The port on which to listen for requests")
-@click.option("--path", default=None, help="Path to Unix domain socket on which to listen for requests")
-def http_worker(port, path):
-    """Run an HTTP worker for the 'http' distributor."""
+def _worker_options(func):
+    "Add the options common to all of the worker commands."
+    options = [
+        click.option("--port", type=int, default=None, help="The port on which to listen for requests"),
+        click.option("--path", default=None, help="Path to Unix domain socket on which to listen for requests"),
+        click.option("--parse-cache", default=None, help="Directory of an on-disk parse cache to use"),
+        click.option(
+            "--test-daemon",
+            is_flag=True,
+            default=False,
+            help="Run pytest and unittest test commands in a long-lived test daemon rather than a new process per job",
+        ),
+        click.option(
+            "--bytecode-cache/--no-bytecode-cache",
+            default=False,
+            show_default=True,
+            help="Cache the bytecode of unmutated modules between test runs",
+        ),
+        click.option(
+            "--module-cache",
+            type=click.IntRange(min=0),
+            default=DEFAULT_MAX_MODULES,
+            show_default=True,
+            help="Keep this many parsed modules in memory between requests (0 to parse modules every time)",
+        ),
+        click.option(
+            "--slots",
+            type=click.IntRange(min=1),
+            default=1,
+            show_default=True,
+            help="Handle this many requests at once, each in its own copy of the current directory",
+        ),
+        click.option(
+            "--workspace-dir",
+            type=click.Path(file_okay=False, exists=True),
+            default=None,
+            help="Directory in which to put the copies of the current directory for --slots "
+            "[default: .cosmic-ray-workspaces in the current directory]",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def _run_worker(
+    run_worker, port, path, parse_cache, test_daemon, bytecode_cache, module_cache, slots, workspace_dir, **options
+):
+    "Run a worker with the options from `_worker_options`, and any others for the particular worker."
     if (port is None) == (path is None):
         log.error("You must specify exactly one of --path or --port")
         sys.exit(ExitCode.USAGE)
 
+    if parse_cache is not None:
+        use_parse_cache(ParseCache(parse_cache))
+    use_test_daemon(test_daemon)
+    use_bytecode_cache(bytecode_cache)
+    use_module_cache(ModuleCache(module_cache) if module_cache > 0 else None)
+
     try:
-        cosmic_ray.distribution.http.run_worker(port=port, path=path)
+        run_worker(port=port, path=path, slots=slots, workspace_dir=workspace_dir, **options)
     except ValueError as exc:
         log.error(str(exc))
         sys.exit(ExitCode.DATA_ERR)
+    finally:
+        use_test_daemon(False)
+        use_bytecode_cache(False)
+        use_module_cache(None)
 
     sys.exit(ExitCode.OK)
 
 
+@cli.command()
+@_worker_options
+@click.option(
+    "--bundle-cache",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="Directory in which to keep the files of bundled sessions between runs. By default, they're kept until the "
+    "worker exits.",
+)
+def http_worker(**options):
+    """Run an HTTP worker for the 'http' distributor."""
+    _run_worker(cosmic_ray.distribution.http.run_worker, **options)
+
+
+@cli.command()
+@_worker_options
+def stream_worker(**options):
+    """Run a worker for the 'stream' distributor."""
+    _run_worker(cosmic_ray.distribution.stream.run_worker, **options)
+
+
 @cli.command()
 @click.argument("module_path")
 @click.argument("operator")
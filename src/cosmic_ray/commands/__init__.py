@@ -8,3 +8,4 @@ justify a separate module.
 from .execute import execute  # NOQA
 from .init import init  # NOQA
 from .new_config import new_config  # NOQA
+from .shard import merge, shard, shard_paths  # NOQA
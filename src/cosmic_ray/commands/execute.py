@@ -4,8 +4,15 @@ import logging
 import os
 
 from cosmic_ray.config import ConfigDict
+from cosmic_ray.equivalence import find_equivalents
+from cosmic_ray.grouping import run_in_groups
+from cosmic_ray.mutating import compile_check
 from cosmic_ray.plugins import get_distributor
 from cosmic_ray.progress import reports_progress
+from cosmic_ray.sampling import RateTracker, run_until, stratified_order
+from cosmic_ray.scheduling import schedule
+from cosmic_ray.tools.survival_rate import confidence_z_score
+from cosmic_ray.work_item import WorkResult, WorkerOutcome
 
 log = logging.getLogger(__name__)
 
@@ -28,27 +35,250 @@ def _report_progress(stream):
 
 
 @reports_progress(_report_progress)
-def execute(work_db, config: ConfigDict):
+def execute(work_db, config: ConfigDict, sample_width=None, confidence=95.0, fail_over=None, group_size=1, lease=None):
     """Execute any pending work in the database `work_db`,
     recording the results.
 
     This looks for any work in `work_db` which has no results, schedules it to
     be executed, and records any results that arrive.
+
+    If the configuration enables ``detect-incompetent-mutants``, mutants which
+    don't compile are recorded as incompetent without being scheduled.
+    Otherwise the workers find them as they run them.
+
+    If the configuration enables ``detect-equivalent-mutants``, mutants which
+    compile to the same code as the unmutated module are skipped, and mutants
+    which compile to the same code as another mutant get that mutant's result
+    instead of being executed.
+
+    If `sample_width` is given, the pending work is run in a stratified random
+    order, and execution stops as soon as the `confidence`% confidence
+    interval for the survival rate is narrower than `sample_width` percentage
+    points. Work which isn't run is left pending.
+
+    If `fail_over` is given, execution stops as soon as the `confidence`%
+    confidence interval for the survival rate is entirely above or entirely
+    at-or-below `fail_over`, since the outcome of a `cr-rate --fail-over`
+    check is then known. Work which isn't run is left pending.
+
+    If `group_size` is more than 1, up to `group_size` mutants from
+    different modules are tested together, and groups with killed mutants
+    are split until those mutants are tested on their own. This can't be
+    combined with `sample_width` or `fail_over`.
+
+    The pending work is run in the order given by the configured schedule (see
+    `cosmic_ray.scheduling`), except when sampling, group testing or sharing
+    the session, which use their own orders.
+
+    If a `cosmic_ray.work_db.Lease` is given, the session can be shared with
+    other processes running ``exec``. Work is claimed from the session in
+    batches as it's needed, and results are only recorded for work that this
+    process still holds the lease on. Incompetent and equivalent mutant
+    detection are applied to each batch separately. This can't be combined
+    with `sample_width` or `group_size`.
+
+    Mutant schemata (see `cosmic_ray.schemata`) take all of the pending work
+    before running any of it, so they can't be combined with `sample_width`,
+    `fail_over` or `lease`.
+
+    Returns: A `RateTracker` describing the survival rate of the session.
     """
+    if lease is not None and (sample_width is not None or group_size > 1):
+        raise ValueError("Shared sessions can't be combined with sampling or group testing")
+    if _uses_schemata(config) and (sample_width is not None or fail_over is not None or lease is not None):
+        raise ValueError("Mutant schemata can't be combined with sampling, fail-over or shared sessions")
+
     _update_progress(work_db)
     distributor = get_distributor(config.distributor_name)
 
+    def set_result(job_id, work_result):
+        "Record a result in the session, returning whether it was accepted."
+        if lease is None:
+            work_db.set_result(job_id, work_result)
+            return True
+        if not work_db.set_leased_result(lease, job_id, work_result):
+            log.warning("Discarding result for job %s, which is no longer leased by %s", job_id, lease.holder)
+            return False
+        work_db.renew_leases(lease)
+        return True
+
+    duplicates = {}
+    if lease is None:
+        pending_work = work_db.pending_work_items
+        if config.detect_incompetent_mutants:
+            pending_work = _apply_compile_check(pending_work, set_result)
+        if config.detect_equivalent_mutants:
+            pending_work, duplicates = _apply_equivalences(pending_work, set_result)
+    else:
+        # The results for each batch are recorded as it's claimed, so they need to be tracked too.
+        pending_work = _claimed_work(work_db, lease, config, lambda *args: record(*args), duplicates)
+
+    if lease is None and sample_width is None and group_size == 1:
+        pending_work, update_schedule = schedule(work_db, pending_work, config)
+    else:
+        if config.schedule != "random":
+            log.warning("The %s schedule isn't used with sampling, group testing or shared sessions", config.schedule)
+        update_schedule = None
+
+    tracker = RateTracker.from_db(work_db)
+    z_score = confidence_z_score(confidence)
+    stop_conditions = []
+    if sample_width is not None:
+        pending_work = stratified_order(pending_work)
+        stop_conditions.append(lambda: 2 * tracker.interval(z_score) < sample_width)
+    if fail_over is not None:
+        stop_conditions.append(lambda: tracker.exceeds(fail_over, z_score) is not None)
+    if stop_conditions:
+        pending_work = run_until(pending_work, tracker, lambda: any(condition() for condition in stop_conditions))
+
+    def record(job_id, work_result):
+        if set_result(job_id, work_result):
+            tracker.add(work_result)
+
     def on_task_complete(job_id, work_result):
-        work_db.set_result(job_id, work_result)
+        record(job_id, work_result)
+        if update_schedule is not None:
+            update_schedule(job_id, work_result)
+        for duplicate_id, diff in duplicates.pop(job_id, ()):
+            record(duplicate_id, _duplicate_result(job_id, work_result, diff))
         _update_progress(work_db)
         log.info("Job %s complete", job_id)
 
+    if group_size > 1 and stop_conditions:
+        raise ValueError("Group testing can't be combined with sampling or fail-over checks")
+
     log.info("Beginning execution")
-    distributor(
-        work_db.pending_work_items,
-        config.test_command,
-        config.timeout,
-        config.distributor_config,
-        on_task_complete=on_task_complete,
-    )
+    try:
+        _distribute(distributor, pending_work, group_size, config, on_task_complete)
+    finally:
+        if lease is not None:
+            work_db.release_leases(lease)
     log.info("Execution finished")
+
+    if stop_conditions:
+        log.info(
+            "Completed %s of %s mutants: survival rate %.2f%% +/- %.2f",
+            tracker.num_results,
+            tracker.num_items,
+            tracker.rate,
+            tracker.interval(z_score),
+        )
+
+    if fail_over is not None:
+        verdict = tracker.exceeds(fail_over, z_score)
+        if verdict is not None:
+            # The work which wasn't run is left pending rather than given results, which would count towards the
+            # survival rate of the session.
+            log.info(
+                "Stopped with %s mutants not run: the survival rate is known to be %s the fail-over threshold of %s%%",
+                work_db.num_work_items - work_db.num_results,
+                "above" if verdict else "at or below",
+                fail_over,
+            )
+
+    return tracker
+
+
+def _distribute(distributor, pending_work, group_size, config, on_task_complete):
+    "Run `pending_work` with `distributor`, in groups if `group_size` is more than 1."
+    if group_size > 1:
+        run_in_groups(
+            distributor,
+            pending_work,
+            group_size,
+            config.test_command,
+            config.timeout,
+            config.distributor_config,
+            on_task_complete,
+        )
+    else:
+        distributor(
+            pending_work,
+            config.test_command,
+            config.timeout,
+            config.distributor_config,
+            on_task_complete=on_task_complete,
+        )
+
+
+def _uses_schemata(config):
+    "Whether the distributor takes all of the pending work up front to write mutant schemata."
+    return config.distributor_name == "local" and bool(config.distributor_config.get("schemata", False))
+
+
+def _claimed_work(work_db, lease, config, record, duplicates):
+    """Claim pending work from `work_db` in batches, as it's needed.
+
+    Results are recorded with `record` for the mutants in each batch which don't compile or which are equivalent,
+    and `duplicates` is updated with the duplicate mutants of each batch (see `_apply_equivalences`).
+
+    Yields: The work items which need to be executed.
+    """
+    while True:
+        batch = work_db.claim_work_items(lease)
+        if not batch:
+            return
+        log.info("Claimed %s work items", len(batch))
+
+        if config.detect_incompetent_mutants:
+            batch = _apply_compile_check(batch, record)
+        if config.detect_equivalent_mutants:
+            batch, batch_duplicates = _apply_equivalences(batch, record)
+            duplicates.update(batch_duplicates)
+        yield from batch
+
+
+def _apply_compile_check(pending_work, set_result):
+    "Record results with `set_result` for the mutants in `pending_work` that don't compile, returning the rest."
+    incompetent = set()
+    for job_id, work_result in compile_check(pending_work):
+        set_result(job_id, work_result)
+        incompetent.add(job_id)
+
+    if incompetent:
+        log.info("Found %s mutants which don't compile", len(incompetent))
+
+    return [work_item for work_item in pending_work if work_item.job_id not in incompetent]
+
+
+def _apply_equivalences(pending_work, set_result):
+    """Record results with `set_result` for the equivalent mutants in `pending_work`.
+
+    Returns:
+        A `(work-items, duplicates)` tuple. `work-items` are the items which still need to be executed. `duplicates`
+        maps the job ID of each of those items to a list of `(job-id, diff)` tuples for the items which should get its
+        result.
+    """
+    equivalences = find_equivalents(pending_work)
+    log.info("Found %s equivalent and %s duplicate mutants", len(equivalences.equivalent), len(equivalences.duplicates))
+
+    for job_id in equivalences.equivalent:
+        set_result(
+            job_id,
+            WorkResult(
+                output="Equivalent mutant: compiles to the same code as the unmutated module",
+                diff=equivalences.diffs[job_id],
+                worker_outcome=WorkerOutcome.EQUIVALENT,
+            ),
+        )
+
+    duplicates = {}
+    for job_id, representative_id in equivalences.duplicates.items():
+        duplicates.setdefault(representative_id, []).append((job_id, equivalences.diffs[job_id]))
+
+    pending_work = [
+        work_item
+        for work_item in pending_work
+        if work_item.job_id not in equivalences.equivalent and work_item.job_id not in equivalences.duplicates
+    ]
+    return pending_work, duplicates
+
+
+def _duplicate_result(representative_id, work_result, diff):
+    "The result for a mutant which is equivalent to the mutant of job `representative_id`."
+    return WorkResult(
+        output=f"Duplicate mutant: compiles to the same code as job {representative_id}\n\n{work_result.output or ''}",
+        diff=diff,
+        test_outcome=work_result.test_outcome,
+        worker_outcome=work_result.worker_outcome,
+    )
@@ -3,10 +3,12 @@
 import logging
 import uuid
 from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 import cosmic_ray.modules
 import cosmic_ray.plugins
-from cosmic_ray.ast import ast_nodes, get_ast_from_path
+from cosmic_ray.ast import ast_nodes, get_ast_from_path, parse_cache, use_parse_cache
 from cosmic_ray.ast.ast_query import ASTQuery
 from cosmic_ray.work_db import WorkDB
 from cosmic_ray.work_item import MutationSpec, WorkItem
@@ -44,38 +46,64 @@ def _operators(operator_cfgs):
                 yield operator_name, operator_args, operator_class(**operator_args)
 
 
-def _all_work_items(module_paths, operator_cfgs) -> Iterable[WorkItem]:
+def _module_work_items(module_path, operator_cfgs) -> list[WorkItem]:
+    """List of all WorkItems for a single module.
+
+    This is the unit of work for parallel initialization, so it returns a list rather than a lazy iterable.
+
+    Raises:
+        TypeError: If an operator is provided with a parameterization it can't use.
+    """
+    module_ast = get_ast_from_path(module_path)
+    work_items = []
+
+    for operator_name, operator_args, operator in _operators(operator_cfgs):
+        positions = (
+            (node, start_pos, end_pos)
+            for node in ast_nodes(module_ast)
+            for start_pos, end_pos in operator.mutation_positions(node)
+        )
+
+        for occurrence, (node, start_pos, end_pos) in enumerate(positions):
+            definition_name = ASTQuery(node).get_definition_name()
+            mutation = MutationSpec(
+                module_path=str(module_path),
+                operator_name=operator_name,
+                operator_args=operator_args,
+                occurrence=occurrence,
+                start_pos=start_pos,
+                end_pos=end_pos,
+                definition_name=definition_name,
+            )
+            work_items.append(WorkItem.single(job_id=uuid.uuid4().hex, mutation=mutation))
+
+    return work_items
+
+
+def _all_work_items(module_paths, operator_cfgs, jobs=1) -> Iterable[WorkItem]:
     """Iterable of all WorkItems for the given inputs.
 
+    Modules are processed in sorted order. If `jobs` is greater than 1, modules are parsed and scanned in a pool of
+    that many processes. The results are still produced in module order, so the sequence of work items does not
+    depend on how the modules were scheduled across the pool.
+
     Raises:
         TypeError: If an operator is provided with a parameterization it can't use.
     """
+    module_paths = sorted(module_paths)
 
-    for module_path in module_paths:
-        module_ast = get_ast_from_path(module_path)
+    if jobs <= 1 or len(module_paths) <= 1:
+        for module_path in module_paths:
+            yield from _module_work_items(module_path, operator_cfgs)
+        return
+
+    # Make sure that the pool processes share our parse cache, whatever the multiprocessing start method.
+    with ProcessPoolExecutor(max_workers=jobs, initializer=use_parse_cache, initargs=(parse_cache(),)) as pool:
+        for work_items in pool.map(_module_work_items, module_paths, repeat(operator_cfgs)):
+            yield from work_items
 
-        for operator_name, operator_args, operator in _operators(operator_cfgs):
-            positions = (
-                (node, start_pos, end_pos)
-                for node in ast_nodes(module_ast)
-                for start_pos, end_pos in operator.mutation_positions(node)
-            )
 
-            for occurrence, (node, start_pos, end_pos) in enumerate(positions):
-                definition_name = ASTQuery(node).get_definition_name()
-                mutation = MutationSpec(
-                    module_path=str(module_path),
-                    operator_name=operator_name,
-                    operator_args=operator_args,
-                    occurrence=occurrence,
-                    start_pos=start_pos,
-                    end_pos=end_pos,
-                    definition_name=definition_name,
-                )
-                yield WorkItem.single(job_id=uuid.uuid4().hex, mutation=mutation)
-
-
-def init(module_paths, work_db: WorkDB, operator_cfgs):
+def init(module_paths, work_db: WorkDB, operator_cfgs, jobs=1, bundle=None):
     """Clear and initialize a work-db with work items.
 
     Any existing data in the work-db will be cleared and replaced with entirely
@@ -86,10 +114,13 @@ def init(module_paths, work_db: WorkDB, operator_cfgs):
       module_paths: iterable of pathlib.Paths of modules to mutate.
       work_db: A `WorkDB` instance into which the work orders will be saved.
       operator_cfgs: A dict mapping operator names to parameterization dicts.
+      jobs: The number of processes to use for scanning modules.
+      bundle: A `cosmic_ray.bundle.Bundle` of project files to store in the session, if any.
 
     Raises:
         TypeError: Arguments provided for an operator are invalid.
     """
     # By default each operator will be parameterized with an empty dict.
     work_db.clear()
-    work_db.add_work_items(_all_work_items(module_paths, operator_cfgs))
+    work_db.add_work_items(_all_work_items(module_paths, operator_cfgs, jobs))
+    work_db.set_bundle(bundle)
@@ -0,0 +1,105 @@
+"""Implementation of the 'shard' and 'merge' commands.
+
+Sharding splits the pending work of a session into several self-contained sessions, e.g. to run them in the jobs of
+a CI matrix. Each shard has the work items assigned to it and the session's bundle (see `cosmic_ray.bundle`), so it
+can be run with ``cosmic-ray exec`` like any other session. Merging adds the results from the shards back into the
+session.
+"""
+
+import heapq
+import logging
+from itertools import chain
+from pathlib import Path
+
+from cosmic_ray.cost import CostModel
+from cosmic_ray.work_db import WorkDB, use_db
+
+log = logging.getLogger(__name__)
+
+
+def shard_paths(session_path, count, output_dir=None):
+    """The paths of the shard files for a session.
+
+    Args:
+        session_path: The path of the session.
+        count: The number of shards.
+        output_dir: The directory for the shards. By default, they go next to the session.
+
+    Returns: A list of `count` paths, named like ``session-shard-1-of-4.sqlite``.
+    """
+    session_path = Path(session_path)
+    output_dir = session_path.parent if output_dir is None else Path(output_dir)
+    return [output_dir / f"{session_path.stem}-shard-{index}-of-{count}.sqlite" for index in range(1, count + 1)]
+
+
+def assign_shards(work_items, count, cost_model):
+    """Divide work items between `count` shards so that the shards have about the same estimated cost.
+
+    The work items are assigned from the most to the least expensive, each to the shard with the lowest total cost so
+    far.
+
+    Returns: A list of `count` lists of work items.
+    """
+    shards = [[] for _ in range(count)]
+    loads = [(0.0, index) for index in range(count)]
+    estimates = sorted(((cost_model.estimate(work_item), work_item) for work_item in work_items), key=lambda e: -e[0])
+    for estimate, work_item in estimates:
+        load, index = heapq.heappop(loads)
+        shards[index].append(work_item)
+        heapq.heappush(loads, (load + estimate, index))
+    return shards
+
+
+def shard(work_db: WorkDB, paths, history=()):
+    """Split the pending work of a session between new sessions.
+
+    Any existing files at `paths` are replaced.
+
+    Args:
+        work_db: The session to split.
+        paths: The paths of the shard sessions to create, one per shard.
+        history: `WorkDB`\\s of other sessions with durations to use when estimating costs. The session's own
+            completed work is always used.
+
+    Returns: A list of the estimated cost of each shard.
+    """
+    cost_model = CostModel.from_results(chain.from_iterable(db.completed_work_items for db in (work_db, *history)))
+    if not cost_model.num_durations:
+        log.info("No durations available, so every mutation is estimated to take the same time")
+
+    bundle = work_db.bundle
+    costs = []
+    for path, work_items in zip(paths, assign_shards(work_db.pending_work_items, len(paths), cost_model)):
+        Path(path).unlink(missing_ok=True)
+        with use_db(path) as shard_db:
+            shard_db.add_work_items(work_items)
+            shard_db.set_bundle(bundle)
+        costs.append(sum(cost_model.estimate(work_item) for work_item in work_items))
+        log.info("Shard %s has %s work items with an estimated cost of %.1f", path, len(work_items), costs[-1])
+    return costs
+
+
+def merge(work_db: WorkDB, paths):
+    """Add the results from shard sessions to a session.
+
+    Each shard is merged in its own transaction, so if one can't be merged, the shards before it still are.
+
+    Args:
+        work_db: The session to add the results to.
+        paths: The paths of the shard sessions.
+
+    Returns: The number of results added.
+
+    Raises:
+        cosmic_ray.work_db.ConflictingResultsError: A shard has results which conflict with those in the session (or
+            an earlier shard), or results for jobs which aren't in the session.
+    """
+    added = 0
+    for path in paths:
+        # Opening the shard brings its tables up to date.
+        with use_db(path, WorkDB.Mode.open):
+            pass
+        count = work_db.merge_results(path)
+        log.info("Merged %s results from %s", count, path)
+        added += count
+    return added
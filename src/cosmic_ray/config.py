@@ -6,6 +6,9 @@ from contextlib import contextmanager
 
 import toml
 
+from cosmic_ray.limits import DEFAULT_MAX_OUTPUT, ResourceLimits
+from cosmic_ray.mutating import DEFAULT_MAX_MODULES
+
 log = logging.getLogger()
 
 
@@ -77,6 +80,59 @@ class ConfigDict(dict):
         "The timeout (seconds) for tests."
         return float(self["timeout"])
 
+    @property
+    def detect_incompetent_mutants(self):
+        "Whether to compile every pending mutant before running any tests, recording those which don't compile."
+        return bool(self.get("detect-incompetent-mutants", False))
+
+    @property
+    def detect_equivalent_mutants(self):
+        "Whether to skip mutants which compile to the same code as the unmutated code or another mutant."
+        return bool(self.get("detect-equivalent-mutants", False))
+
+    @property
+    def test_daemon(self):
+        "Whether to run the tests with a test daemon (see `cosmic_ray.daemon`) when the test command allows it."
+        return bool(self.get("test-daemon", False))
+
+    @property
+    def resource_limits(self):
+        "The resource limits (see `cosmic_ray.limits`) for each test run."
+        return ResourceLimits.from_config(self.sub("resource-limits"))
+
+    @property
+    def max_output(self):
+        "The maximum number of bytes of output to keep for each test run."
+        return int(self.get("max-output-bytes", DEFAULT_MAX_OUTPUT))
+
+    @property
+    def bytecode_cache(self):
+        "Whether test runs should use a bytecode cache (see `cosmic_ray.bytecode`)."
+        return bool(self.get("bytecode-cache", False))
+
+    @property
+    def module_cache(self):
+        "The number of parsed modules to keep in memory between mutations, or 0 to parse modules every time."
+        return int(self.get("module-cache", DEFAULT_MAX_MODULES))
+
+    @property
+    def schedule(self):
+        """The order in which to run pending work: ``random``, ``longest-first`` or ``module-affinity`` (see
+        `cosmic_ray.scheduling`).
+
+        Raises:
+            ConfigValueError: The schedule isn't one of these.
+        """
+        schedule = self.get("schedule", "random")
+        if schedule not in ("random", "longest-first", "module-affinity"):
+            raise ConfigValueError(f"Unknown schedule: {schedule}")
+        return schedule
+
+    @property
+    def bundle_paths(self):
+        "The files and directories to put in the session's bundle of project files (see `cosmic_ray.bundle`)."
+        return list(self.get("bundle", []))
+
     @property
     def distributor_name(self):
         "The name of the distributor to use."
@@ -99,6 +155,14 @@ class ConfigDict(dict):
         """
         return self.get("operators", {})
 
+    @property
+    def parse_cache_config(self):
+        """The configuration for the on-disk parse cache.
+
+        This is empty if no parse cache is configured.
+        """
+        return self.sub("parse-cache")
+
 
 @contextmanager
 def _config_stream(filename):
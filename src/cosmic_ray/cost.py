@@ -0,0 +1,115 @@
+"""Estimates of how long work items will take to run.
+
+Each `WorkResult` records how long it took to produce (its ``duration``). From the durations of completed work items,
+a `CostModel` estimates the duration of a pending work item from the mean duration of completed work items which
+mutate the same definition (function or class) of the same module, since they're likely to be covered by the same
+tests. If there aren't any of those, it falls back to the mean for the same module and operator, then to the mean for
+the same module, and then to the mean for all work items. Without any durations at all, every mutation is estimated to
+take the same time.
+
+The durations can come from the session itself (e.g. when resuming a session), or from an earlier session for the same
+project (e.g. the previous CI run), since the estimates depend only on module paths, definitions and operators, not on job IDs.
+"""
+
+from collections import defaultdict
+from pathlib import Path
+
+# The estimate for a mutation when there are no durations to go on.
+DEFAULT_COST = 1.0
+
+
+class _Mean:
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+
+    def add(self, value):
+        self.total += value
+        self.count += 1
+
+    @property
+    def value(self):
+        return self.total / self.count
+
+
+class CostModel:
+    "Estimates the duration of work items from the durations of completed work items."
+
+    def __init__(self):
+        self._by_definition = defaultdict(_Mean)
+        self._by_operator = defaultdict(_Mean)
+        self._by_module = defaultdict(_Mean)
+        self._overall = _Mean()
+
+    @classmethod
+    def from_results(cls, completed_work_items):
+        """Create a model from completed work items.
+
+        Args:
+            completed_work_items: An iterable of ``(work-item, result)``\\s, as from `WorkDB.completed_work_items`.
+                Results without a duration are ignored.
+        """
+        model = cls()
+        for work_item, result in completed_work_items:
+            if result.duration is not None:
+                model.add(work_item, result.duration)
+        return model
+
+    @property
+    def num_durations(self):
+        "The number of durations the model has been given."
+        return self._overall.count
+
+    def add(self, work_item, duration):
+        "Add the `duration` of a completed work item to the model."
+        for mutation in work_item.mutations:
+            module_path = _module_key(mutation.module_path)
+            if mutation.definition_name is not None:
+                self._by_definition[module_path, mutation.definition_name].add(duration)
+            self._by_operator[module_path, mutation.operator_name].add(duration)
+            self._by_module[module_path].add(duration)
+        self._overall.add(duration)
+
+    def estimate(self, work_item):
+        """Estimate the duration of a work item.
+
+        A work item with several mutations runs the tests once, so its estimate is the largest of the estimates for
+        its mutations.
+        """
+        return max((self.estimate_mutation(mutation) for mutation in work_item.mutations), default=DEFAULT_COST)
+
+    def estimate_mutation(self, mutation):
+        "Estimate the duration of a work item with the single mutation `mutation`."
+        module_path = _module_key(mutation.module_path)
+        keys = (
+            (self._by_definition, (module_path, mutation.definition_name)),
+            (self._by_operator, (module_path, mutation.operator_name)),
+            (self._by_module, module_path),
+        )
+        for means, key in keys:
+            if key in means:
+                return means[key].value
+        return self.fallback
+
+    def has_durations(self, module_path):
+        "Whether the model has any durations for mutations of the module at `module_path`."
+        return _module_key(module_path) in self._by_module
+
+    @property
+    def fallback(self):
+        "The estimate for a mutation of a module which the model has no durations for."
+        if self._overall.count:
+            return self._overall.value
+        return DEFAULT_COST
+
+    @staticmethod
+    def key(work_item):
+        "A key which is the same for work items which always have the same estimate."
+        return tuple(
+            (_module_key(mutation.module_path), mutation.definition_name, mutation.operator_name)
+            for mutation in work_item.mutations
+        )
+
+
+def _module_key(module_path):
+    return Path(module_path).as_posix()
@@ -0,0 +1,438 @@
+"""A long-lived test runner that avoids starting a new interpreter for every test run.
+
+Normally each test run starts a new Python process, which then has to start up, import the test framework and all of
+the third-party packages that the tests use, and only then import and run the code under test. For fast test suites,
+that overhead can dominate the run.
+
+The test daemon is started once per worker. It imports the test framework up front, and for each test run it forks a
+child process which runs the tests. Each child starts from the daemon's warm interpreter, drops any of the project's
+own modules (so that the mutated code is imported afresh), and runs the tests in-process. Third-party modules which the
+tests import are imported by the daemon after the first run, so later children don't have to import them again.
+Because each run happens in its own child process, mutants can't affect each other.
+
+The daemon only understands test commands which run pytest or unittest through Python (e.g. ``python -m pytest tests``
+or ``pytest tests``). It's run with the same interpreter as Cosmic Ray, so it's only used for test commands which run
+that interpreter too (see `runs_in_this_interpreter`). A command which runs the tests with another Python, such as
+that of a different virtual environment, is run in a new process for each test run as usual.
+
+Protocol
+========
+
+The daemon reads requests from stdin and writes responses to stdout, one JSON object per line. A request is::
+
+    {
+        "env": {"NAME": "value", ...},
+        "mutant": "key",
+        "tests": ["test id", ...],
+        "limits": {"address_space": ..., "cpu_time": ..., "processes": ...},
+        "max_output": 65536
+    }
+
+(on a single line) where ``env`` holds extra environment variables for the run. The other fields are optional:
+
+- ``mutant`` is the key of the mutant to activate in a mutant schema (see `cosmic_ray.schemata`). It's put in the
+  `ACTIVE_MUTANT_VAR` environment variable.
+- ``tests`` are the IDs (as reported in ``failed``) of the tests to run, instead of all of the tests that the test
+  command runs. For pytest, the tests are still collected as the test command says, and only those with the given IDs
+  are run. For unittest, the IDs replace the arguments of the test command.
+- ``limits`` are the resource limits (see `cosmic_ray.limits.ResourceLimits`) for the run.
+- ``max_output`` is the maximum number of bytes of output to return (see `cosmic_ray.limits.BoundedOutput`).
+
+The response is::
+
+    {"returncode": 0, "output": "...", "failed": ["test id", ...], "cpu_time": 1.5}
+
+``returncode`` is the exit status the test command would have had (negative for a child killed by a signal),
+``output`` is what the tests wrote to stdout and stderr, ``failed`` lists the tests which failed, and ``cpu_time`` is
+the CPU time (seconds) that the run used. If the resource limits can't be applied, the run fails with the status
+`cosmic_ray.limits.EXEC_FAILED`.
+
+Anything the daemon itself writes to stderr (e.g. if it can't import the test framework) is logged by the client.
+"""
+
+import importlib
+import json
+import logging
+import os
+import re
+import selectors
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import sysconfig
+import tempfile
+import threading
+import traceback
+from pathlib import Path
+
+from cosmic_ray.limits import DEFAULT_MAX_OUTPUT, EXEC_FAILED, ResourceLimits, read_bounded
+
+log = logging.getLogger(__name__)
+
+# The test frameworks we know how to run in-process.
+FRAMEWORKS = ("pytest", "unittest")
+
+# The environment variable which holds the key of the active mutant of a mutant schema.
+ACTIVE_MUTANT_VAR = "COSMIC_RAY_ACTIVE_MUTANT"
+
+_PYTHON = re.compile(r"python[\d.]*(\.exe)?$")
+
+
+def parse_test_command(command):
+    """Find the test framework and arguments for a test command.
+
+    Returns:
+        A `(framework, args)` tuple, or `None` if the command isn't one that the daemon can run.
+    """
+    args = shlex.split(command)
+    if not args:
+        return None
+
+    if _PYTHON.match(os.path.basename(args[0])) and len(args) >= 3 and args[1] == "-m":
+        framework, args = args[2], args[3:]
+    elif os.path.basename(args[0]) in ("pytest", "py.test"):
+        framework, args = "pytest", args[1:]
+    else:
+        return None
+
+    if framework not in FRAMEWORKS:
+        return None
+
+    return framework, args
+
+
+def command_interpreter(command, cwd=None):
+    """Find the Python interpreter which a test command (as accepted by `parse_test_command`) runs.
+
+    For a command which runs a script such as ``pytest``, this is the interpreter named in the script's ``#!`` line.
+
+    Returns:
+        The path of the interpreter, or `None` if it can't be found.
+    """
+    args = shlex.split(command)
+    if not args:
+        return None
+
+    program = args[0]
+    if cwd is not None and os.path.dirname(program):
+        program = os.path.join(cwd, program)
+    executable = shutil.which(program)
+    if executable is None or _PYTHON.match(os.path.basename(executable)):
+        return executable
+
+    try:
+        with open(executable, "rb") as script:
+            first_line = script.readline(1024)
+    except OSError:
+        return None
+    if not first_line.startswith(b"#!"):
+        return None
+
+    shebang = shlex.split(first_line[2:].decode("utf-8", errors="replace"))
+    if len(shebang) >= 2 and os.path.basename(shebang[0]) == "env":
+        return shutil.which(shebang[1])
+    return shebang[0] if shebang else None
+
+
+def runs_in_this_interpreter(command, cwd=None, env=None):
+    """Whether a test command runs its tests with the same Python (and environment) as Cosmic Ray.
+
+    The daemon always runs the tests with Cosmic Ray's interpreter, so it can't stand in for other test commands.
+    Interpreters other than `sys.executable` itself (such as shims) are asked for their prefix and version, since a
+    virtual environment's interpreter can be a link to the same file as another environment's.
+    """
+    interpreter = command_interpreter(command, cwd)
+    if interpreter is None:
+        return False
+    if os.path.abspath(interpreter) == sys.executable:
+        return True
+
+    try:
+        proc = subprocess.run(
+            [interpreter, "-c", "import sys; print(sys.prefix); print(sys.version)"],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+            check=True,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return proc.stdout.splitlines() == [sys.prefix, *sys.version.splitlines()]
+
+
+class DaemonError(Exception):
+    "Raised when the test daemon doesn't respond properly."
+
+
+class TestDaemon:
+    """The client side of a test daemon.
+
+    The daemon process is started on the first run, and restarted if it dies or has to be killed.
+
+    Args:
+        framework: The name of the test framework (one of `FRAMEWORKS`).
+        args: The command-line arguments for the test framework.
+        env: The environment for the daemon. By default, this is the current environment.
+        cwd: The directory in which to run the tests. By default, this is the current directory.
+    """
+
+    __test__ = False
+
+    def __init__(self, framework, args, env=None, cwd=None):
+        self.framework = framework
+        self.args = list(args)
+        self.env = env
+        self.cwd = cwd
+        self._proc = None
+
+    def run(self, timeout, env=None, limits=None, max_output=DEFAULT_MAX_OUTPUT, mutant=None, tests=None):
+        """Run the tests.
+
+        Args:
+            timeout: The maximum number of seconds to allow the tests to run.
+            env: Additional environment variables for the run.
+            limits: The `ResourceLimits` for the run.
+            max_output: The maximum number of bytes of output to return.
+            mutant: The key of the mutant to activate in a mutant schema, if any.
+            tests: The IDs of the tests to run. By default, all of the tests are run.
+
+        Returns:
+            The response from the daemon (see the module documentation).
+
+        Raises:
+            subprocess.TimeoutExpired: The tests didn't finish in time. The daemon and the test run are killed.
+            DaemonError: The daemon didn't produce a response.
+        """
+        if self._proc is None or self._proc.poll() is not None:
+            self._start()
+
+        request = {"env": env or {}, "max_output": max_output}
+        if mutant is not None:
+            request["mutant"] = mutant
+        if tests is not None:
+            request["tests"] = list(tests)
+        if limits:
+            request["limits"] = limits.as_dict()
+        request = json.dumps(request) + "\n"
+        try:
+            self._proc.stdin.write(request.encode("utf-8"))
+            self._proc.stdin.flush()
+        except OSError as exc:
+            self.stop()
+            raise DaemonError("Unable to send request to test daemon") from exc
+
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._proc.stdout, selectors.EVENT_READ)
+            if not selector.select(timeout):
+                self.stop()
+                raise subprocess.TimeoutExpired(self.framework, timeout)
+
+        line = self._proc.stdout.readline()
+        if not line:
+            self.stop()
+            raise DaemonError("Test daemon exited unexpectedly")
+
+        return json.loads(line)
+
+    def stop(self):
+        "Stop the daemon, along with any test run in progress."
+        if self._proc is None:
+            return
+
+        try:
+            # The daemon is the leader of its own process group, which includes its children.
+            os.killpg(self._proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self._proc.wait()
+        self._proc.stdin.close()
+        self._proc.stdout.close()
+        self._proc = None
+
+    def _start(self):
+        log.info("Starting test daemon: %s %s", self.framework, self.args)
+        self._proc = subprocess.Popen(  # pylint: disable=consider-using-with
+            [sys.executable, "-m", "cosmic_ray.daemon", self.framework, json.dumps(self.args)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.env,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+        threading.Thread(target=_log_stderr, args=(self._proc.stderr,), daemon=True).start()
+
+
+def _log_stderr(stream):
+    "Log the lines of a daemon's stderr until it's closed."
+    with stream:
+        for line in stream:
+            log.warning("Test daemon: %s", line.decode("utf-8", errors="replace").rstrip())
+
+
+def serve(framework, args, requests=sys.stdin, responses=sys.stdout):
+    """Run the daemon, handling requests until `requests` is exhausted."""
+    importlib.import_module(framework)
+    if sys.pycache_prefix is None:
+        # Without a separate bytecode cache (see `cosmic_ray.bytecode`), bytecode for mutated modules could be stale.
+        sys.dont_write_bytecode = True
+    project_dir = Path.cwd().resolve()
+
+    for line in requests:
+        request = json.loads(line)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            response, imported = _run_in_child(framework, args, request, project_dir, Path(tmpdir))
+        responses.write(json.dumps(response) + "\n")
+        responses.flush()
+
+        # Import what the tests needed so that the next child has it already.
+        for name in imported:
+            if name not in sys.modules:
+                try:
+                    importlib.import_module(name)
+                except BaseException:  # pylint: disable=broad-except
+                    log.debug("Unable to preload %s", name, exc_info=True)
+
+
+def _run_in_child(framework, args, request, project_dir, tmpdir):
+    "Fork a child to run the tests, returning the response and the names of the modules the child imported."
+    output_path = tmpdir / "output"
+    report_path = tmpdir / "report.json"
+
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover (this runs in the child)
+        returncode = 1
+        try:
+            returncode = _child(framework, args, request, project_dir, output_path, report_path)
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(returncode)  # pylint: disable=protected-access
+
+    _, status, usage = os.wait4(pid, 0)
+    returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+    max_output = request.get("max_output", DEFAULT_MAX_OUTPUT)
+    output = read_bounded(output_path, max_output) if output_path.exists() else ""
+    try:
+        report = json.loads(report_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        report = {"failed": [], "imported": []}
+
+    response = {
+        "returncode": returncode,
+        "output": output,
+        "failed": report["failed"],
+        "cpu_time": usage.ru_utime + usage.ru_stime,
+    }
+    return response, report["imported"]
+
+
+def _child(framework, args, request, project_dir, output_path, report_path):
+    "Run the tests in a forked child, returning the exit status."
+    # The test output goes to a file, and the tests mustn't read the daemon's requests.
+    output_fd = os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    os.dup2(output_fd, 1)
+    os.dup2(output_fd, 2)
+
+    if "limits" in request:
+        try:
+            ResourceLimits.from_dict(request["limits"]).apply()
+        except (ValueError, OSError):
+            traceback.print_exc()
+            return EXEC_FAILED
+    os.environ.update(request.get("env", {}))
+    if request.get("mutant") is not None:
+        os.environ[ACTIVE_MUTANT_VAR] = request["mutant"]
+    for name, module in list(sys.modules.items()):
+        if _is_project_module(module, project_dir):
+            del sys.modules[name]
+    importlib.invalidate_caches()
+    already_imported = set(sys.modules)
+
+    if framework == "pytest":
+        returncode, failed = _run_pytest(args, request.get("tests"))
+    else:
+        returncode, failed = _run_unittest(args, request.get("tests"))
+
+    imported = [
+        name
+        for name, module in sys.modules.items()
+        if name not in already_imported and not _is_project_module(module, project_dir)
+    ]
+    report_path.write_text(json.dumps({"failed": failed, "imported": imported}), encoding="utf-8")
+    return returncode
+
+
+def _run_pytest(args, tests=None):
+    import pytest  # pylint: disable=import-outside-toplevel
+
+    class Collector:
+        "Pytest plugin which runs only the tests in `tests` (if given), and collects the IDs of failed tests."
+
+        def __init__(self):
+            self.failed = []
+
+        def pytest_collection_modifyitems(self, config, items):  # pylint: disable=missing-function-docstring
+            if tests is None:
+                return
+            selected = set(tests)
+            config.hook.pytest_deselected(items=[item for item in items if item.nodeid not in selected])
+            items[:] = [item for item in items if item.nodeid in selected]
+
+        def pytest_runtest_logreport(self, report):  # pylint: disable=missing-function-docstring
+            if report.failed:
+                self.failed.append(report.nodeid)
+
+    collector = Collector()
+    sys.argv = ["pytest"] + args
+    returncode = pytest.main(args, plugins=[collector])
+    return int(returncode), collector.failed
+
+
+def _run_unittest(args, tests=None):
+    import unittest  # pylint: disable=import-outside-toplevel
+
+    if tests is not None:
+        # Test IDs are the dotted names of the test methods, which unittest accepts as arguments.
+        args = list(tests)
+        if not args:
+            return 0, []
+    sys.argv = ["python -m unittest"] + args
+    program = unittest.main(module=None, argv=sys.argv, exit=False)
+    failed = [test.id() for test, _ in program.result.failures + program.result.errors]
+    return (0 if program.result.wasSuccessful() else 1), failed
+
+
+def _is_project_module(module, project_dir):
+    "Whether `module` is part of the project under test (rather than the standard library or a third-party package)."
+    filename = getattr(module, "__file__", None)
+    if not filename:
+        return False
+
+    path = Path(filename).resolve()
+    if "site-packages" in path.parts or "dist-packages" in path.parts:
+        return False
+
+    stdlib = Path(sysconfig.get_paths()["stdlib"]).resolve()
+    if stdlib in path.parents:
+        return False
+
+    return project_dir in path.parents
+
+
+def main(argv=None):
+    "Run the daemon for the framework and arguments on the command line."
+    argv = sys.argv[1:] if argv is None else argv
+    framework, args = argv[0], json.loads(argv[1])
+    serve(framework, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,18 +15,44 @@ configure the list of worker URLs in ``cosmic-ray.distributor.http.worker-urls``
 
     [cosmic-ray.distributor.http]
     worker-urls = ['http://localhost:9876', 'http://localhost:9877']
+
+Each URL is sent one request at a time. A worker started with ``cosmic-ray http-worker --slots N`` can test ``N``
+mutants at once, each in its own copy of the project (see :mod:`cosmic_ray.workspace`), so list its URL ``N`` times.
+
+If the session has a bundle of project files (see :mod:`cosmic_ray.bundle`), each worker is sent the files it doesn't
+already have before it's sent any jobs, and it runs the jobs in the bundle rather than in its current directory.
+
+Set ``speculate = true`` to have idle workers run the jobs which are still running at the end of a session again,
+keeping whichever result comes first (see :mod:`cosmic_ray.distribution.speculation`). The worker running an attempt
+which is no longer needed stops its tests.
+
+Set ``send-edits = true`` to work out each mutation on the coordinator and send the workers the edit to make, rather
+than having them parse the modules themselves (see :mod:`cosmic_ray.distribution.jobs`).
 """
 
 import asyncio
+import contextlib
+import functools
 import logging
-from pathlib import Path
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 import aiohttp
 from aiohttp import web
 
+from cosmic_ray.bundle import BundleStore, bundle
 from cosmic_ray.distribution.distributor import Distributor
-from cosmic_ray.mutating import mutate_and_test
-from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.distribution.jobs import (
+    PrecomputedEdits,
+    WorkerWorkspaces,
+    job_parameters,
+    result_from_parameters,
+    result_parameters,
+    run_job,
+)
+from cosmic_ray.distribution.speculation import Speculation
+from cosmic_ray.scheduling import work_queue
+from cosmic_ray.work_item import WorkItem, WorkResult, WorkerOutcome
 
 log = logging.getLogger(__name__)
 
@@ -43,8 +69,7 @@ class HttpDistributor(Distributor):
         # - which writes results to the database - be able to complete, or will it be blocked? Do we have to copy the
         # pending work as we used to do?
 
-        # TODO: Will there be an event loop? Where should we ensure that there is?
-        asyncio.get_event_loop().run_until_complete(self._process(*args, **kwargs))
+        asyncio.run(self._process(*args, **kwargs))
 
     async def _process(self, pending_work, test_command, timeout, config, on_task_complete):
         urls = config.get("worker-urls", [])
@@ -52,26 +77,49 @@ class HttpDistributor(Distributor):
         if not urls:
             raise ValueError("No worker URLs provided for HttpDistributor")
 
+        session_bundle = bundle()
+        if session_bundle is not None:
+            await asyncio.gather(*(sync_bundle(url, session_bundle) for url in set(urls)))
+
+        edits = PrecomputedEdits() if config.get("send-edits", False) else None
+        speculation = Speculation.from_config(config)
         fetchers = {}
 
+        def start(url, work_item):
+            fetcher = asyncio.create_task(send_request(url, work_item, test_command, timeout, edits))
+            fetchers[fetcher] = url, work_item.job_id
+            if speculation is not None:
+                speculation.started(work_item)
+
         async def handle_completed_task(task):
             # TODO: If one of the URLs we've got is bad (i.e. no worker is running on it), that will result in an
             # exception from one of the tasks. We should notice this, log it, and remove the offending URL from the
             # pool.
 
-            url, completed_job_id = fetchers[task]
+            url, completed_job_id = fetchers.pop(task)
+            urls.append(url)
+            if task.cancelled():
+                # Another attempt at the job has already finished.
+                return
+
             try:
                 result = await task
             except Exception as exc:
                 # TODO: Do something with the exception
                 log.exception("Error fetching result")
                 result = WorkResult(worker_outcome=WorkerOutcome.ABNORMAL, output=str(exc))
-            finally:
-                del fetchers[task]
-                urls.append(url)
-                on_task_complete(completed_job_id, result)
 
-        for work_item in pending_work:
+            if speculation is not None:
+                result = speculation.finished(completed_job_id, result)
+                if result is None:
+                    return
+                for other, (_, job_id) in fetchers.items():
+                    if job_id == completed_job_id:
+                        other.cancel()
+            on_task_complete(completed_job_id, result)
+
+        work = work_queue(pending_work)
+        while True:
             # Wait for an available URL
             while not urls:
                 assert fetchers.keys()
@@ -81,19 +129,37 @@ class HttpDistributor(Distributor):
 
             assert urls, "URL should always be available"
 
-            # Use an available URL to process the task
-            url = urls.pop()
-            fetcher = asyncio.create_task(send_request(url, work_item, test_command, timeout))
-            fetchers[fetcher] = url, work_item.job_id
+            # Use an available URL to process the next task for its worker. (A worker with several slots has its URL
+            # listed several times, and its slots share the worker's caches.)
+            work_item = work.take(urls[-1])
+            if work_item is None:
+                break
+            start(urls.pop(), work_item)
 
         # Drain the remaining work
-        if fetchers.keys():
-            done, pending = await asyncio.wait(fetchers.keys(), return_when=asyncio.ALL_COMPLETED)
+        while fetchers:
+            delay = None
+            if speculation is not None:
+                _speculate(speculation, urls, fetchers, start)
+                if urls:
+                    delay = speculation.delay()
+            done, pending = await asyncio.wait(fetchers.keys(), timeout=delay, return_when=asyncio.FIRST_COMPLETED)
             for task in done:
                 await handle_completed_task(task)
 
 
-async def send_request(url, work_item: WorkItem, test_command, timeout):
+def _speculate(speculation, urls, fetchers, start):
+    "Use the available URLs to start other attempts at running jobs, each on a worker which isn't already running it."
+    for work_item in speculation.candidates():
+        busy = {url for url, job_id in fetchers.values() if job_id == work_item.job_id}
+        url = next((url for url in urls if url not in busy), None)
+        if url is not None:
+            log.info("Running job %s again speculatively on %s", work_item.job_id, url)
+            urls.remove(url)
+            start(url, work_item)
+
+
+async def send_request(url, work_item: WorkItem, test_command, timeout, edits=None):
     """Sends a mutate-and-test request to a worker.
 
     Args:
@@ -101,67 +167,85 @@ async def send_request(url, work_item: WorkItem, test_command, timeout):
         work_item: The `WorkItem` representing the work to be done.
         test_command: The command that the worker should use to run the tests.
         timeout: The maximum number of seconds to spend running the test.
+        edits: The `PrecomputedEdits` with which to send the edits for the mutations, if any.
 
     Returns: A `WorkResult`.
     """
-    parameters = {
-        "mutations": [
-            {
-                "module_path": str(mutation.module_path),
-                "operator": mutation.operator_name,
-                "occurrence": mutation.occurrence,
-            }
-            for mutation in work_item.mutations
-        ],
-        "test_command": test_command,
-        "timeout": timeout,
-    }
+    parameters = job_parameters(work_item, test_command, timeout, edits)
     log.info("Sending HTTP request to %s", url)
     async with aiohttp.request("POST", url, json=parameters) as resp:
-        result = await resp.json()
         # TODO: Account for possibility that `data` is the wrong shape.
-        return WorkResult(
-            worker_outcome=result["worker_outcome"],
-            output=result["output"],
-            test_outcome=result["test_outcome"],
-            diff=result["diff"],
-        )
+        return result_from_parameters(await resp.json())
+
+
+async def sync_bundle(url, session_bundle):
+    """Make sure that a worker has all of the files in a bundle, and that it runs its jobs in that bundle.
+
+    Args:
+        url: The URL of the worker.
+        session_bundle: The `cosmic_ray.bundle.Bundle`.
+
+    Raises:
+        ConnectionError: The worker didn't accept the bundle.
+    """
+    bundle_url = url.rstrip("/") + "/bundle"
+    manifest = {"files": session_bundle.files, "executable": sorted(session_bundle.executable)}
+    async with aiohttp.ClientSession(raise_for_status=True) as session:
+        async with session.post(bundle_url, json=manifest) as resp:
+            missing = (await resp.json())["missing"]
+
+        log.info("Sending %s of %s bundled files to %s", len(missing), len(session_bundle.files), url)
+        for digest in missing:
+            async with session.put(f"{bundle_url}/files/{digest}", data=session_bundle.blobs[digest]):
+                pass
 
+        async with session.post(bundle_url, json=manifest) as resp:
+            missing = (await resp.json())["missing"]
+        if missing:
+            raise ConnectionError(f"Worker at {url} is still missing {len(missing)} bundled files")
 
-async def handle_mutate_and_test(request):
-    """HTTP endpoint handler for requests to mutate-and-test."""
-    args = await request.json()
-    result = mutate_and_test(
-        mutations=[
-            MutationSpec(
-                module_path=Path(mutation["module_path"]),
-                operator_name=mutation["operator"],
-                occurrence=mutation["occurrence"],
-                # TODO: These are not really used, but we have to provide
-                # them because MutationSpec requires them. This is the genesis of the old
-                # distinction between MutationSpec and ResolvedMutationSpec. How should we
-                # really address this?
-                start_pos=(0, 0),
-                end_pos=(0, 1),
-            )
-            for mutation in args["mutations"]
-        ],
-        test_command=args["test_command"],
-        timeout=args["timeout"],
-    )
+
+async def handle_mutate_and_test(request, workspaces=None):
+    """HTTP endpoint handler for requests to mutate-and-test.
+
+    Args:
+        request: The request.
+        workspaces: The `WorkerWorkspaces` in which to handle requests. By default, requests are handled one at a time
+            in the current directory.
+    """
+    if workspaces is None:
+        result = await run_job(await request.json())
+    else:
+        result = await run_job(await request.json(), workspaces.slots, workspaces.executor)
     # TODO: Deal with exceptions. There generally won't be any, so we can just return an abnormal result if there it.
 
-    return web.json_response(
-        {
-            "worker_outcome": result.worker_outcome.value,
-            "output": result.output,
-            "test_outcome": result.test_outcome.value if result.test_outcome is not None else None,
-            "diff": result.diff,
-        }
-    )
+    return web.json_response(result_parameters(result))
 
 
-def run_worker(port=None, path=None):
+async def handle_sync_bundle(request, workspaces):
+    """HTTP endpoint handler for requests to use a bundle.
+
+    The request lists the files in the bundle (and which of them are executable), and the response lists the hashes of
+    those the worker doesn't have yet. If there are none, the worker runs any further jobs in the bundle.
+    """
+    manifest = await request.json()
+    try:
+        missing = workspaces.sync_bundle(manifest["files"], manifest.get("executable", ()))
+    except ValueError as exc:
+        raise web.HTTPBadRequest(text=str(exc))
+    return web.json_response({"missing": missing})
+
+
+async def handle_bundle_file(request, workspaces):
+    "HTTP endpoint handler for requests to add a file, compressed with zlib, to the worker's bundle store."
+    try:
+        workspaces.bundle_store.add(request.match_info["digest"], await request.read())
+    except ValueError as exc:
+        raise web.HTTPBadRequest(text=str(exc))
+    return web.json_response({})
+
+
+def run_worker(port=None, path=None, slots=1, workspace_dir=None, bundle_cache=None):
     """Run the worker HTTP server.
 
     You must specify either `port` or `path`, but not both.
@@ -169,9 +253,28 @@ def run_worker(port=None, path=None):
     Args:
         port: The TCP port on which to listen.
         path: Path to Unix domain socket on which to listen.
+        slots: The number of requests to handle at once. If this is more than one, each request is handled in its own
+            copy of the current directory (see `cosmic_ray.workspace`).
+        workspace_dir: The directory in which to put the copies of the current directory.
+        bundle_cache: The directory in which to keep bundled files (see `cosmic_ray.bundle`). By default, they're kept
+            in a temporary directory until the worker exits.
     """
     if port is None and path is None:
         raise ValueError("Worker requires either a port or domain socket path")
-    app = web.Application()
-    app.add_routes([web.post("/", handle_mutate_and_test)])
-    web.run_app(app, port=port, path=path)
+
+    with contextlib.ExitStack() as stack:
+        if bundle_cache is None:
+            bundle_cache = stack.enter_context(tempfile.TemporaryDirectory(prefix="cosmic-ray-bundles-"))
+        executor = stack.enter_context(ThreadPoolExecutor(max_workers=slots))
+        workspaces = stack.enter_context(WorkerWorkspaces(slots, workspace_dir, executor, BundleStore(bundle_cache)))
+
+        app = web.Application()
+        app.add_routes(
+            [
+                web.post("/", functools.partial(handle_mutate_and_test, workspaces=workspaces)),
+                web.post("/bundle", functools.partial(handle_sync_bundle, workspaces=workspaces)),
+                web.put("/bundle/files/{digest}", functools.partial(handle_bundle_file, workspaces=workspaces)),
+            ]
+        )
+        # Cancel handlers when the coordinator gives up on a request, so that cancelled jobs stop their tests.
+        web.run_app(app, port=port, path=path, handler_cancellation=True)
@@ -0,0 +1,325 @@
+"""Support for sending jobs to remote workers and running them there.
+
+The remote distributors (e.g. :mod:`cosmic_ray.distribution.http`) describe each job with a JSON-serializable dict of
+*job parameters*, and each result with a dict of *result parameters*. This module converts to and from those, and runs
+jobs on the worker side.
+
+Precomputed edits
+=================
+
+Normally a worker works out each mutation for itself, by parsing the module and finding the mutation in the parse
+tree. Alternatively, the coordinator can work out the `cosmic_ray.mutating.SourceEdit` for each mutation with
+`PrecomputedEdits` and send it, along with a hash of the module's source, as part of the job. The worker then just
+checks the hash and applies the edit, so it never parses the module. If the worker's copy of the module doesn't match
+the hash, the job fails straight away rather than testing the wrong mutant.
+"""
+
+import asyncio
+import functools
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+
+from cosmic_ray.limits import DEFAULT_MAX_OUTPUT, ResourceLimits
+from cosmic_ray.mutating import (
+    DEFAULT_MAX_MODULES,
+    ModuleCache,
+    PrecomputedEdit,
+    SourceEdit,
+    mutate_and_test,
+    mutation_operator,
+    mutation_operator_key,
+    source_hash,
+)
+from cosmic_ray.testing import Cancellation, max_output, resource_limits
+from cosmic_ray.util import read_python_source
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult
+from cosmic_ray.workspace import WorkspacePool
+
+log = logging.getLogger(__name__)
+
+
+def job_parameters(work_item: WorkItem, test_command, timeout, edits=None):
+    """The parameters of the job for `work_item`.
+
+    The current resource limits and maximum output size (see `cosmic_ray.testing`) are included, so that workers use
+    the same ones as the coordinator.
+
+    Args:
+        work_item: The work item.
+        test_command: The command that the worker should use to run the tests.
+        timeout: The maximum number of seconds to spend running the test.
+        edits: The `PrecomputedEdits` with which to include the edits for the mutations, if any.
+    """
+    precomputed = edits.for_work_item(work_item) if edits is not None else [None] * len(work_item.mutations)
+    return {
+        "mutations": [
+            _mutation_parameters(mutation, precomputed_edit)
+            for mutation, precomputed_edit in zip(work_item.mutations, precomputed)
+        ],
+        "test_command": test_command,
+        "timeout": timeout,
+        "resource_limits": resource_limits().as_dict(),
+        "max_output": max_output(),
+    }
+
+
+def _mutation_parameters(mutation: MutationSpec, precomputed_edit):
+    parameters = {
+        "module_path": str(mutation.module_path),
+        "operator": mutation.operator_name,
+        "occurrence": mutation.occurrence,
+        "start_pos": mutation.start_pos,
+        "end_pos": mutation.end_pos,
+    }
+    if precomputed_edit is not None:
+        edit = precomputed_edit.edit
+        parameters["source_hash"] = precomputed_edit.source_hash
+        parameters["edit"] = None if edit is None else [edit.start, edit.end, edit.replacement]
+    return parameters
+
+
+def _precomputed_edit(parameters):
+    "The `PrecomputedEdit` in the parameters of a mutation, if there is one."
+    if "source_hash" not in parameters:
+        return None
+    edit = parameters["edit"]
+    return PrecomputedEdit(parameters["source_hash"], None if edit is None else SourceEdit(*edit))
+
+
+def result_parameters(result: WorkResult):
+    "The parameters describing `result`."
+    return {
+        "worker_outcome": result.worker_outcome.value,
+        "output": result.output,
+        "test_outcome": result.test_outcome.value if result.test_outcome is not None else None,
+        "diff": result.diff,
+        "duration": result.duration,
+    }
+
+
+def result_from_parameters(parameters) -> WorkResult:
+    "Create the `WorkResult` described by the result parameters `parameters`."
+    return WorkResult(
+        worker_outcome=parameters["worker_outcome"],
+        output=parameters["output"],
+        test_outcome=parameters["test_outcome"],
+        diff=parameters["diff"],
+        duration=parameters.get("duration"),
+    )
+
+
+async def run_job(parameters, slots=None, executor=None) -> WorkResult:
+    """Run the job described by the job parameters `parameters`.
+
+    If the job is run in an executor and this is cancelled, the job's tests are stopped.
+
+    Args:
+        parameters: The job parameters.
+        slots: The `WorkspaceSlots` in which to run jobs. By default, jobs are run in the current directory.
+        executor: The executor in which to run the job if `slots` isn't given. By default, the job is run in the event
+            loop's thread.
+    """
+    edits = [_precomputed_edit(mutation) for mutation in parameters["mutations"]]
+    run = functools.partial(
+        mutate_and_test,
+        mutations=[
+            MutationSpec(
+                module_path=Path(mutation["module_path"]),
+                operator_name=mutation["operator"],
+                occurrence=mutation["occurrence"],
+                # Workers use the position to locate the mutation directly. Requests from older coordinators don't
+                # include it, so we fall back to placeholders, which makes the worker look the mutation up by
+                # occurrence.
+                start_pos=tuple(mutation.get("start_pos", (0, 0))),
+                end_pos=tuple(mutation.get("end_pos", (0, 1))),
+            )
+            for mutation in parameters["mutations"]
+        ],
+        test_command=parameters["test_command"],
+        timeout=parameters["timeout"],
+        edits=edits if any(edit is not None for edit in edits) else None,
+        # Jobs run concurrently, so their limits are passed along rather than set for the whole process.
+        limits=ResourceLimits.from_dict(parameters.get("resource_limits", {})),
+        max_output=parameters.get("max_output", DEFAULT_MAX_OUTPUT),
+    )
+
+    if slots is None and executor is None:
+        return run()
+
+    # If we're cancelled (e.g. the coordinator no longer needs the result), stop the tests so the slot is freed.
+    cancellation = Cancellation()
+    run = functools.partial(run, cancellation=cancellation)
+    try:
+        if slots is not None:
+            return await asyncio.get_running_loop().run_in_executor(slots.executor, slots.run, run)
+        return await asyncio.get_running_loop().run_in_executor(executor, run)
+    except asyncio.CancelledError:
+        cancellation.cancel()
+        raise
+
+
+class PrecomputedEdits:
+    """Calculates the edits for the mutations of work items, so that workers don't have to.
+
+    The most recently used modules are kept in a `cosmic_ray.mutating.ModuleCache`, so each module is normally only
+    parsed once.
+
+    Args:
+        max_modules: The maximum number of modules to keep.
+    """
+
+    def __init__(self, max_modules=DEFAULT_MAX_MODULES):
+        self._modules = ModuleCache(max_modules)
+
+    def for_work_item(self, work_item: WorkItem):
+        """The `PrecomputedEdit` for each of the mutations of `work_item`.
+
+        Edits are only calculated for work items with a single mutation, since the edits for later mutations in a
+        module depend on the earlier ones. Otherwise, and if the edit can't be calculated (in which case the worker
+        will report the problem), the edit is `None`.
+        """
+        if len(work_item.mutations) != 1:
+            return [None] * len(work_item.mutations)
+
+        mutation = work_item.mutations[0]
+        try:
+            source = read_python_source(mutation.module_path)
+            edit = self._modules.get(source).mutation_edit(
+                mutation_operator_key(mutation),
+                mutation_operator(mutation),
+                mutation.occurrence,
+                mutation.start_pos,
+                mutation.end_pos,
+            )
+        except Exception:  # noqa # pylint: disable=broad-except
+            log.warning("Unable to calculate the edit for job %s", work_item.job_id, exc_info=True)
+            return [None]
+
+        return [PrecomputedEdit(source_hash(source), edit)]
+
+
+class WorkspaceSlots:
+    """Runs jobs in the slots of a `WorkspacePool`, each on its own thread.
+
+    Args:
+        pool: The pool of slots.
+        executor: An executor with one thread per slot.
+    """
+
+    def __init__(self, pool, executor):
+        self.executor = executor
+        self._free = queue.SimpleQueue()
+        for slot in pool.slots:
+            self._free.put(slot)
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._retired = False
+
+    def run(self, job):
+        """Call `job` with the keyword argument `workspace` set to a free slot.
+
+        This is called on one of the executor's threads. There's one thread per slot, so a slot is always free.
+
+        Raises:
+            ValueError: The slots have been retired.
+        """
+        with self._lock:
+            if self._retired:
+                raise ValueError("The workspace slots have been replaced")
+            self._busy += 1
+
+        slot = self._free.get_nowait()
+        try:
+            return job(workspace=slot)
+        finally:
+            self._free.put(slot)
+            with self._lock:
+                self._busy -= 1
+
+    def retire(self):
+        """Stop running jobs in the slots, so that their pool can be closed.
+
+        Raises:
+            ValueError: Jobs are still running in the slots.
+        """
+        with self._lock:
+            if self._busy:
+                raise ValueError(f"{self._busy} jobs are still running in the current workspace slots")
+            self._retired = True
+
+
+class WorkerWorkspaces:
+    """The places in which a worker runs its jobs.
+
+    To begin with, a worker runs its jobs in the current directory or, if it has more than one slot, in workspace
+    slots copied from it. Once the worker has been synced to a bundle (see `cosmic_ray.bundle`), it runs its jobs in
+    workspace slots copied from the bundle instead.
+
+    This is a context-manager which removes the workspace slots on exit.
+
+    Args:
+        num_slots: The number of jobs to run at once.
+        workspace_dir: The directory in which to put workspace slots.
+        executor: An executor with `num_slots` threads.
+        bundle_store: The `cosmic_ray.bundle.BundleStore` in which to keep bundled files, or `None` if the worker
+            doesn't accept bundles.
+    """
+
+    def __init__(self, num_slots, workspace_dir, executor, bundle_store=None):
+        self.executor = executor
+        self.bundle_store = bundle_store
+        self._num_slots = num_slots
+        self._workspace_dir = workspace_dir
+        self._pool = None
+        self._root = None
+
+        # The `WorkspaceSlots` to pass to `run_job`, or `None` to run jobs in the current directory.
+        self.slots = None
+        if num_slots > 1:
+            self._use_tree(os.getcwd())
+
+    def sync_bundle(self, files, executable=()):
+        """Start running jobs in the bundle with the files `files`, if the store has all of them.
+
+        Args:
+            files: A dict mapping the paths of the bundle's files to their hashes.
+            executable: The paths of the bundle's files which are executable.
+
+        Returns: The hashes of the files which are missing from the store. If there are any, nothing changes.
+
+        Raises:
+            ValueError: The worker doesn't accept bundles, or it's running jobs in a different tree (whose slots can't
+                be removed until the jobs have finished).
+        """
+        if self.bundle_store is None:
+            raise ValueError("This worker doesn't accept bundles")
+
+        missing = self.bundle_store.missing(files)
+        if not missing:
+            root = self.bundle_store.checkout(files, executable)
+            if root != self._root:
+                self._use_tree(root)
+        return missing
+
+    def _use_tree(self, root):
+        if self.slots is not None:
+            self.slots.retire()
+        self.close()
+        self._pool = WorkspacePool(root, self._num_slots, self._workspace_dir)
+        self._root = root
+        self.slots = WorkspaceSlots(self._pool, self.executor)
+
+    def close(self):
+        "Remove the workspace slots."
+        if self._pool is not None:
+            self._pool.close()
+        self._pool = self._root = self.slots = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
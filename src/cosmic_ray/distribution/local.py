@@ -9,12 +9,63 @@ To use the local distributor, set ``cosmic-ray.distributor.name = "local"`` in y
 
     [cosmic-ray.distributor]
     name = "local"
+
+Parallel execution
+==================
+
+The local distributor can test several mutants at once, each in its own copy (see :mod:`cosmic_ray.workspace`) of the
+directory in which you run ``cosmic-ray exec``. The copies are made mostly out of hard links to the original files, and
+are removed when the run finishes. To enable this, set ``slots`` to the number of mutants to test at once.
+``workspace-dir`` says where to put the copies. It defaults to a ``.cosmic-ray-workspaces`` directory in the project,
+and hard links are only used if it's on the same file system as the project:
+
+.. code-block:: toml
+
+    [cosmic-ray.distributor.local]
+    slots = 4
+    workspace-dir = "/dev/shm"
+
+Speculation
+===========
+
+With ``slots``, the local distributor can use slots which would otherwise be idle at the end of a session to run the
+jobs which are still running again, keeping whichever result comes first (see
+:mod:`cosmic_ray.distribution.speculation`). To enable this, set ``speculate = true``:
+
+.. code-block:: toml
+
+    [cosmic-ray.distributor.local]
+    slots = 4
+    speculate = true
+
+Mutant schemata
+===============
+
+The local distributor can test mutants using mutant schemata (see :mod:`cosmic_ray.schemata`). Each mutated module is
+rewritten once with all of its mutants, and the mutant to test is selected when the tests are run. Mutants which can't
+be put in a schema are tested individually. To enable this, set ``schemata = true``:
+
+.. code-block:: toml
+
+    [cosmic-ray.distributor.local]
+    schemata = true
+
+Mutant schemata can't be combined with ``slots``, so the mutants are tested one at a time. Since all of the pending
+work is taken up front to write the schemata, they also can't be combined with ``exec --sample``, ``--fail-over`` or
+``--shared``, which rely on work being taken only as it's run.
 """
 
 import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from cosmic_ray.distribution.distributor import Distributor
+from cosmic_ray.distribution.speculation import Speculation
 from cosmic_ray.mutating import mutate_and_test
+from cosmic_ray.scheduling import work_queue
+from cosmic_ray.schemata import run_with_schemata
+from cosmic_ray.testing import Cancellation
+from cosmic_ray.workspace import WorkspacePool
 
 log = logging.getLogger(__name__)
 
@@ -22,7 +73,26 @@ log = logging.getLogger(__name__)
 class LocalDistributor(Distributor):
     "The local distributor."
 
-    def __call__(self, pending_work, test_command, timeout, _distributor_config, on_task_complete):
+    def __call__(self, pending_work, test_command, timeout, distributor_config, on_task_complete):
+        slots = int(distributor_config.get("slots", 1))
+        if distributor_config.get("schemata", False):
+            if slots > 1:
+                log.warning("Mutant schemata can't be used with slots, so mutants will be tested one at a time")
+            run_with_schemata(pending_work, test_command, timeout, on_task_complete)
+            return
+
+        if slots > 1:
+            with WorkspacePool(os.getcwd(), slots, distributor_config.get("workspace-dir")) as pool:
+                _run_in_slots(
+                    pool.slots,
+                    pending_work,
+                    test_command,
+                    timeout,
+                    on_task_complete,
+                    Speculation.from_config(distributor_config),
+                )
+            return
+
         for work_item in pending_work:
             result = mutate_and_test(
                 mutations=work_item.mutations,
@@ -30,3 +100,63 @@ class LocalDistributor(Distributor):
                 timeout=timeout,
             )
             on_task_complete(work_item.job_id, result)
+
+
+def _run_in_slots(slots, pending_work, test_command, timeout, on_task_complete, speculation=None):
+    """Run work items concurrently, each in a free workspace slot.
+
+    Work items are only taken from `pending_work` when a slot is free, for that slot (see
+    `cosmic_ray.scheduling.work_queue`), and `on_task_complete` is always called from the calling thread. Once all of
+    the work items have been taken, free slots are used to attempt running work items again if `speculation` (a
+    `Speculation`) is given.
+    """
+    free_slots = list(slots)
+    running = {}
+
+    def start(work_item, slot):
+        cancellation = Cancellation()
+        future = executor.submit(
+            mutate_and_test, work_item.mutations, test_command, timeout, workspace=slot, cancellation=cancellation
+        )
+        running[future] = work_item.job_id, slot, cancellation
+        if speculation is not None:
+            speculation.started(work_item)
+
+    def complete(futures):
+        for future in futures:
+            job_id, slot, _ = running.pop(future)
+            free_slots.append(slot)
+            result = future.result()
+            if speculation is not None:
+                result = speculation.finished(job_id, result)
+                if result is None:
+                    continue
+                for other_job_id, _, cancellation in running.values():
+                    if other_job_id == job_id:
+                        cancellation.cancel()
+            on_task_complete(job_id, result)
+
+    work = work_queue(pending_work)
+    with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+        while True:
+            if not free_slots:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                complete(done)
+            # Each slot is a worker with its own copy of the project (and test daemon, if any).
+            work_item = work.take(free_slots[-1])
+            if work_item is None:
+                break
+            start(work_item, free_slots.pop())
+
+        while running:
+            delay = None
+            if speculation is not None:
+                for work_item in speculation.candidates():
+                    if not free_slots:
+                        break
+                    log.info("Running job %s again speculatively", work_item.job_id)
+                    start(work_item, free_slots.pop())
+                if free_slots:
+                    delay = speculation.delay()
+            done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+            complete(done)
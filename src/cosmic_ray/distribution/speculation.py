@@ -0,0 +1,107 @@
+"""Speculative re-execution of the jobs which are still running at the end of a session.
+
+At the end of a session there's no more work to hand out, so most workers sit idle while the last few jobs finish. If
+one of those jobs is slow, or is running on a slow worker, the whole session waits for it. With speculation enabled,
+a distributor which has an idle worker and no more work starts another attempt at the oldest job that's still
+running. The first attempt to finish provides the result, and the others are cancelled. A result recording an
+abnormal end of a job (e.g. a lost connection to a worker) is only used if no other attempt at the job is still
+running.
+
+The local distributor (with ``slots``) and the http distributor support speculation. To enable it, set
+``speculate = true`` in the distributor's configuration. ``speculate-after`` is the number of seconds for which a job
+must have been running before it's attempted again, which is 0 by default:
+
+.. code-block:: toml
+
+    [cosmic-ray.distributor.http]
+    worker-urls = ['http://localhost:9876', 'http://localhost:9877']
+    speculate = true
+    speculate-after = 10
+
+Each job is attempted at most twice. The ``attempts`` of each result records the number of attempts started at the
+job.
+"""
+
+import time
+
+from attrs import evolve
+
+from cosmic_ray.work_item import WorkerOutcome
+
+# The most attempts to make at a job.
+MAX_ATTEMPTS = 2
+
+
+class _Job:
+    def __init__(self, work_item):
+        self.work_item = work_item
+        self.started = time.monotonic()
+        self.attempts = 0
+        self.running = 0
+
+
+class Speculation:
+    """Keeps track of the attempts at each running job, and chooses which to attempt again.
+
+    Args:
+        min_age: The number of seconds for which a job must have been running before it's attempted again.
+        max_attempts: The most attempts to make at a job.
+    """
+
+    def __init__(self, min_age=0.0, max_attempts=MAX_ATTEMPTS):
+        self.min_age = min_age
+        self.max_attempts = max_attempts
+        # In the order in which the jobs were started.
+        self._jobs = {}
+
+    @classmethod
+    def from_config(cls, distributor_config):
+        "The `Speculation` described by a distributor's configuration, or `None` if speculation isn't enabled."
+        if not distributor_config.get("speculate", False):
+            return None
+        return cls(min_age=float(distributor_config.get("speculate-after", 0.0)))
+
+    def started(self, work_item):
+        "Note that an attempt at `work_item` has been started."
+        job = self._jobs.get(work_item.job_id)
+        if job is None:
+            job = self._jobs[work_item.job_id] = _Job(work_item)
+        job.attempts += 1
+        job.running += 1
+
+    def candidates(self):
+        "A list of the running work items which may be attempted again, oldest first."
+        now = time.monotonic()
+        return [
+            job.work_item
+            for job in self._jobs.values()
+            if job.attempts < self.max_attempts and now - job.started >= self.min_age
+        ]
+
+    def delay(self):
+        "The number of seconds until another running job may be attempted again, or `None` if none will be."
+        now = time.monotonic()
+        delays = [
+            self.min_age - (now - job.started)
+            for job in self._jobs.values()
+            if job.attempts < self.max_attempts and now - job.started < self.min_age
+        ]
+        return min(delays, default=None)
+
+    def finished(self, job_id, result):
+        """Note that an attempt at the job `job_id` has finished with `result`.
+
+        Returns: The result for the job, with its ``attempts``, in which case any other attempts at the job should be
+            cancelled. Or `None` if `result` should be discarded, because the job already has a result, or because
+            `result` is abnormal and there are other attempts still running.
+        """
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+
+        job.running -= 1
+        if result.worker_outcome == WorkerOutcome.ABNORMAL and job.running:
+            return None
+
+        del self._jobs[job_id]
+        return evolve(result, attempts=job.attempts)
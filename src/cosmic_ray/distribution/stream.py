@@ -0,0 +1,285 @@
+"""Cosmic Ray distributor that sends jobs to workers over persistent socket connections.
+
+The http distributor makes a new HTTP request for every job, and only sends a worker a new job once it has the result
+of the last one. For fast test suites on a single machine or a LAN, that overhead is significant. The stream
+distributor instead keeps one connection open to each worker, and *pipelines* jobs: each worker always has its next job
+waiting, so it never sits idle while the coordinator handles a result.
+
+Enabling the distributor
+========================
+
+To use the stream distributor, set ``cosmic-ray.distributor.name = "stream"`` in your Cosmic Ray configuration, and
+list the addresses of the workers in ``cosmic-ray.distributor.stream.worker-addresses``. An address is either
+``host:port`` for a TCP connection, or the path of a Unix domain socket (which must contain a ``/``):
+
+.. code-block:: toml
+
+    [cosmic-ray.distributor]
+    name = "stream"
+
+    [cosmic-ray.distributor.stream]
+    worker-addresses = ['localhost:9876', './workers/worker-1.sock']
+
+Start the workers with ``cosmic-ray stream-worker``, giving each the port or socket path on which to listen. A worker
+started with ``--slots N`` runs ``N`` jobs at once (see :mod:`cosmic_ray.workspace`), and is sent enough jobs to keep
+all of its slots busy.
+
+As with the http distributor, set ``send-edits = true`` to send workers the edits for the mutations rather than having
+them parse the modules (see :mod:`cosmic_ray.distribution.jobs`).
+
+Protocol
+========
+
+Messages are *frames*: a 4-byte, big-endian length followed by that many bytes of UTF-8 encoded JSON. When a
+connection is made, the worker sends a frame describing itself::
+
+    {"slots": 4}
+
+The coordinator then sends a frame for each job, holding the job parameters (see
+:mod:`cosmic_ray.distribution.jobs`) and an ``id`` for the job. It can send new jobs at any time, without waiting for
+results. The worker sends back a frame with the result parameters and the ``id`` of the job for each job as it
+completes, which might not be in the order in which the jobs were sent.
+"""
+
+import asyncio
+import json
+import logging
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+from cosmic_ray.distribution.distributor import Distributor
+from cosmic_ray.distribution.jobs import (
+    PrecomputedEdits,
+    WorkerWorkspaces,
+    job_parameters,
+    result_from_parameters,
+    result_parameters,
+    run_job,
+)
+from cosmic_ray.scheduling import work_queue
+from cosmic_ray.work_item import WorkResult, WorkerOutcome
+
+log = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct(">I")
+
+
+async def read_frame(reader: asyncio.StreamReader):
+    """Read a frame from `reader`.
+
+    Returns: The decoded message, or `None` if the connection was closed before the start of a frame.
+
+    Raises:
+        asyncio.IncompleteReadError: The connection was closed part way through a frame.
+    """
+    try:
+        header = await reader.readexactly(_LENGTH.size)
+    except asyncio.IncompleteReadError as exc:
+        if not exc.partial:
+            return None
+        raise
+    (length,) = _LENGTH.unpack(header)
+    return json.loads((await reader.readexactly(length)).decode("utf-8"))
+
+
+def write_frame(writer: asyncio.StreamWriter, message):
+    "Write `message` as a frame to `writer`. The caller should drain `writer`."
+    data = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    writer.write(_LENGTH.pack(len(data)) + data)
+
+
+async def open_connection(address):
+    "Open a connection to a worker at `address` (``host:port`` or a socket path)."
+    if "/" in address:
+        return await asyncio.open_unix_connection(address)
+    host, _, port = address.rpartition(":")
+    return await asyncio.open_connection(host, int(port))
+
+
+class StreamDistributor(Distributor):
+    "The stream distributor."
+
+    def __call__(self, *args, **kwargs):
+        asyncio.run(self._process(*args, **kwargs))
+
+    async def _process(self, pending_work, test_command, timeout, config, on_task_complete):
+        addresses = config.get("worker-addresses", [])
+        if not addresses:
+            raise ValueError("No worker addresses provided for StreamDistributor")
+
+        edits = PrecomputedEdits() if config.get("send-edits", False) else None
+        connections = [await _Connection.open(address) for address in addresses]
+        capacity = asyncio.Condition()
+
+        def complete(job_id, result):
+            on_task_complete(job_id, result)
+            asyncio.ensure_future(_notify(capacity))
+
+        async def read_results(connection):
+            await connection.read_results(complete)
+            # The connection won't have capacity again, which might be what we're waiting to hear about.
+            await _notify(capacity)
+
+        readers = [asyncio.ensure_future(read_results(connection)) for connection in connections]
+        work = work_queue(pending_work)
+        try:
+            while True:
+                async with capacity:
+                    await capacity.wait_for(
+                        lambda: any(connection.has_capacity or connection.closed for connection in connections)
+                    )
+                if all(connection.closed for connection in connections):
+                    if not work.pending():
+                        break
+                    raise ConnectionError("Lost the connections to all of the workers")
+                connection = min(
+                    (connection for connection in connections if connection.has_capacity), key=_Connection.load
+                )
+                work_item = work.take(connection.address)
+                if work_item is None:
+                    break
+                await connection.send(work_item, test_command, timeout, edits)
+
+            for connection in connections:
+                await connection.finish()
+            await asyncio.gather(*readers)
+        finally:
+            for reader in readers:
+                reader.cancel()
+            for connection in connections:
+                connection.close()
+
+
+async def _notify(condition):
+    async with condition:
+        condition.notify_all()
+
+
+class _Connection:
+    "The coordinator's connection to a worker."
+
+    def __init__(self, address, reader, writer, depth):
+        self.address = address
+        self.reader = reader
+        self.writer = writer
+        # The number of jobs to keep in flight: one per slot, plus one waiting for each slot.
+        self.depth = depth
+        self.in_flight = {}
+        self._next_id = 0
+        self._closed = False
+
+    @classmethod
+    async def open(cls, address):
+        reader, writer = await open_connection(address)
+        hello = await read_frame(reader)
+        if hello is None:
+            raise ConnectionError(f"Worker at {address} closed the connection")
+        log.info("Connected to worker at %s with %s slots", address, hello.get("slots", 1))
+        return cls(address, reader, writer, 2 * hello.get("slots", 1))
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @property
+    def has_capacity(self):
+        return not self._closed and len(self.in_flight) < self.depth
+
+    def load(self):
+        return len(self.in_flight) / self.depth
+
+    async def send(self, work_item, test_command, timeout, edits=None):
+        job_id = self._next_id
+        self._next_id += 1
+        self.in_flight[job_id] = work_item.job_id
+        message = job_parameters(work_item, test_command, timeout, edits)
+        message["id"] = job_id
+        write_frame(self.writer, message)
+        await self.writer.drain()
+
+    async def finish(self):
+        "Tell the worker that no more jobs will be sent."
+        if self.writer.can_write_eof():
+            self.writer.write_eof()
+
+    async def read_results(self, on_task_complete):
+        "Read results until the worker closes the connection, passing them to `on_task_complete`."
+        try:
+            while True:
+                message = await read_frame(self.reader)
+                if message is None:
+                    break
+                job_id = self.in_flight.pop(message["id"])
+                on_task_complete(job_id, result_from_parameters(message))
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            log.error("Lost connection to worker at %s: %s", self.address, exc)
+
+        # Any jobs we haven't had results for won't get them now.
+        self._closed = True
+        for job_id in list(self.in_flight.values()):
+            on_task_complete(
+                job_id,
+                WorkResult(
+                    worker_outcome=WorkerOutcome.ABNORMAL,
+                    output=f"Connection to worker at {self.address} closed before the job completed",
+                ),
+            )
+        self.in_flight.clear()
+
+    def close(self):
+        self.writer.close()
+
+
+def run_worker(port=None, path=None, slots=1, workspace_dir=None):
+    """Run a stream worker.
+
+    You must specify either `port` or `path`, but not both.
+
+    Args:
+        port: The TCP port on which to listen.
+        path: Path to Unix domain socket on which to listen.
+        slots: The number of jobs to run at once. If this is more than one, each job is run in its own copy of the
+            current directory (see `cosmic_ray.workspace`).
+        workspace_dir: The directory in which to put the copies of the current directory.
+    """
+    if (port is None) == (path is None):
+        raise ValueError("Worker requires either a port or domain socket path")
+
+    with ThreadPoolExecutor(max_workers=slots) as executor:
+        with WorkerWorkspaces(slots, workspace_dir, executor) as workspaces:
+            asyncio.run(_serve(port, path, slots, workspaces))
+
+
+async def _serve(port, path, num_slots, workspaces):
+    async def handle_connection(reader, writer):
+        write_frame(writer, {"slots": num_slots})
+        await writer.drain()
+
+        async def run(message):
+            result = await run_job(message, workspaces.slots, workspaces.executor)
+            response = result_parameters(result)
+            response["id"] = message["id"]
+            write_frame(writer, response)
+            await writer.drain()
+
+        jobs = []
+        try:
+            while True:
+                message = await read_frame(reader)
+                if message is None:
+                    break
+                jobs.append(asyncio.ensure_future(run(message)))
+            await asyncio.gather(*jobs)
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            log.error("Lost connection to coordinator: %s", exc)
+        finally:
+            writer.close()
+
+    if path is None:
+        server = await asyncio.start_server(handle_connection, port=port)
+    else:
+        server = await asyncio.start_unix_server(handle_connection, path=path)
+
+    log.info("Stream worker listening on %s", path or port)
+    async with server:
+        await server.serve_forever()
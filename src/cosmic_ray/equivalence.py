@@ -0,0 +1,126 @@
+"""Detection of equivalent and duplicate mutants by comparing compiled code.
+
+Many mutants compile to exactly the same bytecode as the unmutated module, and so can never be killed. Others compile to
+the same bytecode as another mutant, and so will get the same result. This is *trivial compiler equivalence*: we
+compile each mutated module in-process, normalize away the parts of the code objects that don't affect behavior (line
+numbers, file names and so forth), and compare the results.
+
+This is much cheaper than running the tests, so it lets us avoid test runs for mutants whose results we already know.
+"""
+
+import logging
+import warnings
+from collections.abc import Iterable
+from itertools import groupby
+from types import CodeType
+
+from attrs import define, field
+
+from cosmic_ray.mutating import make_diff, single_mutation_edits
+from cosmic_ray.work_item import WorkItem
+
+log = logging.getLogger(__name__)
+
+# The attributes of code objects which describe behavior. Others (e.g. line numbers) only describe where the code came
+# from. Not all attributes exist in all versions of Python.
+_CODE_ATTRIBUTES = (
+    "co_argcount",
+    "co_posonlyargcount",
+    "co_kwonlyargcount",
+    "co_nlocals",
+    "co_flags",
+    "co_code",
+    "co_names",
+    "co_varnames",
+    "co_freevars",
+    "co_cellvars",
+    "co_name",
+    "co_qualname",
+    "co_exceptiontable",
+)
+
+
+def code_fingerprint(source: str):
+    """Compile `source` and return a normalized description of the resulting code.
+
+    Two modules with equal fingerprints compile to the same bytecode, so they behave identically.
+
+    Returns:
+        A hashable fingerprint, or `None` if `source` doesn't compile.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            code = compile(source, "<module>", "exec", dont_inherit=True)
+    except (SyntaxError, ValueError):
+        return None
+    return _normalize(code)
+
+
+def _normalize(value):
+    if isinstance(value, CodeType):
+        return (
+            ("code",)
+            + tuple(_normalize(getattr(value, name, None)) for name in _CODE_ATTRIBUTES)
+            + (tuple(_normalize(const) for const in value.co_consts),)
+        )
+    if isinstance(value, (tuple, frozenset)):
+        items = tuple(_normalize(item) for item in value)
+        return (type(value).__name__, tuple(sorted(items, key=repr)) if isinstance(value, frozenset) else items)
+    # Constants which compare equal can still behave differently (e.g. 1 and 1.0, or 0.0 and -0.0).
+    return (type(value).__name__, repr(value))
+
+
+@define(frozen=True)
+class Equivalences:
+    """The equivalences found among a collection of work items.
+
+    Attributes:
+        equivalent: The job IDs of the mutants which are equivalent to the unmutated code.
+        duplicates: A mapping from the job IDs of mutants to the job ID of an earlier mutant which is equivalent to it.
+        diffs: The diffs for the mutants in `equivalent` and `duplicates`, by job ID.
+    """
+
+    equivalent: frozenset = field(factory=frozenset)
+    duplicates: dict = field(factory=dict)
+    diffs: dict = field(factory=dict)
+
+
+def find_equivalents(work_items: Iterable[WorkItem]) -> Equivalences:
+    """Find the work items whose mutants are equivalent to the unmutated code or to the mutant of an earlier item.
+
+    Only work items with a single mutation are considered. Mutants that don't compile are ignored.
+    """
+    equivalent = set()
+    duplicates = {}
+    diffs = {}
+    for module_path, module_edits in groupby(
+        single_mutation_edits(work_items), key=lambda item: item[0].mutations[0].module_path
+    ):
+        module_edits = list(module_edits)
+        original_code = module_edits[0][1]
+        original = code_fingerprint(original_code)
+        if original is None:
+            continue
+
+        representatives = {}
+        for work_item, _, edit in module_edits:
+            if edit is None:
+                continue
+
+            mutated_code = edit.apply(original_code)
+            fingerprint = code_fingerprint(mutated_code)
+            if fingerprint is None:
+                continue
+
+            if fingerprint == original:
+                equivalent.add(work_item.job_id)
+            elif fingerprint in representatives:
+                duplicates[work_item.job_id] = representatives[fingerprint]
+            else:
+                representatives[fingerprint] = work_item.job_id
+                continue
+
+            diffs[work_item.job_id] = "\n".join(make_diff(original_code, mutated_code, module_path, edit))
+
+    return Equivalences(frozenset(equivalent), duplicates, diffs)
@@ -0,0 +1,144 @@
+"""Group testing: testing several mutants with a single run of the tests.
+
+In code bases with weak tests, most mutants survive, and each of them costs a full run of the test suite. Group testing
+applies several mutants - each in a different module - at once, and runs the tests once for all of them. If the tests
+pass, every mutant in the group survived. If they fail, the group is split in half and each half is tested again, until
+the mutants which are killed have been tested on their own.
+
+Every mutant which isn't recorded as a survivor of a group ends up being tested on its own, so killed, incompetent and
+timed-out results all come from single-mutant runs.
+
+Survivors are a different matter: mutants can mask each other. For example, one mutant can stop the code which
+another mutant breaks from being run at all, so the tests pass for the group even though they would fail for the second
+mutant on its own. Such a mutant is recorded as a survivor of its group. So the survival rate with group testing is an
+upper bound on the true one, and each survivor's output says that it survived as one of a group.
+"""
+
+import logging
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable
+
+from cosmic_ray.work_item import TestOutcome, WorkItem, WorkResult, WorkerOutcome
+
+log = logging.getLogger(__name__)
+
+# The line which starts the diff for each module in the diff of a `WorkResult`.
+_DIFF_MARKER = "--- mutation diff ---"
+
+
+def form_groups(work_items: Iterable[WorkItem], group_size):
+    """Put work items into groups of at most `group_size` items, each of which mutates a different module.
+
+    Only work items with a single mutation are grouped.
+
+    Returns:
+        A `(groups, singles)` tuple. `groups` is a list of lists of work items. `singles` is a list of work items which
+        need to be tested on their own.
+    """
+    by_module = defaultdict(list)
+    singles = []
+    for work_item in work_items:
+        if len(work_item.mutations) == 1:
+            by_module[work_item.mutations[0].module_path].append(work_item)
+        else:
+            singles.append(work_item)
+
+    groups = []
+    queues = list(by_module.values())
+    while True:
+        # Take from the modules with the most work first, so that we don't run out of modules to mix.
+        queues = sorted((queue for queue in queues if queue), key=len, reverse=True)
+        if len(queues) < 2:
+            break
+        groups.append([queue.pop() for queue in queues[:group_size]])
+
+    singles.extend(work_item for queue in queues for work_item in queue)
+    return groups, singles
+
+
+def run_in_groups(distributor, work_items, group_size, test_command, timeout, distributor_config, on_task_complete):
+    """Run work items with a distributor, testing groups of mutants together where possible.
+
+    This runs in rounds. Each round passes all of the work that's ready to the distributor. Groups whose mutants all
+    survive are recorded. The others are split in half for the next round. Note that mutants in a group can mask each
+    other (see the module documentation), so a group's survivors may include mutants which a single run would kill.
+
+    Args:
+        distributor: The distributor to run the work with.
+        work_items: The work items to run.
+        group_size: The maximum number of mutants to test together.
+        test_command: The command to run the tests.
+        timeout: The maximum amount of time (seconds) to let the tests run.
+        distributor_config: The configuration for the distributor.
+        on_task_complete: Called with the job ID and result for each of `work_items` as its result is known.
+    """
+    groups, singles = form_groups(work_items, group_size)
+    log.info("Testing %s mutants in %s groups, and %s on their own", sum(map(len, groups)), len(groups), len(singles))
+
+    while groups or singles:
+        batch = {f"group-{uuid.uuid4().hex}": group for group in groups}
+        groups, next_singles = [], []
+
+        def on_group_complete(job_id, result):
+            group = batch.get(job_id)
+            if group is None:
+                on_task_complete(job_id, result)
+                return
+
+            member_diffs = _split_diff(result.diff, len(group))
+            if _survived(result) and member_diffs is not None:
+                for work_item, diff in zip(group, member_diffs):
+                    on_task_complete(work_item.job_id, _member_result(result, diff, len(group)))
+                return
+
+            middle = len(group) // 2
+            for half in (group[:middle], group[middle:]):
+                if len(half) == 1:
+                    next_singles.extend(half)
+                else:
+                    groups.append(half)
+
+        work = [_group_work_item(job_id, group) for job_id, group in batch.items()] + singles
+        distributor(work, test_command, timeout, distributor_config, on_task_complete=on_group_complete)
+        singles = next_singles
+
+
+def _group_work_item(job_id, group):
+    return WorkItem(mutations=[mutation for work_item in group for mutation in work_item.mutations], job_id=job_id)
+
+
+def _survived(result):
+    return result.worker_outcome == WorkerOutcome.NORMAL and result.test_outcome == TestOutcome.SURVIVED
+
+
+def _member_result(result, diff, group_size):
+    "The result for one mutant in a group which survived."
+    return WorkResult(
+        output=f"Survived as one of a group of {group_size} mutants tested together\n\n{result.output or ''}",
+        diff=diff,
+        test_outcome=result.test_outcome,
+        worker_outcome=result.worker_outcome,
+    )
+
+
+def _split_diff(diff, num_modules):
+    """Split the diff of a group's result into the diffs for each module, in order.
+
+    Returns: A list of diffs, or `None` if the diff doesn't describe exactly `num_modules` modules.
+    """
+    if diff is None:
+        return None
+
+    diffs = []
+    for line in diff.split("\n"):
+        if line == _DIFF_MARKER:
+            diffs.append([])
+        elif not diffs:
+            return None
+        diffs[-1].append(line)
+
+    if len(diffs) != num_modules:
+        return None
+
+    return ["\n".join(lines) for lines in diffs]
@@ -0,0 +1,229 @@
+"""Resource limits for test runs.
+
+A mutant can make the tests allocate memory without bound, spin forever, or fork repeatedly. The timeout catches some of
+these, but not before they've slowed down (or swapped out) everything else on the machine. Resource limits stop them
+early. They're configured in the ``resource-limits`` section of the configuration:
+
+.. code-block:: toml
+
+    [cosmic-ray.resource-limits]
+    address-space-mb = 2048
+    cpu-seconds = 60
+    processes = 512
+
+Each limit is optional. They're applied (with ``setrlimit``) to each test run, and so are only available on platforms
+with the `resource` module. The test command is started by a small wrapper (running this module) which applies the
+limits to itself before it replaces itself with the test command, since a ``preexec_fn`` isn't safe to use in a process
+with threads.
+
+The output of a test run is limited too. Chatty test suites can produce megabytes of output for every mutant, all of
+which would be stored in the session. Only the start and the end of the output are kept, up to ``max-output-bytes``
+(by default, `DEFAULT_MAX_OUTPUT` bytes) in total.
+"""
+
+import json
+import logging
+import os
+import signal
+import sys
+import traceback
+from typing import Optional
+
+from attrs import define
+
+try:
+    import resource
+except ImportError:  # pragma: no cover (e.g. on Windows)
+    resource = None
+
+log = logging.getLogger(__name__)
+
+# The default maximum size of the output we keep for each test run, in bytes.
+DEFAULT_MAX_OUTPUT = 64 * 1024
+
+# The exit status of the wrapper (see `ResourceLimits.command`) when it can't start the test command.
+EXEC_FAILED = 127
+
+
+@define(frozen=True)
+class ResourceLimits:
+    """Limits on the resources that a test run can use.
+
+    Attributes:
+        address_space: The maximum size of a process's virtual memory, in bytes (``RLIMIT_AS``).
+        cpu_time: The maximum CPU time of a process, in seconds (``RLIMIT_CPU``).
+        processes: The maximum number of processes for the user (``RLIMIT_NPROC``). Note that this counts all of the
+            user's processes, not just those of the test run.
+    """
+
+    address_space: Optional[int] = None
+    cpu_time: Optional[int] = None
+    processes: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config):
+        "Create limits from the ``resource-limits`` section of a configuration."
+        address_space = config.get("address-space-mb")
+        return cls(
+            address_space=None if address_space is None else int(address_space) * 1024 * 1024,
+            cpu_time=config.get("cpu-seconds"),
+            processes=config.get("processes"),
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        "Create limits from the result of `as_dict`."
+        return cls(**data)
+
+    def as_dict(self):
+        "The limits as a JSON-serializable dict."
+        return {"address_space": self.address_space, "cpu_time": self.cpu_time, "processes": self.processes}
+
+    def __bool__(self):
+        return any(limit is not None for limit in self.as_dict().values())
+
+    def command(self, args):
+        """The command line which runs the command `args` with these limits applied.
+
+        If the wrapper can't apply the limits or start the command, it exits with the status `EXEC_FAILED`. If there
+        are no limits, or
+        they aren't supported on this platform, this is just `args`.
+        """
+        if resource is None or not self:
+            return list(args)
+        return [sys.executable, "-m", "cosmic_ray.limits", json.dumps(self.as_dict()), *args]
+
+    def apply(self):
+        """Apply the limits to the current process.
+
+        This is meant to be called in a newly-started (or forked) process before it runs the tests.
+
+        Raises:
+            ValueError: A limit is invalid, e.g. it's above the hard limit which is already in place.
+            OSError: The limits can't be set.
+        """
+        if resource is None:
+            return
+
+        for limit, value in (
+            (resource.RLIMIT_AS, self.address_space),
+            (resource.RLIMIT_CPU, self.cpu_time),
+            (resource.RLIMIT_NPROC, self.processes),
+        ):
+            if value is None:
+                continue
+            # The soft limit for CPU time sends SIGXCPU, which lets us tell it apart from other failures. The hard limit
+            # is a backstop in case the signal is handled.
+            hard = value + 1 if limit == resource.RLIMIT_CPU else value
+            resource.setrlimit(limit, (value, hard))
+
+    def exceeded(self, returncode, output, cpu_time=None):
+        """Work out which limit, if any, a test run exceeded.
+
+        A process which exceeds the CPU time limit is sent ``SIGXCPU``, and killed with ``SIGKILL`` if it carries on
+        regardless. Other things kill processes with ``SIGKILL`` too (such as the OOM killer), so that only counts if
+        the process is known to have used up its CPU time.
+
+        Processes which exceed the address space or process limits aren't killed. They just fail to allocate memory or
+        fork, so we look for the corresponding errors in the output.
+
+        Args:
+            returncode: The exit status of the test run (negative if the run was killed by a signal).
+            output: The output of the test run.
+            cpu_time: The CPU time (seconds) used by the test run, if it was measured.
+
+        Returns:
+            The configuration name of the limit which was exceeded, or `None`.
+        """
+        if resource is None:
+            return None
+        if self.cpu_time is not None and (
+            returncode == -signal.SIGXCPU
+            or (returncode == -signal.SIGKILL and cpu_time is not None and cpu_time >= self.cpu_time)
+        ):
+            return "cpu-seconds"
+        if self.address_space is not None and "MemoryError" in output:
+            return "address-space-mb"
+        if self.processes is not None and "Resource temporarily unavailable" in output:
+            return "processes"
+        return None
+
+
+class BoundedOutput:
+    """A buffer for output which keeps only its head and tail.
+
+    Args:
+        max_size: The maximum number of bytes to keep, or `None` to keep everything. Half of this is used for the start
+            of the output, and half for the end.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_OUTPUT):
+        self.max_size = max_size
+        self.size = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+
+    def write(self, data: bytes):
+        "Add `data` to the output."
+        self.size += len(data)
+        if self.max_size is None:
+            self._head += data
+            return
+
+        head_room = self.max_size // 2 - len(self._head)
+        if head_room > 0:
+            self._head += data[:head_room]
+            data = data[head_room:]
+
+        tail_size = self.max_size - self.max_size // 2
+        self._tail += data[-tail_size:] if tail_size else b""
+        del self._tail[: -tail_size or None]
+
+    @property
+    def truncated(self):
+        "Whether any of the output has been dropped."
+        return self.size > len(self._head) + len(self._tail)
+
+    def getvalue(self) -> str:
+        "The output that was kept, with a note of how much was dropped, if any."
+        if not self.truncated:
+            return (self._head + self._tail).decode("utf-8", errors="replace")
+
+        head = self._head.decode("utf-8", errors="replace")
+        tail = self._tail.decode("utf-8", errors="replace")
+        omitted = self.size - len(self._head) - len(self._tail)
+        return f"{head}\n\n[... {omitted} bytes of output omitted, {self.size} bytes in total ...]\n\n{tail}"
+
+
+def read_bounded(path, max_size=DEFAULT_MAX_OUTPUT) -> str:
+    "Read the output in the file at `path` as `BoundedOutput` would keep it, without reading all of a large file."
+    output = BoundedOutput(max_size)
+    with open(path, "rb") as stream:
+        size = os.fstat(stream.fileno()).st_size
+        if max_size is None or size <= max_size:
+            output.write(stream.read())
+            return output.getvalue()
+
+        output.write(stream.read(max_size // 2))
+        stream.seek(size - (max_size - max_size // 2))
+        output.write(stream.read())
+        # Account for the part we skipped.
+        output.size = size
+        return output.getvalue()
+
+
+def main(argv=None):
+    """Apply the limits given (as from `ResourceLimits.as_dict`, in JSON) in the first argument, then replace this
+    process with the command in the rest of the arguments.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        ResourceLimits.from_dict(json.loads(argv[0])).apply()
+        os.execvp(argv[1], argv[1:])
+    except (ValueError, OSError):
+        traceback.print_exc()
+        sys.exit(EXEC_FAILED)
+
+
+if __name__ == "__main__":
+    main()
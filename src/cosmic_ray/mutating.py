@@ -1,25 +1,45 @@
 """Support for making mutations to source code."""
 
 import contextlib
+import copy
 import difflib
+import hashlib
+import json
 import logging
+import re
+import threading
+import time
 import traceback
+import warnings
+from collections import OrderedDict, defaultdict
 from collections.abc import Iterable
 from contextlib import contextmanager
 from itertools import chain
 from pathlib import Path
+from typing import Optional
+
+from attrs import define, evolve, field
 
 import cosmic_ray.plugins
-from cosmic_ray.ast import Visitor, get_ast
+from cosmic_ray.ast import LineOffsets, Visitor, ast_nodes, get_ast
 from cosmic_ray.testing import run_tests
 from cosmic_ray.util import read_python_source, restore_contents
-from cosmic_ray.work_item import MutationSpec, TestOutcome, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import MutationSpec, TestOutcome, WorkItem, WorkResult, WorkerOutcome
 
 log = logging.getLogger(__name__)
 
 
 # pylint: disable=R0913
-def mutate_and_test(mutations: Iterable[MutationSpec], test_command, timeout) -> WorkResult:
+def mutate_and_test(
+    mutations: Iterable[MutationSpec],
+    test_command,
+    timeout,
+    workspace=None,
+    edits=None,
+    cancellation=None,
+    limits=None,
+    max_output=None,
+) -> WorkResult:
     """Apply a sequence of mutations, run thest tests, and reports the results.
 
     This is fundamentally the mutation(s)-and-test-run implementation at the heart of Cosmic Ray.
@@ -33,51 +53,105 @@ def mutate_and_test(mutations: Iterable[MutationSpec], test_command, timeout) ->
     incompetent) so a special value is returned indicating that no mutation is possible.
 
     Finally, and hopefully normally, the worker will find that it can run a test. It will do so and report back the
-    result - killed, survived, or incompetent - in a structured way.
+    result - killed, survived, or incompetent - in a structured way. (If the mutated code doesn't even compile, the
+    tests aren't run and the result is reported as incompetent straight away.)
 
     Args:
         mutations: An iterable of ``MutationSpec``\\s describing the mutations to make.
         test_command: The command to execute to run the tests
         timeout: The maximum amount of time (seconds) to let the tests run
+        workspace: A `cosmic_ray.workspace.WorkspaceSlot` in which to mutate the code and run the tests. By default,
+            this is done in the current directory.
+        edits: A sequence with an item for each mutation: either a `PrecomputedEdit` to apply instead of working out
+            the mutation from the module's parse tree, or `None`. The edits are for the unmutated modules.
+        cancellation: A `cosmic_ray.testing.Cancellation` with which the test run can be stopped, if any.
+        limits: The `cosmic_ray.limits.ResourceLimits` for the test run. By default, those set with
+            `cosmic_ray.testing.use_resource_limits`.
+        max_output: The maximum number of bytes of test output to keep. By default, the number set with
+            `cosmic_ray.testing.use_max_output`.
 
     Returns:
-        A ``WorkResult``.
+        A ``WorkResult``, including the time taken to make the mutations and run the tests.
 
     Raises:
         This will generally not raise any exceptions. Rather, exceptions will be reported using the 'exception'
         result-type in the return value.
 
     """
+    start = time.monotonic()
+    result = _mutate_and_test(mutations, test_command, timeout, workspace, edits, cancellation, limits, max_output)
+    return evolve(result, duration=time.monotonic() - start)
+
+
+def _mutate_and_test(
+    mutations, test_command, timeout, workspace, edits, cancellation, limits, max_output
+) -> WorkResult:
     try:
+        if workspace is not None:
+            workspace.reset()
+
         with contextlib.ExitStack() as stack:
-            file_changes: dict[Path, tuple[str, str]] = {}
-            for mutation in mutations:
-                operator_class = cosmic_ray.plugins.get_operator(mutation.operator_name)
-                try:
-                    operator_args = mutation.operator_args
-                except AttributeError:
-                    operator_args = {}
-                operator = operator_class(**operator_args)
-
-                (previous_code, mutated_code) = stack.enter_context(
-                    use_mutation(mutation.module_path, operator, mutation.occurrence)
-                )
+            file_changes: dict[Path, tuple[str, str, Optional[SourceEdit]]] = {}
+            mutations = list(mutations)
+            for mutation, precomputed in zip(mutations, edits if edits is not None else [None] * len(mutations)):
+                module_path = mutation.module_path if workspace is None else workspace.break_out(mutation.module_path)
+
+                if precomputed is None:
+                    operator = mutation_operator(mutation)
+                    (previous_code, edit) = stack.enter_context(
+                        _use_mutation_edit(
+                            module_path,
+                            operator,
+                            mutation.occurrence,
+                            mutation.start_pos,
+                            mutation.end_pos,
+                            operator_key=mutation_operator_key(mutation),
+                        )
+                    )
+                else:
+                    (previous_code, edit) = stack.enter_context(_use_precomputed_edit(module_path, precomputed))
 
-                # If there's no mutated code, then no mutation was possible.
-                if mutated_code is None:
+                # If there's no edit, then no mutation was possible.
+                if edit is None:
                     return WorkResult(
                         worker_outcome=WorkerOutcome.NO_TEST,
                     )
 
-                original_code, _ = file_changes.get(mutation.module_path, (previous_code, mutated_code))
-                file_changes[mutation.module_path] = original_code, mutated_code
-
-            test_outcome, output = run_tests(test_command, timeout)
+                mutated_code = edit.apply(previous_code)
+                if mutation.module_path in file_changes:
+                    # Several mutations in one module can't be described by a single edit.
+                    original_code, _, _ = file_changes[mutation.module_path]
+                    file_changes[mutation.module_path] = original_code, mutated_code, None
+                else:
+                    file_changes[mutation.module_path] = previous_code, mutated_code, edit
 
             diffs = [
-                _make_diff(original_code, mutated_code, module_path)
-                for module_path, (original_code, mutated_code) in file_changes.items()
+                make_diff(original_code, mutated_code, module_path, edit)
+                for module_path, (original_code, mutated_code, edit) in file_changes.items()
+            ]
+
+            # There's no point in running the tests against code that doesn't compile.
+            errors = [
+                error
+                for module_path, (_, mutated_code, _) in file_changes.items()
+                if (error := compile_error(mutated_code, module_path)) is not None
             ]
+            if errors:
+                return WorkResult(
+                    output="\n".join(errors),
+                    diff="\n".join(chain(*diffs)),
+                    test_outcome=TestOutcome.INCOMPETENT,
+                    worker_outcome=WorkerOutcome.NORMAL,
+                )
+
+            test_outcome, output = run_tests(
+                test_command,
+                timeout,
+                cwd=None if workspace is None else workspace.path,
+                cancellation=cancellation,
+                limits=limits,
+                max_output=max_output,
+            )
 
             result = WorkResult(
                 output=output,
@@ -94,8 +168,110 @@ def mutate_and_test(mutations: Iterable[MutationSpec], test_command, timeout) ->
     return result
 
 
+def compile_error(source, module_path) -> Optional[str]:
+    """Check whether `source` compiles.
+
+    Returns:
+        `None` if `source` compiles, otherwise a description of the error.
+    """
+    try:
+        with warnings.catch_warnings():
+            # Mutants can produce code which is valid but suspicious, e.g. `x is 1`.
+            warnings.simplefilter("ignore")
+            compile(source, str(module_path), "exec", dont_inherit=True)
+    except (SyntaxError, ValueError) as exc:
+        return "".join(traceback.format_exception_only(type(exc), exc))
+    return None
+
+
+def compile_check(work_items: Iterable[WorkItem]):
+    """Find the work items whose mutants don't compile, without running any tests.
+
+    Only work items with a single mutation are checked. `mutate_and_test` checks the others when they're run.
+
+    Yields:
+        A `(job-id, WorkResult)` tuple for each work item whose mutant doesn't compile.
+    """
+    for work_item, original_code, edit in single_mutation_edits(work_items):
+        if edit is None:
+            continue
+
+        module_path = work_item.mutations[0].module_path
+        mutated_code = edit.apply(original_code)
+        error = compile_error(mutated_code, module_path)
+        if error is not None:
+            yield (
+                work_item.job_id,
+                WorkResult(
+                    output=error,
+                    diff="\n".join(make_diff(original_code, mutated_code, module_path, edit)),
+                    test_outcome=TestOutcome.INCOMPETENT,
+                    worker_outcome=WorkerOutcome.NORMAL,
+                ),
+            )
+
+
+def single_mutation_edits(work_items: Iterable[WorkItem]):
+    """Calculate the edits for the work items which make a single mutation.
+
+    The work items are grouped by module, and each module is read and parsed only once. Work items whose mutation
+    can't be calculated are logged and left out; `mutate_and_test` reports the problem when they're run.
+
+    Yields:
+        `(work-item, original-code, edit)` tuples, grouped by module. The edit is `None` if no mutation is possible.
+    """
+    by_module = defaultdict(list)
+    for work_item in work_items:
+        if len(work_item.mutations) == 1:
+            by_module[work_item.mutations[0].module_path].append(work_item)
+
+    for module_path, module_items in by_module.items():
+        try:
+            original_code = read_python_source(module_path)
+            module_ast = get_ast(original_code)
+        except Exception:  # noqa # pylint: disable=broad-except
+            log.warning("Unable to read module %s", module_path, exc_info=True)
+            continue
+
+        for work_item in module_items:
+            mutation = work_item.mutations[0]
+            try:
+                edit = mutation_edit(
+                    original_code,
+                    mutation_operator(mutation),
+                    mutation.occurrence,
+                    mutation.start_pos,
+                    mutation.end_pos,
+                    module_ast=module_ast,
+                )
+            except Exception:  # noqa # pylint: disable=broad-except
+                log.warning("Unable to make mutation for job %s", work_item.job_id, exc_info=True)
+                continue
+
+            yield work_item, original_code, edit
+
+
+def mutation_operator_key(mutation: MutationSpec):
+    "A hashable value identifying the operator, including its arguments, which makes `mutation`."
+    try:
+        operator_args = mutation.operator_args
+    except AttributeError:
+        operator_args = {}
+    return mutation.operator_name, json.dumps(operator_args, sort_keys=True)
+
+
+def mutation_operator(mutation: MutationSpec):
+    "Create the `Operator` instance that makes `mutation`."
+    operator_class = cosmic_ray.plugins.get_operator(mutation.operator_name)
+    try:
+        operator_args = mutation.operator_args
+    except AttributeError:
+        operator_args = {}
+    return operator_class(**operator_args)
+
+
 @contextmanager
-def use_mutation(module_path, operator, occurrence):
+def use_mutation(module_path, operator, occurrence, start_pos=None, end_pos=None):
     """A context manager that applies a mutation for the duration of a with-block.
 
     This applies a mutation to a file on disk, and after the with-block it put the unmutated code
@@ -105,43 +281,424 @@ def use_mutation(module_path, operator, occurrence):
         module_path: The path to the module to mutate.
         operator: The `Operator` instance to use.
         occurrence: The occurrence of the operator to apply.
+        start_pos: The start position of the mutation, if known.
+        end_pos: The end position of the mutation, if known.
 
     Yields:
         A `(unmutated-code, mutated-code)` tuple to the with-block. If there was no
         mutation performed, the `mutated-code` is `None`.
     """
     with restore_contents(module_path):
-        original_code, mutated_code = apply_mutation(module_path, operator, occurrence)
+        original_code, mutated_code = apply_mutation(module_path, operator, occurrence, start_pos, end_pos)
         yield original_code, mutated_code
 
 
-def apply_mutation(module_path, operator, occurrence):
+@contextmanager
+def _use_mutation_edit(module_path, operator, occurrence, start_pos=None, end_pos=None, operator_key=None):
+    """Like `use_mutation`, but yields the `(unmutated-code, SourceEdit)` for the mutation.
+
+    The edit is `None` if no mutation was performed.
+    """
+    with restore_contents(module_path):
+        original_code, edit = MutationVisitor.edit_path(
+            module_path, operator, occurrence, start_pos, end_pos, operator_key=operator_key
+        )
+        yield original_code, edit
+
+
+@contextmanager
+def _use_precomputed_edit(module_path, precomputed):
+    """Like `_use_mutation_edit`, but applies a `PrecomputedEdit` rather than working out the mutation.
+
+    Raises:
+        StaleSourceError: The module isn't the version for which the edit was calculated.
+    """
+    with restore_contents(module_path):
+        original_code = read_python_source(module_path)
+        if source_hash(original_code) != precomputed.source_hash:
+            raise StaleSourceError(
+                f"{module_path} has changed since the mutation was calculated: "
+                f"expected source hash {precomputed.source_hash}, found {source_hash(original_code)}"
+            )
+
+        if precomputed.edit is not None:
+            log.info("Applying precomputed edit to %s: %s", module_path, precomputed.edit)
+            with module_path.open(mode="wt", encoding="utf-8") as handle:
+                handle.write(precomputed.edit.apply(original_code))
+                handle.flush()
+
+        yield original_code, precomputed.edit
+
+
+def apply_mutation(module_path, operator, occurrence, start_pos=None, end_pos=None):
     """Apply a specific mutation to a file on disk.
 
     Args:
         module_path: The path to the module to mutate.
         operator: The `operator` instance to use.
         occurrence: The occurrence of the operator to apply.
+        start_pos: The start position of the mutation, if known.
+        end_pos: The end position of the mutation, if known.
 
     Returns:
         A `(unmutated-code, mutated-code)` tuple to the with-block. If there was
         no mutation performed, the `mutated-code` is `None`.
     """
-    return MutationVisitor.mutate_path(module_path, operator, occurrence)
+    return MutationVisitor.mutate_path(module_path, operator, occurrence, start_pos, end_pos)
 
 
-def mutate_code(code, operator, occurrence):
+def mutate_code(code, operator, occurrence, start_pos=None, end_pos=None):
     """Apply a specific mutation to a code string.
 
     Args:
         code: The code to mutate.
         operator: The `operator` instance to use.
         occurrence: The occurrence of the operator to apply.
+        start_pos: The start position of the mutation, if known.
+        end_pos: The end position of the mutation, if known.
 
     Returns:
         The mutated code, or None if no mutation was applied.
     """
-    return MutationVisitor.mutate_code(code, operator, occurrence)
+    return MutationVisitor.mutate_code(code, operator, occurrence, start_pos, end_pos)
+
+
+@define(frozen=True)
+class SourceEdit:
+    """The replacement of a span of source code with new text.
+
+    Most mutations only change a small part of a module. Describing a mutation as an edit lets us produce the mutated
+    source (and its diff) without regenerating the code for the whole module.
+
+    Offsets are string indices into the original source code.
+    """
+
+    start: int = field()
+    end: int = field()
+    replacement: str = field()
+
+    @end.validator
+    def _validate_span(self, attribute, value):
+        if not 0 <= self.start <= value:
+            raise ValueError("Edit span must have 0 <= start <= end.")
+
+    def apply(self, source: str) -> str:
+        "Apply the edit to `source`, returning the edited code."
+        return source[: self.start] + self.replacement + source[self.end :]
+
+
+@define(frozen=True)
+class PrecomputedEdit:
+    """The edit which makes a mutation, calculated in advance for one version of the module.
+
+    This lets the mutation be made without parsing the module again, e.g. on a worker. Before the edit is applied, the
+    module's source is checked against `source_hash` (see `source_hash`), so an edit is never applied to a different
+    version of the module than the one it was calculated for.
+
+    `edit` is `None` if the mutation isn't possible.
+    """
+
+    source_hash: str = field()
+    edit: Optional[SourceEdit] = field()
+
+
+class StaleSourceError(Exception):
+    "A `PrecomputedEdit` was applied to a different version of a module than the one it was calculated for."
+
+
+def source_hash(source: str) -> str:
+    "A hash of the source code `source`, identifying the version of a module."
+    return hashlib.sha256(source.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+def mutation_edit(source, operator, occurrence, start_pos=None, end_pos=None, module_ast=None) -> Optional[SourceEdit]:
+    """Calculate the edit that applies a specific mutation to a code string.
+
+    The mutation is applied to a copy of the mutated node. Only that node's code (including its prefix) is regenerated,
+    and it becomes the replacement text for the node's span in `source`.
+
+    Args:
+        source: The code to mutate.
+        operator: The `operator` instance to use.
+        occurrence: The occurrence of the operator to apply.
+        start_pos: The start position of the mutation, if known.
+        end_pos: The end position of the mutation, if known.
+        module_ast: The parse tree of `source`, if it has already been parsed. The tree is not modified, so it can be
+            reused for many mutations.
+
+    Returns:
+        A `SourceEdit`, or `None` if no mutation was applied.
+    """
+    if module_ast is None:
+        module_ast = get_ast(source)
+    target = find_mutation_target(module_ast, operator, occurrence, start_pos, end_pos)
+    return _target_edit(LineOffsets(source), operator, target)
+
+
+def _target_edit(line_offsets, operator, target) -> Optional[SourceEdit]:
+    "The edit for the mutation of `target`, a `(node, index)` tuple from `find_mutation_target` (or `None`)."
+    if target is None:
+        return None
+
+    node, index = target
+    start = line_offsets.offset(node.get_start_pos_of_prefix())
+    end = line_offsets.offset(node.end_pos)
+
+    mutant = operator.mutate(_copy_node(node), index)
+    replacement = "" if mutant is None else mutant.get_code()
+    return SourceEdit(start, end, replacement)
+
+
+class ParsedModule:
+    """The parse tree of a module's source, with an index of the mutations that each operator can make in it.
+
+    Parse trees aren't changed when mutations are calculated (see `mutation_edit`), so a `ParsedModule` can be used
+    for any number of mutations, from several threads at once.
+
+    Args:
+        source: The source code of the module.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.ast = get_ast(source)
+        self.line_offsets = LineOffsets(source)
+        self._occurrences = {}
+        self._lock = threading.Lock()
+
+    def occurrences(self, key, operator):
+        """The `(node, index, position)` of each mutation that `operator` can make in the module, in occurrence order.
+
+        The tree is only walked the first time this is called for each `key`.
+
+        Args:
+            key: A hashable value identifying the operator and its arguments (see `mutation_operator_key`).
+            operator: The `Operator` instance.
+        """
+        with self._lock:
+            occurrences = self._occurrences.get(key)
+        if occurrences is None:
+            occurrences = [
+                (node, index, (tuple(start_pos), tuple(end_pos)))
+                for node in ast_nodes(self.ast)
+                for index, (start_pos, end_pos) in enumerate(operator.mutation_positions(node))
+            ]
+            with self._lock:
+                occurrences = self._occurrences.setdefault(key, occurrences)
+        return occurrences
+
+    def mutation_edit(self, key, operator, occurrence, start_pos=None, end_pos=None) -> Optional[SourceEdit]:
+        """Like `mutation_edit`, but using the module's parse tree and occurrence index.
+
+        Args:
+            key: A hashable value identifying the operator and its arguments (see `mutation_operator_key`).
+            operator: The `Operator` instance to use.
+            occurrence: The occurrence of the operator to apply.
+            start_pos: The start position of the mutation, if known.
+            end_pos: The end position of the mutation, if known.
+        """
+        target = find_mutation_target(
+            self.ast,
+            operator,
+            occurrence,
+            start_pos,
+            end_pos,
+            occurrence_index=lambda: self.occurrences(key, operator),
+        )
+        return _target_edit(self.line_offsets, operator, target)
+
+
+DEFAULT_MAX_MODULES = 32
+
+
+class ModuleCache:
+    """An in-memory, least recently used cache of `ParsedModule`\\s, so each module is only parsed once.
+
+    Entries are keyed by a hash of the module's source, so a module which changes just gets a new entry. It is safe to
+    use from several threads at once.
+
+    Args:
+        max_modules: The maximum number of modules to keep.
+    """
+
+    def __init__(self, max_modules=DEFAULT_MAX_MODULES):
+        self.max_modules = max_modules
+        self._modules = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, source) -> ParsedModule:
+        "The `ParsedModule` for the module with source code `source`, parsing it if it's not in the cache."
+        key = source_hash(source)
+        with self._lock:
+            module = self._modules.get(key)
+            if module is not None:
+                self._modules.move_to_end(key)
+                return module
+
+        module = ParsedModule(source)
+        with self._lock:
+            self._modules[key] = module
+            while len(self._modules) > self.max_modules:
+                self._modules.popitem(last=False)
+        return module
+
+
+# The ModuleCache used for mutations in this process, if any.
+_module_cache = None
+
+
+def use_module_cache(cache: Optional[ModuleCache] = None):
+    """Install the module cache used to calculate mutations in this process.
+
+    Args:
+        cache: The `ModuleCache` to use, or `None` to parse modules every time.
+    """
+    global _module_cache  # pylint: disable=global-statement
+    _module_cache = cache
+
+
+def module_cache() -> Optional[ModuleCache]:
+    "The module cache currently installed in this process, or `None`."
+    return _module_cache
+
+
+def _copy_node(node):
+    """Copy the subtree rooted at `node`.
+
+    The copy shares the parent of `node` (so that operators can still inspect the context of the node), but the parent
+    doesn't know about the copy. This means that mutating the copy leaves the original tree untouched.
+    """
+    if node.parent is None:
+        return copy.deepcopy(node)
+    return copy.deepcopy(node, {id(node.parent): node.parent})
+
+
+def find_mutation_target(module_ast, operator, occurrence, start_pos=None, end_pos=None, occurrence_index=None):
+    """Find the node and operator-specific index for a mutation.
+
+    If the position of the mutation is known, the node is located directly from that position: we find the leaf at
+    `start_pos` and only ask the operator about that leaf and its ancestors. This avoids walking the entire tree, which
+    is what makes looking up a mutation by `occurrence` expensive.
+
+    The occurrence is only needed when the position doesn't identify a single mutation. This happens when an operator
+    can make several mutations at the same position (e.g. the number replacer), when the position is unknown, or when
+    the position doesn't match anything (e.g. because the module has changed since the session was initialized). In
+    these cases we fall back to counting occurrences, and we check the result against the position if we have one.
+    Conversely, if the position identifies a single mutation and `occurrence_index` is given, we check that it's the
+    expected occurrence. (Without an index, that would mean walking the tree after all, so it isn't checked.) A
+    mismatch means the module has probably changed since the session was initialized, so it's logged.
+
+    Args:
+        module_ast: The parse tree of the module.
+        operator: The `Operator` instance to use.
+        occurrence: The occurrence of the operator to apply.
+        start_pos: The `(line, col)` start position of the mutation, or `None`.
+        end_pos: The `(line, col)` end position of the mutation, or `None`.
+        occurrence_index: A callable returning the operator's mutations in occurrence order, as from
+            `ParsedModule.occurrences`. If given, it's used rather than walking the tree to count occurrences.
+
+    Returns:
+        A `(node, index)` tuple, or `None` if there is no such mutation.
+    """
+    position = _known_position(start_pos, end_pos)
+
+    if position is not None:
+        matches = _mutations_at_position(module_ast, operator, position)
+        if len(matches) == 1:
+            if occurrence_index is not None:
+                _check_occurrence(matches[0], operator, occurrence, position, occurrence_index())
+            return matches[0]
+
+    if occurrence_index is None:
+        target = _mutation_by_occurrence(module_ast, operator, occurrence)
+    else:
+        occurrences = occurrence_index()
+        target = occurrences[occurrence] if 0 <= occurrence < len(occurrences) else None
+    if target is None:
+        return None
+
+    node, index, target_position = target
+    if position is not None and target_position != position:
+        log.warning(
+            "Occurrence %s of %s is at %s, not at the expected position %s",
+            occurrence,
+            operator,
+            target_position,
+            position,
+        )
+
+    return node, index
+
+
+def _check_occurrence(target, operator, occurrence, position, occurrences):
+    "Log a warning if `target`, the `(node, index)` of the mutation at `position`, isn't the `occurrence`-th one."
+    node, index = target
+    if 0 <= occurrence < len(occurrences):
+        occurrence_node, occurrence_index, _ = occurrences[occurrence]
+        if occurrence_node is node and occurrence_index == index:
+            return
+    log.warning("The mutation of %s at %s isn't occurrence %s of the operator", operator, position, occurrence)
+
+
+def _known_position(start_pos, end_pos):
+    """Normalize a mutation position, returning `None` if it's unknown.
+
+    Positions which don't refer to a real location (parso lines start at 1) are placeholders.
+    """
+    if start_pos is None or end_pos is None:
+        return None
+
+    start_pos, end_pos = tuple(start_pos), tuple(end_pos)
+    if start_pos[0] < 1:
+        return None
+
+    return start_pos, end_pos
+
+
+def _mutations_at_position(module_ast, operator, position):
+    """All `(node, index)`s for mutations made by `operator` at exactly `position`, in walk order."""
+    start_pos, _ = position
+    try:
+        leaf = module_ast.get_leaf_for_position(start_pos, include_prefixes=True)
+    except ValueError:
+        return []
+
+    # A position on the boundary between two leaves is reported as part of the first, but mutations start at the second.
+    if leaf.end_pos <= start_pos and leaf.get_next_leaf() is not None:
+        leaf = leaf.get_next_leaf()
+
+    ancestors = []
+    node = leaf
+    while node is not None:
+        ancestors.append(node)
+        node = node.parent
+
+    # The walk visits ancestors before their descendants.
+    return [
+        (node, index)
+        for node in reversed(ancestors)
+        for index, node_position in enumerate(operator.mutation_positions(node))
+        if tuple(node_position) == position
+    ]
+
+
+def _mutation_by_occurrence(module_ast, operator, occurrence):
+    """Find the `occurrence`-th mutation of `operator` by walking the tree.
+
+    Returns:
+        A `(node, index, position)` tuple, or `None` if there are not enough occurrences.
+    """
+    if occurrence < 0:
+        return None
+
+    count = 0
+    for node in ast_nodes(module_ast):
+        for index, (start_pos, end_pos) in enumerate(operator.mutation_positions(node)):
+            if count == occurrence:
+                return node, index, (tuple(start_pos), tuple(end_pos))
+            count += 1
+
+    return None
 
 
 class MutationVisitor(Visitor):
@@ -154,42 +711,80 @@ class MutationVisitor(Visitor):
 
     Note that `mutant` is just the specifically mutated node. It will generally
     be a part of the larger AST which is returned from `walk()`.
+
+    The `mutate_code` and `mutate_path` class methods don't actually walk the tree. They locate the mutation with
+    `find_mutation_target` instead.
     """
 
     @classmethod
-    def mutate_code(cls, source, operator, occurence):
-        ast = get_ast(source)
-        visitor = cls(occurence, operator)
-        mutated_ast = visitor.walk(ast)
-        if not visitor.mutation_applied:
+    def mutate_code(cls, source, operator, occurence, start_pos=None, end_pos=None):
+        edit = mutation_edit(source, operator, occurence, start_pos, end_pos)
+        if edit is None:
             return None
-        return mutated_ast.get_code()
+        return edit.apply(source)
 
     @classmethod
-    def mutate_path(cls, module_path, operator, occurrence):
+    def mutate_path(cls, module_path, operator, occurrence, start_pos=None, end_pos=None):
         """Mutate a module in place on disk.
 
         Args:
             module_path (Path): The path to the module file.
             operator (Operator): The operator to apply.
             occurrence (int): The occurrence of the operator to apply.
+            start_pos (tuple[int, int]|None): The start position of the mutation, if known.
+            end_pos (tuple[int, int]|None): The end position of the mutation, if known.
 
         Returns:
             tuple[str, str|None]: The original code and the mutated code (or None)
         """
-        log.info("Applying mutation: path=%s, op=%s, occurrence=%s", module_path, operator, occurrence)
+        original_code, edit = cls.edit_path(module_path, operator, occurrence, start_pos, end_pos)
+        if edit is None:
+            return original_code, None
+        return original_code, edit.apply(original_code)
+
+    @classmethod
+    def edit_path(cls, module_path, operator, occurrence, start_pos=None, end_pos=None, operator_key=None):
+        """Mutate a module in place on disk, describing the mutation as an edit.
+
+        If a module cache has been installed with `use_module_cache` and `operator_key` is given, the module is taken
+        from the cache rather than being parsed.
+
+        Args:
+            module_path (Path): The path to the module file.
+            operator (Operator): The operator to apply.
+            occurrence (int): The occurrence of the operator to apply.
+            start_pos (tuple[int, int]|None): The start position of the mutation, if known.
+            end_pos (tuple[int, int]|None): The end position of the mutation, if known.
+            operator_key (Hashable|None): A value identifying the operator and its arguments (see
+                `mutation_operator_key`).
+
+        Returns:
+            tuple[str, SourceEdit|None]: The original code and the edit applied to it (or None)
+        """
+        log.info(
+            "Applying mutation: path=%s, op=%s, occurrence=%s, position=%s-%s",
+            module_path,
+            operator,
+            occurrence,
+            start_pos,
+            end_pos,
+        )
 
         original_code = read_python_source(module_path)
-        mutated_code = cls.mutate_code(original_code, operator, occurrence)
+        cache = module_cache()
+        if cache is None or operator_key is None:
+            edit = mutation_edit(original_code, operator, occurrence, start_pos, end_pos)
+        else:
+            edit = cache.get(original_code).mutation_edit(operator_key, operator, occurrence, start_pos, end_pos)
 
-        if mutated_code is None:
+        if edit is None:
             return original_code, None
 
         with module_path.open(mode="wt", encoding="utf-8") as handle:
-            handle.write(mutated_code)
+            handle.write(edit.apply(original_code))
             handle.flush()
 
-        return original_code, mutated_code
+        return original_code, edit
 
     def __init__(self, occurrence, operator):
         self.operator = operator
@@ -212,14 +807,64 @@ class MutationVisitor(Visitor):
         return node
 
 
-def _make_diff(original_source, mutated_source, module_path):
+# The number of context lines in diffs.
+_DIFF_CONTEXT = 3
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(,\d+)? \+(\d+)(,\d+)? @@$")
+
+
+def make_diff(original_source, mutated_source, module_path, edit=None):
+    """Make a unified diff between the original and mutated source.
+
+    If the `SourceEdit` that produced `mutated_source` is provided, only the lines around the edit are compared, so
+    the cost of the diff depends on the size of the change rather than the size of the module.
+    """
     module_diff = ["--- mutation diff ---"]
+    line_offset = 0
+
+    if edit is not None:
+        # The text after the edit is the same in both versions, so the slices of the two versions end at the same
+        # place relative to the end of the edit.
+        slice_start = _context_start(original_source, edit.start, _DIFF_CONTEXT)
+        slice_end = _context_end(original_source, max(edit.end - 1, edit.start), _DIFF_CONTEXT)
+        line_offset = original_source.count("\n", 0, slice_start)
+        original_source = original_source[slice_start:slice_end]
+        mutated_source = mutated_source[slice_start : slice_end + len(edit.replacement) - (edit.end - edit.start)]
+
     for line in difflib.unified_diff(
         original_source.split("\n"),
         mutated_source.split("\n"),
         fromfile="a" + str(module_path),
         tofile="b" + str(module_path),
         lineterm="",
+        n=_DIFF_CONTEXT,
     ):
+        if line_offset:
+            line = _HUNK_HEADER.sub(
+                lambda match: "@@ -{}{} +{}{} @@".format(
+                    int(match[1]) + line_offset, match[2] or "", int(match[3]) + line_offset, match[4] or ""
+                ),
+                line,
+            )
         module_diff.append(line)
     return module_diff
+
+
+def _context_start(source, offset, num_lines):
+    "The offset of the start of the line `num_lines` lines before the line containing `offset`."
+    start = source.rfind("\n", 0, offset) + 1
+    for _ in range(num_lines):
+        if start == 0:
+            break
+        start = source.rfind("\n", 0, start - 1) + 1
+    return start
+
+
+def _context_end(source, offset, num_lines):
+    "The offset of the end (excluding the newline) of the line `num_lines` lines after the line containing `offset`."
+    end = source.find("\n", offset)
+    for _ in range(num_lines):
+        if end == -1:
+            break
+        end = source.find("\n", end + 1)
+    return len(source) if end == -1 else end
@@ -0,0 +1,127 @@
+"""Support for estimating the survival rate of a session from a sample of its mutants.
+
+A full mutation testing run can take hours, but a good estimate of the survival rate is often all that we need (e.g.
+for a pull-request check). If the mutants are run in random order, the results so far are a random sample of the
+session, and the confidence interval of the survival rate narrows as results arrive. We can stop as soon as it's narrow
+enough.
+
+To keep the sample representative, mutants are run in a *stratified* random order: every module and operator is
+represented in any prefix of the order in proportion to its number of mutants.
+"""
+
+import random
+from collections import defaultdict
+from collections.abc import Callable, Iterable
+from typing import Optional
+
+from cosmic_ray.tools.survival_rate import equivalents_count, kills_count, wilson_interval
+from cosmic_ray.work_item import WorkItem, WorkResult, WorkerOutcome
+
+
+def stratified_order(work_items: Iterable[WorkItem], rng: Optional[random.Random] = None) -> list[WorkItem]:
+    """Order work items randomly, stratified by module and operator.
+
+    Each work item is assigned to a stratum based on its module and operator. Within each stratum the items are
+    shuffled, and the strata are interleaved so that the items of each stratum are spread evenly through the order.
+
+    Args:
+        work_items: The work items to order.
+        rng: The random number generator to use.
+    """
+    rng = rng or random.Random()
+
+    strata = defaultdict(list)
+    for work_item in work_items:
+        strata[tuple((str(mutation.module_path), mutation.operator_name) for mutation in work_item.mutations)].append(
+            work_item
+        )
+
+    keyed = []
+    for stratum in strata.values():
+        rng.shuffle(stratum)
+        # Item `i` of a stratum of size `n` goes at a random point in the i-th `1/n` of the order.
+        keyed.extend(((index + rng.random()) / len(stratum), work_item) for index, work_item in enumerate(stratum))
+
+    keyed.sort(key=lambda item: item[0])
+    return [work_item for _, work_item in keyed]
+
+
+# Even the Wilson interval is unreliable for very small samples, so we never stop before we have this many results.
+MIN_SAMPLE_SIZE = 30
+
+
+def run_until(work_items: Iterable[WorkItem], tracker: "RateTracker", stop: Callable[[], bool]):
+    """Yield work items until `stop()` returns true.
+
+    `stop` is called before each item is yielded, so this works with distributors that only take a new item when
+    they're ready to run it. The results for the yielded items must be added to `tracker` as they arrive. We never stop
+    before `tracker` has `MIN_SAMPLE_SIZE` results.
+
+    Args:
+        work_items: The work items, in the order in which they should be run.
+        tracker: The tracker for the session's results.
+        stop: A callable which says whether to stop, typically based on the state of `tracker`.
+    """
+    for work_item in work_items:
+        if tracker.num_results >= MIN_SAMPLE_SIZE and stop():
+            return
+        yield work_item
+
+
+class RateTracker:
+    """Keeps track of the survival rate of a session as results arrive.
+
+    This avoids re-reading all of the results from the database each time a result arrives. Equivalent mutants are
+    left out of the survival rate, so they're counted as neither work items nor results.
+    """
+
+    def __init__(self, num_items, num_results, num_killed):
+        self.num_items = num_items
+        self.num_results = num_results
+        self.num_killed = num_killed
+
+    @classmethod
+    def from_db(cls, work_db):
+        "Create a tracker for the results currently in `work_db`."
+        num_equivalent = equivalents_count(work_db)
+        return cls(work_db.num_work_items - num_equivalent, work_db.num_results - num_equivalent, kills_count(work_db))
+
+    def add(self, result: WorkResult):
+        "Account for a new result."
+        if result.worker_outcome == WorkerOutcome.EQUIVALENT:
+            self.num_items -= 1
+            return
+        self.num_results += 1
+        self.num_killed += result.is_killed
+
+    @property
+    def rate(self):
+        "The survival rate (percentage) of the results so far."
+        if not self.num_results:
+            return 0
+        return (1 - self.num_killed / self.num_results) * 100
+
+    def bounds(self, z_score):
+        """The `(lower, upper)` bounds of the confidence interval for the survival rate, as percentages.
+
+        This is the Wilson score interval, which stays wide when all of the results so far are the same.
+        """
+        return wilson_interval(self.rate, self.num_results, self.num_items, z_score)
+
+    def interval(self, z_score):
+        "The half-width of the confidence interval for the survival rate, in percentage points."
+        lower, upper = self.bounds(z_score)
+        return (upper - lower) / 2
+
+    def exceeds(self, threshold, z_score):
+        """Whether the survival rate is above `threshold` (a percentage).
+
+        Returns: `True` if the whole confidence interval is above `threshold`, `False` if the whole interval is at or
+            below `threshold`, or `None` if we can't tell yet.
+        """
+        lower, upper = self.bounds(z_score)
+        if lower > threshold:
+            return True
+        if upper <= threshold:
+            return False
+        return None
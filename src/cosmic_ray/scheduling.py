@@ -0,0 +1,241 @@
+"""Orders in which to run pending work.
+
+By default, ``exec`` runs pending work in a random order. When a few mutants take much longer to test than the rest,
+that often means one of them starts near the end of the run, and the other workers sit idle while it finishes. With
+``schedule = "longest-first"`` in the ``cosmic-ray`` section of the configuration, ``exec`` runs the work with the
+longest estimated duration first (see `cosmic_ray.cost`), so that the short jobs fill in the gaps at the end.
+
+The estimates start from the durations of the work already completed in the session, and are updated as each result
+arrives, so even a new session learns which parts of the project are slow as it runs. Distributors take work items
+only as they have room for them, so each one is chosen using the latest estimates.
+
+With ``schedule = "module-affinity"``, each worker is given the work for one module at a time, so that whatever it
+has cached for the module (its parse tree, bytecode, or the test daemon's preloaded modules) is reused by its next
+job. The largest modules are handed out first. Once every module has been handed out, a worker which runs out of work
+takes half of the remaining work from the worker with the most left, so that they all finish at about the same time.
+The local (with ``slots``), http and stream distributors give each worker its own work in this way (see `work_queue`).
+Other distributors just run the modules one after another.
+"""
+
+import heapq
+import logging
+from collections import defaultdict, deque
+
+from cosmic_ray.cost import CostModel
+
+log = logging.getLogger(__name__)
+
+
+class LongestFirst:
+    """An iterable of work items which yields the item with the longest estimated duration next.
+
+    Call `record` with each result so that it's used for later estimates.
+
+    Args:
+        work_items: The work items to run.
+        cost_model: The `CostModel` with which to estimate durations. It's updated as results are recorded.
+    """
+
+    def __init__(self, work_items, cost_model: CostModel):
+        self._cost_model = cost_model
+        # Work items with the same key always have the same estimate, so they're kept in groups.
+        self._groups = {}
+        for work_item in work_items:
+            self._groups.setdefault(CostModel.key(work_item), []).append(work_item)
+
+        # A new duration only changes the estimates for the module it's for, and for modules without any durations
+        # (which are estimated from all of the durations), so we keep track of the groups for each module.
+        self._module_groups = defaultdict(set)
+        for key in self._groups:
+            for module_path, _, _ in key:
+                self._module_groups[module_path].add(key)
+
+        # Heaps of `[-estimate, order, key, valid]` entries for the groups. Groups for modules which all have durations
+        # are in `_known`. Every other group is estimated to take at least the model's fallback, which changes with each
+        # new duration, so those are in `_unknown`, ordered by the estimate for their other mutations. Entries are
+        # invalidated rather than removed when a group's estimate changes.
+        self._known = []
+        self._unknown = []
+        self._entries = {}
+        self._order = {key: order for order, key in enumerate(self._groups)}
+        for key in self._groups:
+            self._push(key)
+
+        self._running = {}
+
+    def pending(self):
+        "Whether there's any work left, without taking any."
+        return bool(self._groups)
+
+    def __iter__(self):
+        while self._groups:
+            key = self._longest()
+            group = self._groups[key]
+            work_item = group.pop()
+            if not group:
+                self._remove(key)
+            self._running[work_item.job_id] = work_item
+            yield work_item
+
+    def record(self, job_id, result):
+        "Update the estimates with the duration of `result`, the result for the job `job_id`."
+        work_item = self._running.pop(job_id, None)
+        if work_item is None or result.duration is None:
+            return
+
+        self._cost_model.add(work_item, result.duration)
+        for module_path in {module_path for module_path, _, _ in CostModel.key(work_item)}:
+            for key in list(self._module_groups.get(module_path, ())):
+                self._push(key)
+
+    def _push(self, key):
+        "Add the entry for the group `key` to the heaps with its current estimate, replacing any existing entry."
+        old = self._entries.get(key)
+        if old is not None:
+            old[3] = False
+
+        mutations = self._groups[key][0].mutations
+        known = [mutation for mutation in mutations if self._cost_model.has_durations(mutation.module_path)]
+        if len(known) == len(mutations):
+            heap, estimate = self._known, self._cost_model.estimate(self._groups[key][0])
+        else:
+            heap, estimate = self._unknown, max(map(self._cost_model.estimate_mutation, known), default=0.0)
+
+        entry = self._entries[key] = [-estimate, self._order[key], key, True]
+        heapq.heappush(heap, entry)
+
+    def _remove(self, key):
+        del self._groups[key]
+        self._entries.pop(key)[3] = False
+        for module_path, _, _ in key:
+            self._module_groups[module_path].discard(key)
+
+    def _longest(self):
+        "The key of the group with the longest estimate."
+        candidates = []
+        known = _top(self._known)
+        if known is not None:
+            candidates.append((known[0], known[1], known[2]))
+        unknown = _top(self._unknown)
+        if unknown is not None:
+            candidates.append((-max(-unknown[0], self._cost_model.fallback), unknown[1], unknown[2]))
+        return min(candidates)[2]
+
+
+def _top(heap):
+    "The top valid entry of `heap`, or `None` if there aren't any."
+    while heap and not heap[0][3]:
+        heapq.heappop(heap)
+    return heap[0] if heap else None
+
+
+class ModuleAffinity:
+    """An iterable of work items which gives each worker the work for one module at a time.
+
+    Use `take` to get the next work item for a particular worker. Iterating yields the work items module by module.
+
+    Args:
+        work_items: The work items to run.
+    """
+
+    def __init__(self, work_items):
+        groups = defaultdict(deque)
+        for work_item in work_items:
+            groups[_module_key(work_item)].append(work_item)
+        # Smallest first, so the largest is popped first.
+        self._unassigned = sorted(groups.values(), key=len)
+        self._assigned = {}
+
+    def take(self, worker):
+        """The next work item for `worker`, or `None` if there's no work left.
+
+        Args:
+            worker: A hashable identifier for the worker, e.g. its URL.
+        """
+        group = self._assigned.get(worker)
+        if not group:
+            group = self._unassigned.pop() if self._unassigned else self._steal()
+            if group is None:
+                self._assigned.pop(worker, None)
+                return None
+            self._assigned[worker] = group
+        return group.popleft()
+
+    def pending(self):
+        "Whether there's any work left for any worker, without taking any."
+        return any(self._unassigned) or any(self._assigned.values())
+
+    def _steal(self):
+        "Take half of the work (rounded up) from the worker with the most left."
+        victim = max(self._assigned.values(), key=len, default=None)
+        if not victim:
+            return None
+        stolen = deque(victim.pop() for _ in range((len(victim) + 1) // 2))
+        stolen.reverse()
+        return stolen
+
+    def __iter__(self):
+        while (work_item := self.take(None)) is not None:
+            yield work_item
+
+
+def _module_key(work_item):
+    return str(work_item.mutations[0].module_path) if work_item.mutations else ""
+
+
+# Marks that `_InOrder` hasn't looked ahead.
+_NOTHING = object()
+
+
+class _InOrder:
+    "Gives all workers the next work item from an iterable."
+
+    def __init__(self, work_items):
+        self._source = work_items
+        self._work_items = iter(work_items)
+        self._next = _NOTHING
+
+    def take(self, worker):  # pylint: disable=unused-argument
+        if self._next is not _NOTHING:
+            work_item, self._next = self._next, _NOTHING
+            return work_item
+        return next(self._work_items, None)
+
+    def pending(self):
+        if self._next is not _NOTHING:
+            return True
+        if isinstance(self._source, LongestFirst):
+            return self._source.pending()
+        # Other iterables can only be asked by taking the next item, which we keep for the next `take`.
+        self._next = next(self._work_items, _NOTHING)
+        return self._next is not _NOTHING
+
+
+def work_queue(pending_work):
+    """A queue from which distributors take the work for each of their workers.
+
+    The queue has a method ``take(worker)`` which returns the next work item for `worker` (a hashable identifier for
+    it), or `None` if there's no work left, and a method ``pending()`` which says whether there's any work left without
+    taking any. Work items are taken from `pending_work` only as they're needed. Unless `pending_work` is a
+    `ModuleAffinity`, every worker gets the next work item from it.
+    """
+    if isinstance(pending_work, ModuleAffinity):
+        return pending_work
+    return _InOrder(pending_work)
+
+
+def schedule(work_db, pending_work, config):
+    """Order `pending_work` according to the configured schedule.
+
+    Returns: A `(work-items, record)` tuple. `work-items` is an iterable of the work items in the order in which to run
+    them, and `record` is a function to call with the job ID and result of each completed job, or `None` if the
+    schedule doesn't need them.
+    """
+    if config.schedule == "longest-first":
+        cost_model = CostModel.from_results(work_db.completed_work_items)
+        log.info("Scheduling the longest work first, using %s recorded durations", cost_model.num_durations)
+        scheduler = LongestFirst(pending_work, cost_model)
+        return scheduler, scheduler.record
+    if config.schedule == "module-affinity":
+        return ModuleAffinity(pending_work), None
+    return pending_work, None
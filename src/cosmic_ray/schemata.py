@@ -0,0 +1,354 @@
+"""Mutant schemata: many mutants of a module compiled into one module.
+
+Normally each mutant is tested by writing the mutated module to disk and running the test suite against it, so every
+mutant pays for parsing, writing and importing the module. A mutant schema is a rewritten version of a module which
+contains *all* of its mutants, each guarded by a runtime switch::
+
+    __cr_active__ = __import__("os").environ.get("COSMIC_RAY_ACTIVE_MUTANT")
+    ...
+    if __cr_active__ == "<job-id>":
+        x = a * b
+    else:
+        x = a + b
+
+The schema is written once, and the mutant to activate is chosen per test process through the
+``COSMIC_RAY_ACTIVE_MUTANT`` environment variable. With the variable unset, the schema behaves like the original module.
+
+Mutants are guarded at the level of the innermost statement that contains them, and the schema is built from the same
+`SourceEdit`\\s as the per-mutant code path, so a mutant in a schema is exactly the mutant that `mutate_and_test` would
+test. Mutants which can't be guarded (e.g. because guarding them would produce invalid code) are tested the normal way.
+"""
+
+import contextlib
+import logging
+import traceback
+import warnings
+from collections import defaultdict
+from collections.abc import Iterable, Mapping
+from itertools import groupby
+from pathlib import Path
+
+import parso
+from attrs import define
+from parso.utils import split_lines
+
+from cosmic_ray.ast import LineOffsets, get_ast
+from cosmic_ray.daemon import ACTIVE_MUTANT_VAR
+from cosmic_ray.mutating import SourceEdit, make_diff, mutate_and_test, single_mutation_edits
+from cosmic_ray.testing import run_tests
+from cosmic_ray.util import restore_contents
+from cosmic_ray.work_item import TestOutcome, WorkItem, WorkResult, WorkerOutcome
+
+log = logging.getLogger(__name__)
+
+# Dunder names aren't mangled in class bodies, so the switch can be read anywhere in the module.
+SWITCH_NAME = "__cr_active__"
+
+_HEADER = f'{SWITCH_NAME} = __import__("os").environ.get("{ACTIVE_MUTANT_VAR}")\n'
+
+# The types of the nodes which contain statements.
+_STATEMENT_CONTAINERS = ("file_input", "suite")
+
+
+def build_schema(source: str, mutants: Mapping[str, SourceEdit], module_ast=None):
+    """Build the mutant schema for a module.
+
+    Args:
+        source: The source code of the module.
+        mutants: A mapping from mutant keys (the values of the switch which activate them) to the edits which make them.
+        module_ast: The parse tree of `source`, if it has already been parsed.
+
+    Returns:
+        A `(schema-source, guarded-keys)` tuple. `guarded-keys` is the set of keys for the mutants in the schema. If no
+        mutants could be guarded, the source is returned unchanged.
+    """
+    if module_ast is None:
+        module_ast = get_ast(source)
+    line_offsets = LineOffsets(source)
+    header_offset = _header_offset(module_ast, line_offsets)
+
+    guards = {}
+    for key, edit in mutants.items():
+        chain = _guard_chain(source, module_ast, line_offsets, edit)
+        if chain and line_offsets.offset(chain[0].get_start_pos_of_prefix()) >= header_offset:
+            guards[key] = chain, edit
+        else:
+            log.info("Unable to guard mutant %s", key)
+
+    schema = _assemble(source, line_offsets, header_offset, guards)
+    if not _compiles(schema):
+        # Find the mutants which are to blame. This is only expensive when something is wrong.
+        guards = {
+            key: guard
+            for key, guard in guards.items()
+            if _compiles(_assemble(source, line_offsets, header_offset, {key: guard}))
+        }
+        schema = _assemble(source, line_offsets, header_offset, guards)
+        if not _compiles(schema):
+            return source, frozenset()
+
+    if not guards:
+        return source, frozenset()
+
+    return schema, frozenset(guards)
+
+
+@define(frozen=True)
+class SchemaMutant:
+    "A mutant in a mutant schema."
+
+    module_path: Path
+    original_code: str
+    edit: SourceEdit
+
+
+def plan_schemata(work_items: Iterable[WorkItem]):
+    """Build the mutant schemata for the modules mutated by `work_items`.
+
+    Only work items with a single mutation can be part of a schema. The mutants are keyed by the job IDs of their work
+    items.
+
+    Returns:
+        A `({module-path: schema-source}, {job-id: SchemaMutant})` tuple. Work items which aren't in the second mapping
+        need to be tested individually.
+    """
+    schemata = {}
+    mutants = {}
+    for module_path, module_edits in groupby(
+        single_mutation_edits(work_items), key=lambda item: item[0].mutations[0].module_path
+    ):
+        edits = {}
+        for work_item, original_code, edit in module_edits:
+            if edit is not None:
+                edits[work_item.job_id] = edit
+
+        if not edits:
+            continue
+
+        schema, guarded = build_schema(original_code, edits)
+        if guarded:
+            schemata[module_path] = schema
+            mutants.update((job_id, SchemaMutant(module_path, original_code, edits[job_id])) for job_id in guarded)
+
+    return schemata, mutants
+
+
+@contextlib.contextmanager
+def use_schemata(schemata: Mapping[Path, str]):
+    "A context manager that writes mutant schemata to disk for the duration of a with-block."
+    with contextlib.ExitStack() as stack:
+        for module_path, schema in schemata.items():
+            stack.enter_context(restore_contents(module_path))
+            with module_path.open(mode="wt", encoding="utf-8") as handle:
+                handle.write(schema)
+        yield
+
+
+def run_schema_mutant(key: str, mutant: SchemaMutant, test_command, timeout) -> WorkResult:
+    """Run the tests against a mutant in a schema that's on disk.
+
+    Like `mutate_and_test`, this reports exceptions in the returned `WorkResult` rather than raising them.
+    """
+    try:
+        test_outcome, output = run_tests(test_command, timeout, mutant=key)
+        mutated_code = mutant.edit.apply(mutant.original_code)
+        diff = make_diff(mutant.original_code, mutated_code, mutant.module_path, mutant.edit)
+        return WorkResult(
+            output=output,
+            diff="\n".join(diff),
+            test_outcome=test_outcome,
+            worker_outcome=WorkerOutcome.NORMAL,
+        )
+    except Exception:  # noqa # pylint: disable=broad-except
+        return WorkResult(
+            output=traceback.format_exc(), test_outcome=TestOutcome.INCOMPETENT, worker_outcome=WorkerOutcome.EXCEPTION
+        )
+
+
+def run_with_schemata(work_items: Iterable[WorkItem], test_command, timeout, on_task_complete):
+    """Test a collection of work items, using mutant schemata where possible.
+
+    The work items which can't be part of a schema are tested first, with `mutate_and_test`. Then the schemata are
+    written and the remaining mutants are tested against them. All of `work_items` is consumed before any tests are
+    run.
+    """
+    work_items = list(work_items)
+    schemata, mutants = plan_schemata(work_items)
+    log.info("%s of %s mutants are in mutant schemata", len(mutants), len(work_items))
+
+    for work_item in work_items:
+        if work_item.job_id not in mutants:
+            result = mutate_and_test(mutations=work_item.mutations, test_command=test_command, timeout=timeout)
+            on_task_complete(work_item.job_id, result)
+
+    with use_schemata(schemata):
+        for work_item in work_items:
+            if work_item.job_id in mutants:
+                result = run_schema_mutant(work_item.job_id, mutants[work_item.job_id], test_command, timeout)
+                on_task_complete(work_item.job_id, result)
+
+
+def _header_offset(module_ast, line_offsets):
+    """The offset at which to put the definition of the switch.
+
+    This is after the module docstring and any `__future__` imports, since those have to come first.
+    """
+    offset = 0
+    for index, statement in enumerate(module_ast.children):
+        if (index == 0 and _is_docstring(statement)) or _is_future_import(statement):
+            offset = line_offsets.offset(statement.end_pos)
+        else:
+            break
+    return offset
+
+
+def _is_docstring(statement):
+    return statement.type == "simple_stmt" and statement.children[0].type == "string"
+
+
+def _is_future_import(statement):
+    if statement.type != "simple_stmt" or statement.children[0].type != "import_from":
+        return False
+    return [name.value for name in statement.children[0].get_from_names()] == ["__future__"]
+
+
+def _guard_chain(source, module_ast, line_offsets, edit):
+    """The statements which contain an edit, outermost first.
+
+    The innermost statement is the one which will be guarded by the mutant's switch. Returns an empty list if the
+    mutant can't be guarded.
+    """
+    position = line_offsets.position(edit.start)
+    try:
+        leaf = module_ast.get_leaf_for_position(position, include_prefixes=True)
+    except ValueError:
+        return []
+
+    # A position on the boundary between two leaves is reported as part of the first, but the edit starts at the second.
+    if leaf.end_pos <= position and leaf.get_next_leaf() is not None:
+        leaf = leaf.get_next_leaf()
+
+    chain = []
+    node = leaf.parent
+    while node is not None and node.parent is not None:
+        if node.parent.type in _STATEMENT_CONTAINERS:
+            start, end = _region(node, line_offsets)
+            if start <= edit.start and edit.end <= end:
+                chain.append(node)
+        node = node.parent
+    chain.reverse()
+
+    if not chain:
+        return []
+
+    # The guarded statement is rewritten with its lines inside an if-statement, so it has to start its own line.
+    innermost = chain[-1]
+    line_start = line_offsets.offset((innermost.start_pos[0], 0))
+    start, _ = _region(innermost, line_offsets)
+    if start > line_start or source[line_start : line_offsets.offset(innermost.start_pos)].strip():
+        return []
+
+    return chain
+
+
+def _compiles(source):
+    try:
+        with warnings.catch_warnings():
+            # Mutants can produce code which is valid but suspicious, e.g. `x is 1`.
+            warnings.simplefilter("ignore")
+            compile(source, "<schema>", "exec", dont_inherit=True)
+    except (SyntaxError, ValueError):
+        return False
+    return True
+
+
+def _region(statement, line_offsets):
+    "The `(start, end)` offsets of a statement, including its prefix."
+    return line_offsets.offset(statement.get_start_pos_of_prefix()), line_offsets.offset(statement.end_pos)
+
+
+def _assemble(source, line_offsets, header_offset, guards):
+    body = _render(source, line_offsets, header_offset, len(source), 0, guards)
+    separator = "" if header_offset == 0 or source[header_offset - 1] == "\n" else "\n"
+    return source[:header_offset] + separator + _HEADER + body
+
+
+def _render(source, line_offsets, start, end, depth, guards):
+    """Render the source between `start` and `end` with the guards for the mutants in that range.
+
+    Args:
+        depth: The depth, in the guard chains, of the statements in the range.
+        guards: A mapping from mutant keys to `(guard-chain, edit)` tuples.
+    """
+    by_statement = defaultdict(dict)
+    for key, (chain, edit) in guards.items():
+        by_statement[chain[depth]][key] = chain, edit
+
+    pieces = []
+    position = start
+    for statement in sorted(by_statement, key=lambda statement: statement.start_pos):
+        statement_guards = by_statement[statement]
+        region_start, region_end = _region(statement, line_offsets)
+
+        inner = {key: guard for key, guard in statement_guards.items() if len(guard[0]) > depth + 1}
+        rendered = _render(source, line_offsets, region_start, region_end, depth + 1, inner)
+
+        direct = {key: edit for key, (chain, edit) in statement_guards.items() if len(chain) == depth + 1}
+        if direct:
+            rendered = _guard(source, line_offsets, statement, direct, rendered)
+
+        pieces.append(source[position:region_start])
+        pieces.append(rendered)
+        position = region_end
+
+    pieces.append(source[position:end])
+    return "".join(pieces)
+
+
+def _guard(source, line_offsets, statement, mutants, otherwise):
+    """Render a statement as an if-statement that selects between its mutants and `otherwise`.
+
+    Args:
+        mutants: A mapping from mutant keys to the edits which make them.
+        otherwise: The code for the statement when none of `mutants` is active.
+    """
+    region_start, region_end = _region(statement, line_offsets)
+    indent = source[line_offsets.offset((statement.start_pos[0], 0)) : line_offsets.offset(statement.start_pos)]
+    region = source[region_start:region_end]
+    unit = "\t" if any(line[:1] == "\t" for line in split_lines(region)) else "    "
+
+    branches = []
+    for key, edit in mutants.items():
+        keyword = "elif" if branches else "if"
+        mutant = source[region_start : edit.start] + edit.replacement + source[edit.end : region_end]
+        branches.append(f"{indent}{keyword} {SWITCH_NAME} == {key!r}:\n{_indent_block(mutant, indent, unit)}")
+    branches.append(f"{indent}else:\n{_indent_block(otherwise, indent, unit)}")
+    return "".join(branches)
+
+
+def _indent_block(code, indent, unit):
+    """Indent `code` by `unit`, so that it can be the body of a compound statement at `indent`.
+
+    Lines inside multi-line strings are left alone, since indenting them would change the strings. If `code` has no
+    statements (e.g. because a mutation removed them), the block is a `pass` statement.
+    """
+    if not code.endswith("\n"):
+        code += "\n"
+
+    string_lines = set()
+    has_statements = False
+    leaf = parso.parse(code).get_first_leaf()
+    while leaf is not None:
+        if leaf.type not in ("newline", "endmarker") and leaf.value.strip():
+            has_statements = True
+        if leaf.type in ("string", "fstring_string") and leaf.end_pos[0] > leaf.start_pos[0]:
+            string_lines.update(range(leaf.start_pos[0] + 1, leaf.end_pos[0] + 1))
+        leaf = leaf.get_next_leaf()
+
+    if not has_statements:
+        return f"{code}{indent}{unit}pass\n"
+
+    return "".join(
+        line if (line_number in string_lines or not line.strip()) else unit + line
+        for line_number, line in enumerate(split_lines(code, keepends=True), start=1)
+    )
@@ -3,13 +3,126 @@
 import logging
 import os
 import shlex
+import signal
 import subprocess
+import sys
+import threading
 import traceback
 
+from cosmic_ray import bytecode, daemon
+from cosmic_ray.limits import DEFAULT_MAX_OUTPUT, EXEC_FAILED, BoundedOutput, ResourceLimits
 from cosmic_ray.work_item import TestOutcome
 
 log = logging.getLogger(__name__)
 
+# The resource limits for each test run.
+_resource_limits = ResourceLimits()
+
+
+def use_resource_limits(limits: ResourceLimits):
+    "Set the resource limits that `run_tests` applies to each test run."
+    global _resource_limits  # pylint: disable=global-statement
+    _resource_limits = limits
+
+
+def resource_limits() -> ResourceLimits:
+    "The resource limits that `run_tests` applies to each test run."
+    return _resource_limits
+
+
+# The maximum number of bytes of output to keep for each test run.
+_max_output = DEFAULT_MAX_OUTPUT
+
+
+def use_max_output(max_size):
+    "Set the maximum number of bytes of output (see `cosmic_ray.limits.BoundedOutput`) that `run_tests` keeps."
+    global _max_output  # pylint: disable=global-statement
+    _max_output = max_size
+
+
+def max_output():
+    "The maximum number of bytes of output that `run_tests` keeps for each test run."
+    return _max_output
+
+
+# The test daemons to use, by test command and working directory, or `None` if test daemons aren't enabled.
+_test_daemons = None
+
+
+def use_test_daemon(enabled=True):
+    """Set whether `run_tests` should use a test daemon (see `cosmic_ray.daemon`) for the test commands it can.
+
+    Disabling the test daemon stops any daemons which are running.
+    """
+    global _test_daemons  # pylint: disable=global-statement
+    if enabled:
+        if _test_daemons is None:
+            _test_daemons = {}
+        return
+
+    for test_daemon in (_test_daemons or {}).values():
+        if test_daemon is not None:
+            test_daemon.stop()
+    _test_daemons = None
+
+
+def _test_daemon(command, cwd=None):
+    "The test daemon for running `command` in `cwd`, or `None` if we shouldn't use one."
+    if _test_daemons is None or not hasattr(os, "fork"):
+        return None
+
+    key = (command, cwd)
+    if key not in _test_daemons:
+        framework = daemon.parse_test_command(command)
+        env = command_environment()
+        if framework is None:
+            log.info("Not using a test daemon for test command: %s", command)
+        elif not daemon.runs_in_this_interpreter(command, cwd, env):
+            log.info(
+                "Not using a test daemon for test command %s: it doesn't run the tests with Cosmic Ray's Python (%s)",
+                command,
+                sys.executable,
+            )
+            framework = None
+        _test_daemons[key] = None if framework is None else daemon.TestDaemon(*framework, env=env, cwd=cwd)
+
+    return _test_daemons[key]
+
+
+class Cancellation:
+    """A way to stop a test run (see `run_tests`) from another thread, e.g. because another run has made it redundant.
+
+    Test runs which use a test daemon can't be cancelled, and run to completion.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._proc = None
+
+    @property
+    def cancelled(self):
+        "Whether `cancel` has been called."
+        return self._cancelled
+
+    def cancel(self):
+        "Kill the test run, or stop it from starting."
+        with self._lock:
+            self._cancelled = True
+            if self._proc is not None:
+                _kill_session(self._proc)
+
+    def _attach(self, proc):
+        "Attach a test run, returning False if it's already been cancelled."
+        with self._lock:
+            self._proc = proc
+            return not self._cancelled
+
+    def _detach(self):
+        with self._lock:
+            self._proc = None
+
+
 # We use an asyncio-subprocess-based approach here instead of a simple
 # subprocess.run()-based approach because there are problems with timeouts and
 # reading from stderr in subprocess.run. Since we have to be prepared for test
@@ -18,40 +131,158 @@ log = logging.getLogger(__name__)
 # work on all platforms.
 
 
-def run_tests(command, timeout):
+def run_tests(command, timeout, env=None, cwd=None, cancellation=None, limits=None, max_output=None, mutant=None):
     """Run test command in a subprocess.
 
     If the command exits with status 0, then we assume that all tests passed. If
     it exits with any other code, we assume a test failed. If the call to launch
     the subprocess throws an exception, we consider the test 'incompetent'.
 
-    Tests which time out are considered 'killed' as well.
+    The output of the command (stdout and stderr, merged) is streamed into a `BoundedOutput`, so only its start and
+    end are kept for chatty test suites.
+
+    Tests which time out are considered 'killed' as well. The command is run in its own session, and on timeout the
+    whole session (including any processes the tests started) is killed. Any resource limits are applied to the
+    command, and tests which exceed them are considered 'killed'.
 
     Args:
         command (str): The command to execute.
         timeout (number): The maximum number of seconds to allow the tests to run.
+        env (dict[str, str]|None): Additional environment variables for the command.
+        cwd (Path|None): The directory in which to run the command. By default, the current directory.
+        cancellation (Cancellation|None): A `Cancellation` with which the test run can be stopped. Cancelled runs
+            are considered 'incompetent'.
+        limits (ResourceLimits|None): The resource limits for the test run. By default, those set with
+            `use_resource_limits`.
+        max_output (int|None): The maximum number of bytes of output to keep. By default, the number set with
+            `use_max_output`.
+        mutant (str|None): The key of the mutant to activate in mutant schemata (see `cosmic_ray.schemata`), if any.
 
     Return: A tuple `(TestOutcome, output)` where the `output` is a string
         containing the output of the command.
     """
     log.info("Running test (timeout=%s): %s", timeout, command)
+    limits = _resource_limits if limits is None else limits
+    max_output = _max_output if max_output is None else max_output
 
-    # We want to avoid writing pyc files in case our changes happen too fast for Python to
-    # notice them. If the timestamps between two changes are too small, Python won't recompile
-    # the source.
-    env = dict(os.environ)
-    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    test_daemon = _test_daemon(command, cwd)
+    if test_daemon is not None:
+        return _run_with_daemon(test_daemon, timeout, env, limits, max_output, mutant)
+
+    command_env = command_environment()
+    command_env.update(env or {})
+    if mutant is not None:
+        command_env[daemon.ACTIVE_MUTANT_VAR] = mutant
+
+    args = shlex.split(command)
+    limited_args = limits.command(args)
+
+    try:
+        # pylint: disable=consider-using-with
+        proc = subprocess.Popen(
+            limited_args,
+            cwd=cwd,
+            env=command_env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    except Exception:  # pylint: disable=W0703
+        return (TestOutcome.INCOMPETENT, traceback.format_exc())
+
+    output = BoundedOutput(max_output)
+    reader = threading.Thread(target=_read_output, args=(proc.stdout, output), daemon=True)
+    reader.start()
+    with proc:
+        try:
+            if cancellation is not None and not cancellation._attach(proc):  # pylint: disable=protected-access
+                return (TestOutcome.INCOMPETENT, "cancelled")
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return (TestOutcome.KILLED, "timeout")
+        finally:
+            # Don't leave behind any processes that the tests started. This also closes their end of the output pipe.
+            _kill_session(proc)
+            proc.wait()
+            reader.join()
+            if cancellation is not None:
+                cancellation._detach()  # pylint: disable=protected-access
+
+    if cancellation is not None and cancellation.cancelled:
+        return (TestOutcome.INCOMPETENT, "cancelled")
+    if proc.returncode == 0:
+        return (TestOutcome.SURVIVED, output.getvalue())
+    if limited_args != args and proc.returncode == EXEC_FAILED:
+        # The wrapper which applies the limits couldn't start the command.
+        return (TestOutcome.INCOMPETENT, output.getvalue())
+    return (TestOutcome.KILLED, _note_exceeded_limit(limits, proc.returncode, output.getvalue()))
+
+
+def _read_output(stream, output):
+    "Read `stream` into `output` until it's closed."
+    for chunk in iter(lambda: stream.read1(65536), b""):
+        output.write(chunk)
+
+
+def _kill_session(proc):
+    "Kill all of the processes in the session led by `proc`."
+    if not hasattr(os, "killpg"):
+        proc.kill()
+        return
 
     try:
-        proc = subprocess.run(shlex.split(command), check=True, env=env, timeout=timeout, capture_output=True)
-        assert proc.returncode == 0
-        return (TestOutcome.SURVIVED, proc.stdout.decode("utf-8"))
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        # The session is already empty.
+        pass
+
+
+def _note_exceeded_limit(limits, returncode, output, cpu_time=None):
+    "Add a note to the output of a failed test run if it exceeded one of `limits`."
+    limit = limits.exceeded(returncode, output, cpu_time)
+    if limit is None:
+        return output
+    return f"Exceeded resource limit: {limit}\n\n{output}"
+
+
+def command_environment():
+    "The environment variables for running tests."
+    env = dict(os.environ)
+    cache_dir = bytecode.bytecode_cache()
+    if cache_dir is None:
+        # We want to avoid writing pyc files in case our changes happen too fast for Python to
+        # notice them. If the timestamps between two changes are too small, Python won't recompile
+        # the source.
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+    else:
+        # The bytecode cache is kept up to date as modules are mutated.
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        env["PYTHONPYCACHEPREFIX"] = str(cache_dir)
+    return env
 
-    except subprocess.CalledProcessError as err:
-        return (TestOutcome.KILLED, err.output.decode("utf-8"))
 
+def _run_with_daemon(test_daemon, timeout, env, limits, max_output, mutant):
+    try:
+        response = test_daemon.run(timeout, env, limits, max_output, mutant=mutant)
     except subprocess.TimeoutExpired:
         return (TestOutcome.KILLED, "timeout")
-
     except Exception:  # pylint: disable=W0703
         return (TestOutcome.INCOMPETENT, traceback.format_exc())
+
+    if response["returncode"] == 0:
+        return (TestOutcome.SURVIVED, response["output"])
+    if limits and response["returncode"] == EXEC_FAILED:
+        # The limits couldn't be applied.
+        return (TestOutcome.INCOMPETENT, response["output"])
+    output = _note_failed_tests(response.get("failed", []), response["output"])
+    return (
+        TestOutcome.KILLED,
+        _note_exceeded_limit(limits, response["returncode"], output, response.get("cpu_time")),
+    )
+
+
+def _note_failed_tests(failed, output):
+    "Add the IDs of the tests which failed, as reported by a test daemon, to the output of a test run."
+    if not failed:
+        return output
+    return "Failed tests:\n" + "".join(f"    {test_id}\n" for test_id in failed) + "\n" + output
@@ -6,7 +6,7 @@ from itertools import chain
 import click
 from yattag import Doc
 
-from cosmic_ray.tools.survival_rate import kills_count, survival_rate
+from cosmic_ray.tools.survival_rate import equivalents_count, kills_count, survival_rate
 from cosmic_ray.work_db import WorkDB, use_db
 from cosmic_ray.work_item import TestOutcome
 
@@ -171,7 +171,7 @@ def _generate_job_list(doc, db, skip_success, hide_skipped):
 # flake8: noqa: C901
 def _generate_work_item_card(doc, index, work_item, result, skip_success, hide_skipped):
     doc, tag, text = doc.tagtext()
-    if hide_skipped and result is not None and result.worker_outcome == "skipped":
+    if hide_skipped and result is not None and result.worker_outcome in ("skipped", "equivalent"):
         return
 
     if result is not None:
@@ -301,7 +301,8 @@ def _generate_summary(doc, db):
                             text(f"Complete: {num_complete} ({num_complete / num_items * 100:.2f}%)")
                         with tag("p"):
                             num_killed = kills_count(db)
-                            text(f"Surviving mutants: {num_complete - num_killed} ({survival_rate(db):.2f}%)")
+                            num_surviving = num_complete - equivalents_count(db) - num_killed
+                            text(f"Surviving mutants: {num_surviving} ({survival_rate(db):.2f}%)")
                     else:
                         with tag("p"):
                             text("No jobs completed")
@@ -4,12 +4,18 @@ This reads the 'distributor.http.worker-urls' field of a config to see where wor
 running. For each worker, it makes a clone of the git repository that's going to be tested, optionally changing to a
 directory under the root of the clone before starting the worker. It then starts the workers with the correct options to
 provide the configured URLs.
+
+With --count, it instead starts that many workers on free ports on localhost, prints their URLs, and (with
+--write-config) writes a copy of the config with those URLs.
 """
 
 import asyncio
 import contextlib
 import logging
+import os
 import shutil
+import signal
+import socket
 import tempfile
 from pathlib import Path
 
@@ -22,7 +28,7 @@ import cosmic_ray.config
 log = logging.getLogger()
 
 
-async def run(config_file, repo_url, location):
+async def run(config_file, repo_url, location, count=None, pin_cpus=False, write_config=None):
     """Start the configured workers in their own git clones.
 
     Args:
@@ -30,46 +36,110 @@ async def run(config_file, repo_url, location):
         repo_url: The git repository to clone for each worker.
         location: The relative path into the cloned repository to use as the cwd for
             each worker.
+        count: The number of workers to start on free ports. By default, the workers for the URLs in the config are
+            started.
+        pin_cpus: Whether to pin each worker (and so its test runs) to a single CPU.
+        write_config: A path to which to write a copy of the config with the URLs of the workers.
     """
     config = cosmic_ray.config.load_config(config_file)
-    worker_urls = config.sub("distributor", "http").get("worker-urls", ())
 
-    worker_args = tuple(_urls_to_args(worker_urls, Path(config_file).resolve()))
+    if count is None:
+        worker_urls = config.sub("distributor", "http").get("worker-urls", ())
+        worker_args = tuple(_urls_to_args(worker_urls, Path(config_file).resolve()))
+    else:
+        ports = _free_ports(count)
+        worker_urls = [f"http://localhost:{port}" for port in ports]
+        worker_args = tuple(("--port", port) for port in ports)
+        for url in worker_urls:
+            print(url, flush=True)
+
     if not worker_args:
         log.warning("No valid worker URLs found in config %s", config_file)
 
-    with contextlib.ExitStack() as stack:
-        procs = [
-            await asyncio.create_subprocess_shell(
-                f"cosmic-ray --verbosity INFO http-worker {option} {value}",
-                cwd=stack.enter_context(_create_clone(repo_url)) / location,
+    if write_config is not None:
+        config.setdefault("distributor", cosmic_ray.config.ConfigDict()).setdefault(
+            "http", cosmic_ray.config.ConfigDict()
+        )["worker-urls"] = list(worker_urls)
+        Path(write_config).write_text(cosmic_ray.config.serialize_config(config), encoding="utf-8")
+
+    cpus = _available_cpus() if pin_cpus else None
+
+    async with _create_clones(repo_url, len(worker_args)) as clone_dirs:
+        procs = []
+        for index, ((option, value), clone_dir) in enumerate(zip(worker_args, clone_dirs)):
+            proc = await asyncio.create_subprocess_exec(
+                "cosmic-ray",
+                "--verbosity",
+                "INFO",
+                "http-worker",
+                option,
+                str(value),
+                cwd=clone_dir / location,
             )
-            for option, value in worker_args
-        ]
+            if cpus:
+                cpu = cpus[index % len(cpus)]
+                log.info("Pinning worker %s to CPU %s", proc.pid, cpu)
+                os.sched_setaffinity(proc.pid, {cpu})
+            procs.append(proc)
 
-        await asyncio.gather(*[proc.communicate() for proc in procs])
+        try:
+            await asyncio.gather(*[proc.communicate() for proc in procs])
+        finally:
+            for proc in procs:
+                if proc.returncode is None:
+                    proc.terminate()
+                    await proc.wait()
 
 
 @click.command(help=__doc__)
 @click.argument("config_file", type=click.Path(exists=True, dir_okay=False, readable=True))
 @click.argument("repo_url")
 @click.option("--location", default="", help="The relative path under a repo clone at which to run the worker")
-def main(config_file, repo_url, location):
+@click.option(
+    "--count",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Start this many workers on free ports, rather than the workers for the URLs in the config",
+)
+@click.option("--pin-cpus", is_flag=True, default=False, help="Pin each worker to its own CPU (Linux only)")
+@click.option(
+    "--write-config",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="Write a copy of the config, with the URLs of the workers, to this file",
+)
+def main(config_file, repo_url, location, count, pin_cpus, write_config):
     logging.basicConfig(level=logging.INFO)
-    asyncio.get_event_loop().run_until_complete(run(config_file, repo_url, location))
+    if pin_cpus and not hasattr(os, "sched_setaffinity"):
+        raise click.UsageError("--pin-cpus isn't supported on this platform")
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(run(config_file, repo_url, location, count, pin_cpus, write_config))
+    # Stop the workers and clean up their clones when we're interrupted or terminated.
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(signum, task.cancel)
+    try:
+        loop.run_until_complete(task)
+    except asyncio.CancelledError:
+        log.info("Workers stopped")
+    finally:
+        loop.close()
 
 
-@contextlib.contextmanager
-def _create_clone(source_repo_url):
-    """Clone a git repository into a temporary directory.
+@contextlib.asynccontextmanager
+async def _create_clones(source_repo_url, count):
+    """Clone a git repository into `count` directories under a temporary directory.
 
-    This is a context-manager that yields the directory used for the clone::
+    This is an async context-manager that yields the list of directories used for the clones::
 
-        with _create_clone('http://github.com/sixty-north/cosmic-ray') as clone_dir:
+        async with _create_clones('http://github.com/sixty-north/cosmic-ray', 4) as clone_dirs:
             . . .
 
-    This attempts to clean up the clone directory after the context ends. NB: that there are
-    known problems with this on Windows, so it's possible that the directory will not be
+    The repository is fetched once, into a local cache. The clones are then made concurrently as worktrees of the
+    cache, sharing its objects, so they're quick to make and take up little space.
+
+    This attempts to clean up the clone directories after the context ends. NB: that there are
+    known problems with this on Windows, so it's possible that the directories will not be
     removed.
     """
     # Normally I'd use the context manager tempfile.TemporaryDirectory, but that has problems
@@ -78,15 +148,24 @@ def _create_clone(source_repo_url):
     root = tempfile.mkdtemp()
 
     try:
-        destination_dir = Path(root)
         url = yarl.URL(source_repo_url)
         if url.scheme == "":
             url = yarl.URL.build(scheme="file", path=str(Path(url.path).resolve()))
 
-        log.info("Cloning %s to %s", url, destination_dir)
-        git.Repo.clone_from(str(url), destination_dir, depth=1)
+        cache_dir = Path(root) / "cache"
+        log.info("Cloning %s to %s", url, cache_dir)
+        await asyncio.get_running_loop().run_in_executor(
+            None, lambda: git.Repo.clone_from(str(url), cache_dir, depth=1, bare=True)
+        )
 
-        yield destination_dir
+        clone_dirs = [Path(root) / f"worker-{index}" for index in range(count)]
+        # Adding worktrees isn't safe to do concurrently, but it's cheap without a checkout. The checkouts, which do the
+        # real work, are independent.
+        for clone_dir in clone_dirs:
+            await _git("-C", cache_dir, "worktree", "add", "--quiet", "--detach", "--no-checkout", clone_dir, "HEAD")
+        await asyncio.gather(*(_git("-C", clone_dir, "reset", "--quiet", "--hard") for clone_dir in clone_dirs))
+
+        yield clone_dirs
     finally:
         try:
             shutil.rmtree(root)
@@ -94,6 +173,30 @@ def _create_clone(source_repo_url):
             log.warning(f"Unable to remove directory: {root}")
 
 
+async def _git(*args):
+    "Run a git command."
+    command = ["git", *map(str, args)]
+    log.info("Running %s", command)
+    proc = await asyncio.create_subprocess_exec(*command, stderr=asyncio.subprocess.PIPE)
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise git.GitCommandError(command, proc.returncode, stderr)
+
+
+def _free_ports(count):
+    "Find `count` free TCP ports on localhost."
+    with contextlib.ExitStack() as stack:
+        sockets = [stack.enter_context(socket.socket()) for _ in range(count)]
+        for sock in sockets:
+            sock.bind(("localhost", 0))
+        return [sock.getsockname()[1] for sock in sockets]
+
+
+def _available_cpus():
+    "The CPUs that this process may run on."
+    return sorted(os.sched_getaffinity(0))
+
+
 LOCALHOST_ADDRESSES = (
     "localhost",
     "0.0.0.0",
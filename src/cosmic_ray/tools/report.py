@@ -2,7 +2,7 @@
 
 import click
 
-from cosmic_ray.tools.survival_rate import kills_count, survival_rate
+from cosmic_ray.tools.survival_rate import equivalents_count, kills_count, survival_rate
 from cosmic_ray.work_db import WorkDB, use_db
 
 
@@ -50,7 +50,10 @@ def report(show_output, show_diff, show_pending, surviving_only, session_file):
         if num_complete > 0:
             print(f"complete: {num_complete} ({num_complete / num_items * 100:.2f}%)")
             num_killed = kills_count(db)
-            print(f"surviving mutants: {num_complete - num_killed} ({survival_rate(db):.2f}%)")
+            num_equivalent = equivalents_count(db)
+            if num_equivalent:
+                print(f"equivalent mutants: {num_equivalent}")
+            print(f"surviving mutants: {num_complete - num_equivalent - num_killed} ({survival_rate(db):.2f}%)")
         else:
             print("no jobs completed")
 
@@ -6,6 +6,7 @@ import sys
 import click
 
 from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.work_item import WorkerOutcome
 
 SUPPORTED_Z_SCORES = {800: 1.282, 900: 1.645, 950: 1.960, 980: 2.326, 990: 2.576, 995: 2.807, 998: 3.080, 999: 3.291}
 
@@ -30,24 +31,16 @@ SUPPORTED_Z_SCORES = {800: 1.282, 900: 1.645, 950: 1.960, 980: 2.326, 990: 2.576
 @click.argument("session-file", type=click.Path(dir_okay=False, readable=True, exists=True))
 def format_survival_rate(estimate, confidence, fail_over, session_file):
     """Calculate the survival rate of a session."""
-    confidence = float(confidence)
-    try:
-        z_score = SUPPORTED_Z_SCORES[int(float(confidence) * 10)]
-    except KeyError:
-        raise ValueError(f"Unsupported confidence interval: {confidence}")
+    z_score = confidence_z_score(confidence)
 
     with use_db(session_file, WorkDB.Mode.open) as db:
         rate = survival_rate(db)
-        num_items = db.num_work_items
-        num_complete = db.num_results
+        num_equivalent = equivalents_count(db)
+        num_items = db.num_work_items - num_equivalent
+        num_complete = db.num_results - num_equivalent
 
     if estimate:
-        if not num_complete:
-            conf_int = 0
-        else:
-            conf_int = (
-                math.sqrt(rate * (100 - rate) / num_complete) * z_score * (1 - math.sqrt(num_complete / num_items))
-            )
+        conf_int = confidence_interval(rate, num_complete, num_items, z_score)
         min_rate = rate - conf_int
         print(f"{min_rate:.2f} {rate:.2f} {rate + conf_int:.2f}")
 
@@ -59,15 +52,85 @@ def format_survival_rate(estimate, confidence, fail_over, session_file):
         sys.exit(1)
 
 
+def confidence_z_score(confidence):
+    """The z-score for a confidence level.
+
+    Args:
+        confidence: The confidence level as a percentage. This must be one of the levels in `SUPPORTED_Z_SCORES`.
+
+    Raises:
+        ValueError: If the confidence level isn't supported.
+    """
+    try:
+        return SUPPORTED_Z_SCORES[int(float(confidence) * 10)]
+    except KeyError:
+        raise ValueError(f"Unsupported confidence interval: {confidence}")
+
+
+def confidence_interval(rate, num_complete, num_items, z_score):
+    """The half-width of the confidence interval for a survival rate.
+
+    Args:
+        rate: The survival rate (percentage) of the completed work items.
+        num_complete: The number of completed work items.
+        num_items: The total number of work items.
+        z_score: The z-score for the confidence level.
+
+    Returns: The half-width of the interval, in percentage points.
+    """
+    if not num_complete:
+        return 0
+    return math.sqrt(rate * (100 - rate) / num_complete) * z_score * (1 - math.sqrt(num_complete / num_items))
+
+
+def wilson_interval(rate, num_complete, num_items, z_score):
+    """The Wilson score interval for a survival rate.
+
+    Unlike the interval from `confidence_interval`, this doesn't collapse to nothing when all of the completed work
+    items were killed or all of them survived, so it's safe to base decisions about stopping early on it.
+
+    Args:
+        rate: The survival rate (percentage) of the completed work items.
+        num_complete: The number of completed work items.
+        num_items: The total number of work items.
+        z_score: The z-score for the confidence level.
+
+    Returns: A `(lower, upper)` tuple of the bounds of the interval, as percentages.
+    """
+    if not num_complete:
+        return (0.0, 100.0)
+
+    p = rate / 100
+    z2 = z_score * z_score
+    denominator = 1 + z2 / num_complete
+    center = (p + z2 / (2 * num_complete)) / denominator
+    half_width = z_score * math.sqrt(p * (1 - p) / num_complete + z2 / (4 * num_complete * num_complete)) / denominator
+
+    # The finite population correction: once every work item is complete, the rate is known exactly.
+    if num_items > 1:
+        half_width *= math.sqrt(max(num_items - num_complete, 0) / (num_items - 1))
+        center = p + (center - p) * math.sqrt(max(num_items - num_complete, 0) / (num_items - 1))
+
+    return (max(center - half_width, 0.0) * 100, min(center + half_width, 1.0) * 100)
+
+
 def kills_count(work_db):
     """Return the number of killed mutants."""
-    return sum(r.is_killed for _, r in work_db.results)
+    return sum(r.is_killed for _, r in work_db.results if r.worker_outcome != WorkerOutcome.EQUIVALENT)
+
+
+def equivalents_count(work_db):
+    """Return the number of mutants which are equivalent to the unmutated code.
+
+    No test can kill these, so they're left out of the survival rate.
+    """
+    return sum(r.worker_outcome == WorkerOutcome.EQUIVALENT for _, r in work_db.results)
 
 
 def survival_rate(work_db):
-    """Calculate the survival rate for the results in a WorkDB."""
+    """Calculate the survival rate for the results in a WorkDB, leaving out equivalent mutants."""
     kills = kills_count(work_db)
-    num_results = work_db.num_results
+    num_results = work_db.num_results - equivalents_count(work_db)
 
     if not num_results:
         return 0
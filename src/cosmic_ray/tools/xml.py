@@ -29,7 +29,7 @@ def _create_xml_report(db):
             errors += 1
         if result.is_killed:
             failed += 1
-        if result.worker_outcome == WorkerOutcome.SKIPPED:
+        if result.worker_outcome in {WorkerOutcome.SKIPPED, WorkerOutcome.EQUIVALENT}:
             skipped += 1
 
         subelement = _create_element_from_work_item(work_item)
@@ -2,6 +2,8 @@ import tokenize
 from contextlib import contextmanager
 from pathlib import Path
 
+from cosmic_ray import bytecode
+
 
 def read_python_source(module_filepath):
     """Load the code in a Python source file.
@@ -23,6 +25,9 @@ def read_python_source(module_filepath):
 def restore_contents(filepath: Path):
     """Restore the original contents of a file after a context-manager.
 
+    The file is expected to be changed in the with-block, so any cached bytecode for it is discarded (see
+    `cosmic_ray.bytecode`) on entry, and again once the original contents are restored.
+
     Args:
         filepath (Path): Path to the file.
 
@@ -30,7 +35,9 @@ def restore_contents(filepath: Path):
         bytes: The original contents of the file.
     """
     contents = filepath.read_bytes()
+    bytecode.invalidate(filepath)
     try:
         yield contents
     finally:
         filepath.write_bytes(contents)
+        bytecode.invalidate(filepath)
@@ -2,13 +2,37 @@
 
 import contextlib
 import json
+import os
+import socket
+import time
+import uuid
 from pathlib import Path
 
-from sqlalchemy import JSON, Column, Enum, ForeignKey, Integer, String, Text, create_engine, event, func
+from attrs import define, field
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Column,
+    Enum,
+    Float,
+    ForeignKey,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+    create_engine,
+    event,
+    func,
+    insert,
+    inspect,
+    literal,
+    select,
+)
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy.orm.session import sessionmaker
 
+from .bundle import Bundle
 from .work_item import MutationSpec, TestOutcome, WorkItem, WorkResult, WorkerOutcome
 
 
@@ -50,6 +74,7 @@ class WorkDB:
 
         event.listen(self._engine, "connect", enable_foreign_keys)
         Base.metadata.create_all(self._engine)
+        _add_missing_columns(self._engine)
         self._session_maker = sessionmaker(self._engine)
 
     def close(self):
@@ -103,6 +128,7 @@ class WorkDB:
         This removes any associated results as well.
         """
         with self._session_maker.begin() as session:
+            session.query(LeaseStorage).delete()
             session.query(WorkResultStorage).delete()
             session.query(MutationSpecStorage).delete()
             session.query(WorkItemStorage).delete()
@@ -159,6 +185,34 @@ class WorkDB:
         except IntegrityError:
             raise KeyError(f"Unable to add results for job-id {job_id}. No matching WorkItem.")
 
+    @property
+    def bundle(self):
+        "The `cosmic_ray.bundle.Bundle` of project files stored with the session, or `None` if there isn't one."
+        with self._session_maker.begin() as session:
+            stored_files = session.query(BundleFileStorage).all()
+            if not stored_files:
+                return None
+            files = {file.path: file.digest for file in stored_files}
+            executable = {file.path for file in stored_files if file.executable}
+            blobs = {blob.digest: blob.data for blob in session.query(BundleBlobStorage)}
+            return Bundle(files, blobs, executable)
+
+    def set_bundle(self, bundle):
+        """Store a bundle of project files with the session, replacing any existing bundle.
+
+        Args:
+            bundle: A `cosmic_ray.bundle.Bundle`, or `None` to remove the existing bundle.
+        """
+        with self._session_maker.begin() as session:
+            session.query(BundleFileStorage).delete()
+            session.query(BundleBlobStorage).delete()
+            if bundle is not None:
+                session.add_all(BundleBlobStorage(digest=digest, data=data) for digest, data in bundle.blobs.items())
+                session.add_all(
+                    BundleFileStorage(path=path, digest=digest, executable=path in bundle.executable)
+                    for path, digest in bundle.files.items()
+                )
+
     @property
     def pending_work_items(self):
         "Iterable of all pending work items. In random order."
@@ -171,6 +225,115 @@ class WorkDB:
             )
             return tuple(_work_item_from_storage(work_item) for work_item in pending)
 
+    def claim_work_items(self, lease):
+        """Claim a batch of pending work items which no one else holds a lease on.
+
+        This is atomic, so several processes can claim work from the same session at once without getting the same
+        work items. Work items whose leases have expired can be claimed again.
+
+        Args:
+            lease: The `Lease` describing the holder, the size of the batch and how long to hold it for.
+
+        Returns: A tuple of the claimed work items, in random order. It's empty if there's no pending work left to claim.
+        """
+        now = time.time()
+        claim = uuid.uuid4().hex
+        with self._session_maker.begin() as session:
+            completed_job_ids = select(WorkResultStorage.job_id)
+            leased_job_ids = select(LeaseStorage.job_id).where(LeaseStorage.expires > now)
+            claimable = (
+                select(WorkItemStorage.job_id, literal(lease.holder), literal(claim), literal(now + lease.duration))
+                .where(~WorkItemStorage.job_id.in_(completed_job_ids), ~WorkItemStorage.job_id.in_(leased_job_ids))
+                .order_by(func.random())
+                .limit(lease.batch_size)
+            )
+            session.execute(
+                insert(LeaseStorage)
+                .prefix_with("OR REPLACE")
+                .from_select(["job_id", "holder", "claim", "expires"], claimable)
+            )
+            claimed = session.query(WorkItemStorage).join(LeaseStorage).where(LeaseStorage.claim == claim)
+            return tuple(_work_item_from_storage(work_item) for work_item in claimed)
+
+    def renew_leases(self, lease):
+        "Extend all of the leases held by `lease.holder` to `lease.duration` seconds from now."
+        with self._session_maker.begin() as session:
+            session.query(LeaseStorage).where(LeaseStorage.holder == lease.holder).update(
+                {LeaseStorage.expires: time.time() + lease.duration}
+            )
+
+    def release_leases(self, lease):
+        "Give up all of the leases held by `lease.holder`, so that others can claim the work items straight away."
+        with self._session_maker.begin() as session:
+            session.query(LeaseStorage).where(LeaseStorage.holder == lease.holder).delete()
+
+    def set_leased_result(self, lease, job_id, result):
+        """Set the result for a job, if `lease.holder` holds the lease on it.
+
+        The lease is released. A lease which has expired still counts, as long as no one else has claimed the job.
+
+        Returns: Whether the result was set.
+        """
+        with self._session_maker.begin() as session:
+            released = (
+                session.query(LeaseStorage)
+                .where(LeaseStorage.job_id == job_id, LeaseStorage.holder == lease.holder)
+                .delete()
+            )
+            if not released:
+                return False
+            session.merge(_work_result_to_storage(result, job_id))
+            return True
+
+    def merge_results(self, path):
+        """Add the results from another session, such as one made by `cosmic_ray.commands.shard`.
+
+        This is done in bulk in the database, so it's fast even for very large sessions. Results which are already
+        in this session are left alone, as long as they have the same outcomes.
+
+        Args:
+            path: The path of the other session's file. It should have been opened with `WorkDB` (e.g. to run it), so
+                that its tables are up to date.
+
+        Returns: The number of results added.
+
+        Raises:
+            ConflictingResultsError: The other session has results for jobs which aren't in this session, or whose
+                outcomes are different from those of the results in this session. Nothing is added.
+        """
+        columns = ", ".join(column.name for column in WorkResultStorage.__table__.columns)
+        with self._engine.connect() as connection:
+            # ATTACH can't be done in a transaction, so this uses the DB-API connection, which only starts one when it
+            # needs to.
+            dbapi_connection = connection.connection.driver_connection
+            dbapi_connection.execute("ATTACH DATABASE ? AS other", (str(path),))
+            try:
+                unknown = _job_ids(
+                    dbapi_connection,
+                    "SELECT job_id FROM other.work_results WHERE job_id NOT IN (SELECT job_id FROM main.work_items)",
+                )
+                conflicting = _job_ids(
+                    dbapi_connection,
+                    "SELECT other.work_results.job_id FROM other.work_results"
+                    " JOIN main.work_results ON main.work_results.job_id = other.work_results.job_id"
+                    " WHERE other.work_results.worker_outcome IS NOT main.work_results.worker_outcome"
+                    " OR other.work_results.test_outcome IS NOT main.work_results.test_outcome",
+                )
+                if unknown or conflicting:
+                    raise ConflictingResultsError(path, unknown, conflicting)
+
+                with dbapi_connection:
+                    cursor = dbapi_connection.execute(
+                        f"INSERT INTO main.work_results ({columns}) SELECT {columns} FROM other.work_results"
+                        " WHERE job_id NOT IN (SELECT job_id FROM main.work_results)"
+                    )
+                    dbapi_connection.execute(
+                        "DELETE FROM main.leases WHERE job_id IN (SELECT job_id FROM other.work_results)"
+                    )
+                return cursor.rowcount
+            finally:
+                dbapi_connection.execute("DETACH DATABASE other")
+
     @property
     def completed_work_items(self):
         "Iterable of ``(work-item, result)``\\s for all completed items."
@@ -183,6 +346,43 @@ class WorkDB:
             )
 
 
+class ConflictingResultsError(ValueError):
+    """Results from another session can't be merged into a session (see `WorkDB.merge_results`).
+
+    Attributes:
+        path: The path of the other session.
+        unknown_job_ids: The IDs of jobs with results in the other session which aren't in the session.
+        conflicting_job_ids: The IDs of jobs whose results in the two sessions have different outcomes.
+    """
+
+    def __init__(self, path, unknown_job_ids, conflicting_job_ids):
+        problems = []
+        if unknown_job_ids:
+            problems.append(f"{len(unknown_job_ids)} results for unknown jobs")
+        if conflicting_job_ids:
+            problems.append(f"{len(conflicting_job_ids)} results which conflict with existing results")
+        super().__init__(f"Unable to merge results from {path}: {' and '.join(problems)}")
+        self.path = path
+        self.unknown_job_ids = unknown_job_ids
+        self.conflicting_job_ids = conflicting_job_ids
+
+
+@define(frozen=True)
+class Lease:
+    """How a process claims work from a session which it shares with others (see `WorkDB.claim_work_items`).
+
+    Attributes:
+        holder: An identifier for the process holding the leases. By default, this is made from the host name, the
+            process ID and a random string.
+        batch_size: The number of work items to claim at once.
+        duration: The number of seconds after which a lease expires, unless it's renewed.
+    """
+
+    holder: str = field(factory=lambda: f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+    batch_size: int = field(default=10)
+    duration: float = field(default=600.0)
+
+
 @contextlib.contextmanager
 def use_db(path, mode=WorkDB.Mode.create):
     """
@@ -243,9 +443,60 @@ class WorkResultStorage(Base):
     output = Column(Text, nullable=True)
     test_outcome = Column(Enum(TestOutcome), nullable=True)
     diff = Column(Text, nullable=True)
+    duration = Column(Float, nullable=True)
+    attempts = Column(Integer, nullable=True)
     job_id = Column(String, ForeignKey("work_items.job_id"), primary_key=True)
 
 
+class BundleBlobStorage(Base):
+    "Database model for the contents of a bundled file."
+
+    __tablename__ = "bundle_blobs"
+
+    digest = Column(String, primary_key=True)
+    data = Column(LargeBinary)
+
+
+class BundleFileStorage(Base):
+    "Database model for a file in the bundle."
+
+    __tablename__ = "bundle_files"
+
+    path = Column(String, primary_key=True)
+    digest = Column(String, ForeignKey("bundle_blobs.digest"))
+    executable = Column(Boolean, nullable=True)
+
+
+class LeaseStorage(Base):
+    "Database model for the lease on a work item."
+
+    __tablename__ = "leases"
+
+    job_id = Column(String, ForeignKey("work_items.job_id"), primary_key=True)
+    holder = Column(String)
+    claim = Column(String, index=True)
+    expires = Column(Float)
+
+
+def _add_missing_columns(engine):
+    """Add any columns which are missing from the tables of a session made by an older version of Cosmic Ray.
+
+    The missing columns are all nullable, so existing rows just get NULLs.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(engine.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+
+
+def _job_ids(dbapi_connection, query):
+    return [job_id for (job_id,) in dbapi_connection.execute(query)]
+
+
 def _mutation_spec_from_storage(mutation_spec: MutationSpecStorage):
     return MutationSpec(
         module_path=Path(mutation_spec.module_path),
@@ -293,6 +544,8 @@ def _work_result_to_storage(result: WorkResult, job_id):
         output=result.output,
         test_outcome=result.test_outcome,
         diff=result.diff,
+        duration=result.duration,
+        attempts=result.attempts,
         job_id=job_id,
     )
 
@@ -303,4 +556,6 @@ def _work_result_from_storage(result: WorkResultStorage):
         output=result.output,
         test_outcome=result.test_outcome,
         diff=result.diff,
+        duration=result.duration,
+        attempts=1 if result.attempts is None else result.attempts,
     )
@@ -19,6 +19,7 @@ class WorkerOutcome(StrEnum):
     ABNORMAL = "abnormal"  # The worker did not exit normally or with an exception (e.g. a segfault)
     NO_TEST = "no-test"  # The worker had no test to run
     SKIPPED = "skipped"  # The job was skipped (worker was not executed)
+    EQUIVALENT = "equivalent"  # The mutant is equivalent to the unmutated code, so it wasn't tested
 
 
 class TestOutcome(StrEnum):
@@ -31,12 +32,19 @@ class TestOutcome(StrEnum):
 
 @define(frozen=True)
 class WorkResult:
-    """The result of a single mutation and test run."""
+    """The result of a single mutation and test run.
+
+    `duration` is the number of seconds it took to produce the result, if known. `attempts` is the number of attempts
+    that were started at the job, which is more than one if it was run again speculatively (see
+    `cosmic_ray.distribution.speculation`). Neither is compared when comparing results.
+    """
 
     worker_outcome: WorkerOutcome = field()
     output: Optional[str] = field(default=None)
     test_outcome: Optional[TestOutcome] = field(default=None)
     diff: Optional[str] = field(default=None)
+    duration: Optional[float] = field(default=None, eq=False)
+    attempts: int = field(default=1, eq=False)
 
     def __attrs_post_init__(self):
         if self.worker_outcome is None:
@@ -0,0 +1,197 @@
+"""Separate copies of a project tree, so that several mutants can be tested at once.
+
+Cosmic Ray mutates modules in place, so two mutants can only be tested at the same time if each has its own copy of the
+project. Copying a large project (often with its virtual environment) for every slot is slow and takes a lot of space,
+so a `WorkspacePool` builds each slot out of hard links to the original files. Hard links share the contents of the
+original, so a module is *broken out* of the shared links - replaced with a private copy - before it's mutated. Only
+the modules that are actually mutated are ever copied.
+
+By default, the slots are put in `WORKSPACES_DIR` in the project, which keeps them on the project's file system so
+that hard links can be used. Hard links can't cross file systems. If the slots are on a different file system to the
+project (e.g. on a ``tmpfs`` like ``/dev/shm``), files are copied instead.
+
+.. warning::
+
+   Files which are shared by hard links are shared with the original project. A test which *modifies* an existing file
+   in place (rather than replacing it) modifies the original too. Similarly, packages installed in "editable" mode
+   refer to the original project, not to the slot, so tests that import the code under test through an editable
+   install wouldn't see the mutations made in a slot. A `WorkspacePool` refuses to create slots for a project with
+   an editable install in the current Python environment (see `editable_installs`).
+"""
+
+import errno
+import importlib.metadata
+import json
+import logging
+import os
+import shutil
+import tempfile
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+# The name of the directory in a project in which workspace slots are put by default.
+WORKSPACES_DIR = ".cosmic-ray-workspaces"
+
+
+class WorkspaceSlot:
+    """A copy of a project tree, made of hard links to the original files where possible.
+
+    Args:
+        source: The root of the original project.
+        path: The root of the slot.
+    """
+
+    def __init__(self, source: Path, path: Path):
+        self.source = Path(source)
+        self.path = Path(path)
+        self._broken_out = set()
+
+    def populate(self, exclude=()):
+        """Create the slot's tree.
+
+        Args:
+            exclude: Directories (absolute paths) in the project which shouldn't be in the slot.
+        """
+        for directory, dirnames, filenames in os.walk(self.source):
+            dirnames[:] = [name for name in dirnames if Path(directory) / name not in exclude]
+            relative = Path(directory).relative_to(self.source)
+            target_dir = self.path / relative
+            target_dir.mkdir(parents=True, exist_ok=True)
+
+            for name in filenames + [name for name in dirnames if (Path(directory) / name).is_symlink()]:
+                _link(Path(directory) / name, target_dir / name)
+
+    def break_out(self, module_path):
+        """Make sure that the slot's copy of `module_path` isn't shared with the original project.
+
+        Call this before changing the file in the slot.
+
+        Args:
+            module_path: The path of a file in the project, either absolute or relative to its root.
+
+        Returns: The path of the file in the slot.
+
+        Raises:
+            ValueError: `module_path` isn't in the project.
+        """
+        module_path = self.relative_path(module_path)
+        path = self.path / module_path
+        if module_path not in self._broken_out:
+            if path.is_symlink() or path.stat().st_nlink > 1:
+                private = path.with_name(f".{path.name}.cosmic-ray")
+                shutil.copy2(path, private)
+                os.replace(private, path)
+            self._broken_out.add(module_path)
+        return path
+
+    def relative_path(self, module_path):
+        "The path of `module_path`, a file in the project, relative to the root of the project."
+        module_path = Path(module_path)
+        if module_path.is_absolute():
+            return module_path.resolve().relative_to(self.source)
+        return module_path
+
+    def reset(self):
+        """Put back the original contents of the files which have been broken out.
+
+        Files that haven't been broken out are still shared with the original, so they don't need resetting.
+        """
+        for module_path in self._broken_out:
+            original = (self.source / module_path).read_bytes()
+            path = self.path / module_path
+            if path.read_bytes() != original:
+                path.write_bytes(original)
+
+
+class WorkspacePool:
+    """A collection of `WorkspaceSlot`\\s of a project, which are removed when the pool is closed.
+
+    This is a context-manager which closes the pool on exit.
+
+    Args:
+        source: The root of the project.
+        num_slots: The number of slots to create.
+        directory: The directory in which to put the slots. By default, this is `WORKSPACES_DIR` in `source`. For
+            hard links to work, it must be on the same file system as `source`.
+
+    Raises:
+        ValueError: A distribution is installed in "editable" mode from `source`.
+    """
+
+    def __init__(self, source, num_slots, directory=None):
+        self.source = Path(source).resolve()
+        editable = editable_installs(self.source)
+        if editable:
+            raise ValueError(
+                f"{', '.join(editable)} installed in editable mode from {self.source}, so tests in workspace slots "
+                "would import the original code rather than the mutants. Install it normally to use slots."
+            )
+
+        self._default_directory = self.source / WORKSPACES_DIR
+        if directory is None:
+            self._default_directory.mkdir(exist_ok=True)
+            directory = self._default_directory
+        self._root = Path(tempfile.mkdtemp(prefix="cosmic-ray-workspaces-", dir=directory)).resolve()
+        log.info("Creating %s workspace slots for %s in %s", num_slots, self.source, self._root)
+        try:
+            self.slots = [WorkspaceSlot(self.source, self._root / f"slot-{index}") for index in range(num_slots)]
+            for slot in self.slots:
+                # Other pools (e.g. of other workers) might be using the default directory too.
+                slot.populate(exclude={self._root, self._default_directory})
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        "Remove the slots."
+        shutil.rmtree(self._root, ignore_errors=True)
+        try:
+            self._default_directory.rmdir()
+        except OSError:
+            # It doesn't exist, or another pool is still using it.
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def editable_installs(source):
+    """The names of the distributions in the current Python environment which are installed in "editable" mode from
+    `source` or a directory in it.
+
+    Only installs which record where they were installed from (as pip does, in ``direct_url.json``) are found.
+    """
+    source = Path(source).resolve()
+    names = []
+    for distribution in importlib.metadata.distributions():
+        try:
+            direct_url = json.loads(distribution.read_text("direct_url.json") or "{}")
+        except ValueError:
+            continue
+        url = urllib.parse.urlparse(direct_url.get("url", ""))
+        if url.scheme != "file" or not direct_url.get("dir_info", {}).get("editable", False):
+            continue
+        path = Path(urllib.request.url2pathname(url.path)).resolve()
+        if path == source or source in path.parents:
+            names.append(distribution.metadata["Name"])
+    return names
+
+
+def _link(source: Path, target: Path):
+    "Make `target` a hard link to `source`, or a copy if that's not possible. Symlinks are copied as symlinks."
+    if source.is_symlink():
+        os.symlink(os.readlink(source), target)
+        return
+
+    try:
+        os.link(source, target)
+    except OSError as exc:
+        if exc.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copy2(source, target)
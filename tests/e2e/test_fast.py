@@ -1,6 +1,9 @@
 import pathlib
+import shutil
+import socket
 import subprocess
 import sys
+import time
 
 import pytest
 
@@ -14,22 +17,180 @@ def project_root(pytestconfig):
     return root / "tests" / "resources" / "fast_tests"
 
 
-def test_fast_tests(project_root, session):
+@pytest.mark.parametrize(
+    "config",
+    [
+        "cr.conf",
+        "cr-schemata.conf",
+        "cr-daemon.conf",
+        "cr-slots.conf",
+        "cr-longest-first.conf",
+        "cr-speculate.conf",
+        "cr-affinity.conf",
+    ],
+)
+def test_fast_tests(project_root, session, config):
     """This tests that CR works correctly on suites that execute very rapidly.
 
     A single mutation-test round can be faster than the resolution of file timestamps for some filesystems. When this
     happens, we found that Python would not correctly create new pyc files - because it had no way to know do do so! We
     modified CR to work around this problem, and this test tries to ensure that we don't regress.
     """
+    subprocess.check_call([sys.executable, "-m", "cosmic_ray.cli", "init", config, str(session)], cwd=str(project_root))
+
+    subprocess.check_call([sys.executable, "-m", "cosmic_ray.cli", "exec", config, str(session)], cwd=str(project_root))
+
+    session_path = project_root / session
+    with use_db(str(session_path), WorkDB.Mode.open) as work_db:
+        rate = survival_rate(work_db)
+        assert round(rate, 2) == 18.18
+
+
+@pytest.mark.parametrize("send_edits", [False, True])
+def test_fast_tests_with_stream_workers(project_root, session, tmpdir_path, send_edits):
+    "The stream distributor gets the same results as the local one, with several jobs in flight on each worker."
+    # Each worker needs its own copy of the project, just like they would on separate machines.
+    clones = [shutil.copytree(project_root, tmpdir_path / f"worker-{index}") for index in range(2)]
+    sockets = [tmpdir_path / f"worker-{index}.sock" for index in range(2)]
+    config = tmpdir_path / "cr-stream.conf"
+    config.write_text(
+        (project_root / "cr.conf").read_text().replace('distributor.name = "local"', 'distributor.name = "stream"')
+        + "\n[cosmic-ray.distributor.stream]\n"
+        + f"worker-addresses = [{', '.join(repr(str(path)) for path in sockets)}]\n"
+        + f"send-edits = {str(send_edits).lower()}\n"
+    )
+
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-m", "cosmic_ray.cli", "stream-worker", "--path", str(path), "--slots", str(index + 1)],
+            cwd=str(clone),
+        )
+        for index, (clone, path) in enumerate(zip(clones, sockets))
+    ]
+    try:
+        deadline = time.monotonic() + 30
+        while not all(path.exists() for path in sockets):
+            assert time.monotonic() < deadline, "Workers didn't start"
+            assert all(worker.poll() is None for worker in workers), "A worker exited"
+            time.sleep(0.1)
+
+        subprocess.check_call(
+            [sys.executable, "-m", "cosmic_ray.cli", "init", str(config), str(session)], cwd=str(project_root)
+        )
+        subprocess.check_call(
+            [sys.executable, "-m", "cosmic_ray.cli", "exec", str(config), str(session)], cwd=str(project_root)
+        )
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.wait()
+
+    with use_db(str(session), WorkDB.Mode.open) as work_db:
+        rate = survival_rate(work_db)
+        assert round(rate, 2) == 18.18
+
+
+def test_fast_tests_with_bundle(project_root, session, tmpdir_path):
+    "An HTTP worker in an empty directory gets the files it needs from the session's bundle."
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        port = sock.getsockname()[1]
+
+    config = tmpdir_path / "cr-bundle.conf"
+    config.write_text(
+        (project_root / "cr.conf")
+        .read_text()
+        .replace(
+            'distributor.name = "local"', 'distributor.name = "http"\nbundle = ["calculator.py", "test_calculator.py"]'
+        )
+        + f'\n[cosmic-ray.distributor.http]\nworker-urls = ["http://localhost:{port}"]\n'
+    )
+    worker_dir = tmpdir_path / "worker"
+    worker_dir.mkdir()
+
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "cosmic_ray.cli", "http-worker", "--port", str(port), "--slots", "2"],
+        cwd=str(worker_dir),
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            assert worker.poll() is None, "The worker exited"
+            try:
+                socket.create_connection(("localhost", port)).close()
+                break
+            except OSError:
+                assert time.monotonic() < deadline, "The worker didn't start"
+                time.sleep(0.1)
+
+        subprocess.check_call(
+            [sys.executable, "-m", "cosmic_ray.cli", "init", str(config), str(session)], cwd=str(project_root)
+        )
+        subprocess.check_call(
+            [sys.executable, "-m", "cosmic_ray.cli", "exec", str(config), str(session)], cwd=str(project_root)
+        )
+    finally:
+        worker.terminate()
+        worker.wait()
+
+    assert not list(worker_dir.iterdir())
+    with use_db(str(session), WorkDB.Mode.open) as work_db:
+        rate = survival_rate(work_db)
+        assert round(rate, 2) == 18.18
+
+
+def test_fast_tests_with_shared_session(project_root, session, tmpdir_path):
+    "Several exec processes can work on one session at once without duplicating work."
     subprocess.check_call(
         [sys.executable, "-m", "cosmic_ray.cli", "init", "cr.conf", str(session)], cwd=str(project_root)
     )
 
+    # Each runner needs its own copy of the project, just like they would on separate machines.
+    clones = [shutil.copytree(project_root, tmpdir_path / f"runner-{index}") for index in range(2)]
+    runners = [
+        subprocess.Popen(
+            [sys.executable, "-m", "cosmic_ray.cli", "exec", "--shared", "--lease-batch", "2", "cr.conf", str(session)],
+            cwd=str(clone),
+        )
+        for clone in clones
+    ]
+    assert [runner.wait() for runner in runners] == [0, 0]
+
+    with use_db(str(session), WorkDB.Mode.open) as work_db:
+        assert work_db.num_results == work_db.num_work_items
+        rate = survival_rate(work_db)
+        assert round(rate, 2) == 18.18
+
+
+def test_fast_tests_with_shards(project_root, session, tmpdir_path):
+    "Shards of a session can be run separately and merged back into the session."
+    subprocess.check_call(
+        [sys.executable, "-m", "cosmic_ray.cli", "init", "cr.conf", str(session)], cwd=str(project_root)
+    )
     subprocess.check_call(
-        [sys.executable, "-m", "cosmic_ray.cli", "exec", "cr.conf", str(session)], cwd=str(project_root)
+        [
+            sys.executable,
+            "-m",
+            "cosmic_ray.cli",
+            "shard",
+            "--count",
+            "3",
+            "--output-dir",
+            str(tmpdir_path / "shards"),
+            str(session),
+        ]
     )
 
-    session_path = project_root / session
-    with use_db(str(session_path), WorkDB.Mode.open) as work_db:
+    shards = sorted((tmpdir_path / "shards").iterdir())
+    assert len(shards) == 3
+    for index, shard in enumerate(shards):
+        clone = shutil.copytree(project_root, tmpdir_path / f"runner-{index}")
+        subprocess.check_call([sys.executable, "-m", "cosmic_ray.cli", "exec", "cr.conf", str(shard)], cwd=str(clone))
+
+    subprocess.check_call([sys.executable, "-m", "cosmic_ray.cli", "merge", str(session), *map(str, shards)])
+
+    with use_db(str(session), WorkDB.Mode.open) as work_db:
+        assert work_db.num_results == work_db.num_work_items
+        assert all(result.duration is not None for _, result in work_db.results)
         rate = survival_rate(work_db)
         assert round(rate, 2) == 18.18
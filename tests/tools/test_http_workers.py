@@ -1,6 +1,98 @@
+import contextlib
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import git
 import pytest
 
+from cosmic_ray.config import load_config, serialize_config
+from cosmic_ray.tools.http_workers import _free_ports
+from cosmic_ray.tools.survival_rate import survival_rate
+from cosmic_ray.work_db import WorkDB, use_db
+
 
 @pytest.mark.skip(reason="TODO")
 def test_smoke_test():
     pass
+
+
+@pytest.fixture
+def fast_tests_repo(fast_tests_root, tmp_path):
+    "A git repository containing the 'fast_tests' project."
+    repo_dir = tmp_path / "repo"
+    shutil.copytree(fast_tests_root, repo_dir, ignore=shutil.ignore_patterns("__pycache__", "*.sqlite"))
+    repo = git.Repo.init(repo_dir)
+    repo.index.add(["calculator.py", "test_calculator.py", "cr.conf"])
+    repo.index.commit("Initial commit")
+    return repo_dir
+
+
+def test_free_ports_are_distinct():
+    ports = _free_ports(5)
+    assert len(set(ports)) == 5
+
+
+@pytest.mark.skipif(not hasattr(os, "killpg"), reason="Uses process groups to stop the workers")
+def test_counted_workers(fast_tests_repo, tmp_path):
+    config = tmp_path / "workers.conf"
+    session = tmp_path / "session.sqlite"
+    workers = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "cosmic_ray.tools.http_workers",
+            "--count",
+            "2",
+            "--write-config",
+            str(config),
+            str(fast_tests_repo / "cr.conf"),
+            str(fast_tests_repo),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+        start_new_session=True,
+    )
+    try:
+        urls = [workers.stdout.readline().strip() for _ in range(2)]
+        assert all(url.startswith("http://localhost:") for url in urls)
+        _wait_for_workers(urls)
+
+        cfg = load_config(str(config))
+        assert cfg["distributor"]["http"]["worker-urls"] == urls
+
+        cfg["distributor"]["name"] = "http"
+        config.write_text(serialize_config(cfg))
+        for command in ("init", "exec"):
+            subprocess.check_call(
+                [sys.executable, "-m", "cosmic_ray.cli", command, str(config), str(session)], cwd=fast_tests_repo
+            )
+
+        with use_db(str(session), WorkDB.Mode.open) as work_db:
+            assert round(survival_rate(work_db), 2) == 18.18
+    finally:
+        workers.terminate()
+        try:
+            assert workers.wait(timeout=30) == 0
+        finally:
+            # Make sure that no workers are left behind if they weren't stopped.
+            with contextlib.suppress(ProcessLookupError):
+                os.killpg(workers.pid, signal.SIGKILL)
+
+
+def _wait_for_workers(urls, timeout=30):
+    deadline = time.monotonic() + timeout
+    for url in urls:
+        port = int(url.rsplit(":", 1)[1])
+        while True:
+            try:
+                socket.create_connection(("localhost", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
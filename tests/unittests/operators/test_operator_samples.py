@@ -3,7 +3,8 @@
 import parso
 import pytest
 
-from cosmic_ray.mutating import MutationVisitor
+from cosmic_ray.ast import ast_nodes
+from cosmic_ray.mutating import MutationVisitor, mutate_code
 from cosmic_ray.operators.binary_operator_replacement import ReplaceBinaryOperator_Add_Mul
 from cosmic_ray.operators.operator import Example
 from cosmic_ray.operators.unary_operator_replacement import ReplaceUnaryOperator_USub_UAdd
@@ -56,3 +57,39 @@ def test_no_mutation_leaves_ast_unchanged(sample):
     mutant = visitor.walk(node)
 
     assert mutant.get_code() == sample.example.pre_mutation_code
+
+
+@pytest.mark.parametrize("sample", OPERATOR_SAMPLES, ids=lambda s: str(s.operator.__name__))
+def test_mutation_by_position(sample: Sample):
+    if sample.operator in {VariableReplacer, VariableInserter}:
+        pytest.xfail(f"{sample.operator} tests fail because they produce random output.")
+
+    operator = sample.operator(**sample.example.operator_args)
+    code = sample.example.pre_mutation_code
+    positions = [position for node in ast_nodes(parso.parse(code)) for position in operator.mutation_positions(node)]
+
+    if sample.example.occurrence >= len(positions):
+        assert code == sample.example.post_mutation_code
+        assert mutate_code(code, operator, sample.example.occurrence) is None
+    else:
+        start_pos, end_pos = positions[sample.example.occurrence]
+        mutant = mutate_code(code, operator, sample.example.occurrence, start_pos, end_pos)
+        assert mutant == sample.example.post_mutation_code
+
+
+def test_mutation_position_takes_precedence_over_occurrence():
+    code = "x = a + b\ny = c + d\n"
+    mutant = mutate_code(code, ReplaceBinaryOperator_Add_Mul(), 0, (2, 6), (2, 7))
+    assert mutant == "x = a + b\ny = c * d\n"
+
+
+def test_unmatched_mutation_position_falls_back_to_occurrence():
+    code = "x = a + b\ny = c + d\n"
+    mutant = mutate_code(code, ReplaceBinaryOperator_Add_Mul(), 1, (5, 0), (5, 1))
+    assert mutant == "x = a + b\ny = c * d\n"
+
+
+def test_placeholder_mutation_position_uses_occurrence():
+    code = "x = a + b\ny = c + d\n"
+    mutant = mutate_code(code, ReplaceBinaryOperator_Add_Mul(), 1, (0, 0), (0, 1))
+    assert mutant == "x = a + b\ny = c * d\n"
@@ -0,0 +1,106 @@
+import os
+import stat
+
+import pytest
+
+from cosmic_ray.bundle import Bundle, BundleStore, bundle_path, file_digest
+
+
+@pytest.fixture
+def project(tmpdir_path, monkeypatch):
+    monkeypatch.chdir(tmpdir_path)
+    (tmpdir_path / "pkg" / "__pycache__").mkdir(parents=True)
+    (tmpdir_path / "pkg" / ".hidden").mkdir()
+    (tmpdir_path / "pkg" / "mod.py").write_text("x = 1\n")
+    (tmpdir_path / "pkg" / "same.py").write_text("x = 1\n")
+    (tmpdir_path / "pkg" / "__pycache__" / "mod.cpython-311.pyc").write_bytes(b"bytecode")
+    (tmpdir_path / "pkg" / ".hidden" / "file").write_text("hidden")
+    (tmpdir_path / "test_mod.py").write_text("import pkg.mod\n")
+    (tmpdir_path / "session.sqlite").write_text("session")
+    return tmpdir_path
+
+
+def test_bundle_from_paths(project):
+    bundle = Bundle.from_paths(["pkg", "./test_mod.py", "session.sqlite"], exclude=[project / "session.sqlite"])
+
+    assert bundle.files == {
+        "pkg/mod.py": file_digest(b"x = 1\n"),
+        "pkg/same.py": file_digest(b"x = 1\n"),
+        "test_mod.py": file_digest(b"import pkg.mod\n"),
+    }
+    # Files with the same contents are only stored once.
+    assert len(bundle.blobs) == 2
+    assert bundle.contents(bundle.files["test_mod.py"]) == b"import pkg.mod\n"
+
+
+def test_bundle_digest_depends_on_paths_and_contents():
+    digest = file_digest(b"")
+    assert Bundle({"a.py": digest}).digest == Bundle({"a.py": digest}).digest
+    assert Bundle({"a.py": digest}).digest != Bundle({"b.py": digest}).digest
+    assert Bundle({"a.py": digest}).digest != Bundle({"a.py": file_digest(b"x")}).digest
+    assert Bundle({"a.py": digest}).digest != Bundle({"a.py": digest}, executable={"a.py"}).digest
+
+
+@pytest.mark.parametrize("path", ["../outside.py", "/absolute.py", "pkg/../../outside.py"])
+def test_bundle_paths_must_be_inside_project(path):
+    with pytest.raises(ValueError):
+        bundle_path(path)
+
+
+def test_store_only_needs_new_files(project, tmpdir_path):
+    store = BundleStore(tmpdir_path / "store")
+    bundle = Bundle.from_paths(["pkg", "test_mod.py"])
+    assert store.missing(bundle.files) == sorted(bundle.blobs)
+
+    for digest, blob in bundle.blobs.items():
+        store.add(digest, blob)
+    assert store.missing(bundle.files) == []
+
+    (project / "test_mod.py").write_text("import pkg\n")
+    changed = Bundle.from_paths(["pkg", "test_mod.py"])
+    assert store.missing(changed.files) == [changed.files["test_mod.py"]]
+
+
+def test_store_rejects_file_with_wrong_hash(project, tmpdir_path):
+    store = BundleStore(tmpdir_path / "store")
+    bundle = Bundle.from_paths(["test_mod.py"])
+    (digest,) = bundle.blobs
+
+    with pytest.raises(ValueError):
+        store.add(file_digest(b"something else"), bundle.blobs[digest])
+    with pytest.raises(ValueError):
+        store.add("../escape", bundle.blobs[digest])
+
+
+def test_checkout(project, tmpdir_path):
+    store = BundleStore(tmpdir_path / "store")
+    bundle = Bundle.from_paths(["pkg", "test_mod.py"])
+    with pytest.raises(ValueError):
+        store.checkout(bundle.files)
+
+    for digest, blob in bundle.blobs.items():
+        store.add(digest, blob)
+    root = store.checkout(bundle.files)
+
+    assert sorted(str(path.relative_to(root)) for path in root.rglob("*") if path.is_file()) == sorted(bundle.files)
+    assert (root / "pkg" / "mod.py").read_text() == "x = 1\n"
+    assert store.checkout(bundle.files) == root
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Windows doesn't have executable bits")
+def test_checkout_keeps_executable_files_executable(project, tmpdir_path):
+    (project / "run.sh").write_text("x = 1\n")
+    (project / "run.sh").chmod(0o755)
+    store = BundleStore(tmpdir_path / "store")
+    bundle = Bundle.from_paths(["pkg", "run.sh"])
+    assert bundle.executable == {"run.sh"}
+    # run.sh has the same contents as pkg/mod.py, so they share an object.
+    assert bundle.files["run.sh"] == bundle.files["pkg/mod.py"]
+
+    for digest, blob in bundle.blobs.items():
+        store.add(digest, blob)
+    root = store.checkout(bundle.files, bundle.executable)
+
+    assert (root / "run.sh").stat().st_mode & stat.S_IXUSR
+    assert not (root / "pkg" / "mod.py").stat().st_mode & stat.S_IXUSR
+    assert root != store.checkout(bundle.files)
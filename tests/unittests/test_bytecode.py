@@ -0,0 +1,55 @@
+"Tests for the bytecode cache."
+
+import sys
+
+import pytest
+
+from cosmic_ray.bytecode import bytecode_cache, cached_bytecode, use_bytecode_cache
+from cosmic_ray.testing import run_tests
+from cosmic_ray.util import restore_contents
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+
+@pytest.fixture
+def cache():
+    use_bytecode_cache()
+    yield bytecode_cache()
+    use_bytecode_cache(False)
+
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    module_path = tmp_path / "mod.py"
+    module_path.write_text("def value():\n    return 1\n")
+    monkeypatch.chdir(tmp_path)
+    return module_path
+
+
+COMMAND = f"{sys.executable} -c 'import mod; assert mod.value() == 1'"
+
+
+def test_test_runs_write_to_the_cache(cache, module):
+    assert run_tests(COMMAND, 30)[0] == TOutcome.SURVIVED
+    assert len(list(cached_bytecode(cache, module))) == 1
+    assert not (module.parent / "__pycache__").exists()
+
+
+def test_changed_modules_are_not_stale(cache, module):
+    # The mutated module has the same size as the original, and is written within the same second, so only the
+    # invalidation of the cache stops the tests from using the bytecode of the original.
+    for _ in range(3):
+        assert run_tests(COMMAND, 30)[0] == TOutcome.SURVIVED
+        with restore_contents(module):
+            assert not list(cached_bytecode(cache, module))
+            module.write_text("def value():\n    return 2\n")
+            assert run_tests(COMMAND, 30)[0] == TOutcome.KILLED
+        assert not list(cached_bytecode(cache, module))
+
+
+def test_disabling_the_cache_removes_it(module):
+    use_bytecode_cache()
+    cache_dir = bytecode_cache()
+    assert cache_dir.is_dir()
+    use_bytecode_cache(False)
+    assert bytecode_cache() is None
+    assert not cache_dir.exists()
@@ -59,3 +59,8 @@ def test_load_from_non_utf8_file_raises_ConfigError(tmpdir):
         handle.write(serialize_config(config).encode("utf-16"))
     with pytest.raises(ConfigError):
         load_config(str(config_path))
+
+
+def test_bytecode_cache_is_off_by_default():
+    assert not ConfigDict().bytecode_cache
+    assert ConfigDict({"bytecode-cache": True}).bytecode_cache
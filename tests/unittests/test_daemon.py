@@ -0,0 +1,198 @@
+"Tests for the test daemon."
+
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from cosmic_ray.daemon import (
+    ACTIVE_MUTANT_VAR,
+    DaemonError,
+    TestDaemon,
+    command_interpreter,
+    parse_test_command,
+    runs_in_this_interpreter,
+)
+from cosmic_ray.limits import ResourceLimits
+from cosmic_ray.testing import run_tests, use_test_daemon
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="The test daemon needs os.fork")
+
+
+@pytest.mark.parametrize(
+    "command, expected",
+    [
+        ("python -m pytest tests -x", ("pytest", ["tests", "-x"])),
+        ("/usr/bin/python3.12 -m unittest discover tests", ("unittest", ["discover", "tests"])),
+        ("pytest tests", ("pytest", ["tests"])),
+        ("python -m nose tests", None),
+        ("tox -e py", None),
+        ("", None),
+    ],
+)
+def test_parse_test_command(command, expected):
+    assert parse_test_command(command) == expected
+
+
+def test_command_interpreter_of_script(tmp_path):
+    script = tmp_path / "pytest"
+    script.write_text(f"#!{sys.executable}\nimport pytest\n")
+    script.chmod(0o755)
+    env_script = tmp_path / "env-pytest"
+    env_script.write_text("#!/usr/bin/env python3 -u\n")
+    env_script.chmod(0o755)
+
+    assert command_interpreter(f"{script} tests") == sys.executable
+    assert command_interpreter("./pytest tests", cwd=tmp_path) == sys.executable
+    assert os.path.basename(command_interpreter(f"{env_script} tests")).startswith("python3")
+    assert command_interpreter("there-is-no-such-command") is None
+
+
+def test_runs_in_this_interpreter():
+    assert runs_in_this_interpreter(f"{sys.executable} -m pytest tests")
+    assert not runs_in_this_interpreter("there-is-no-such-python -m pytest tests")
+
+
+@pytest.fixture
+def venv_python(tmp_path):
+    "The Python of a new virtual environment, which can run unittest but doesn't have Cosmic Ray."
+    venv = tmp_path / "venv"
+    subprocess.run([sys.executable, "-m", "venv", "--without-pip", str(venv)], check=True)
+    return venv / "bin" / "python"
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    (tmp_path / "mod.py").write_text("def value():\n    return 1\n")
+    (tmp_path / "test_mod.py").write_text(
+        "import os\n"
+        "import unittest\n"
+        "import mod\n"
+        "\n"
+        "class ModTest(unittest.TestCase):\n"
+        "    def test_value(self):\n"
+        "        if os.environ.get('LOOP'):\n"
+        "            while True: pass\n"
+        "        self.assertEqual(mod.value(), 1)\n"
+        "\n"
+        "    def test_mutant(self):\n"
+        f"        self.assertNotEqual(os.environ.get('{ACTIVE_MUTANT_VAR}'), 'bad')\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_daemon_imports_changed_modules_for_each_run(project):
+    daemon = TestDaemon("unittest", ["test_mod"])
+    try:
+        assert daemon.run(30)["returncode"] == 0
+
+        (project / "mod.py").write_text("def value():\n    return 2\n")
+        response = daemon.run(30)
+        assert response["returncode"] != 0
+        assert response["failed"] == ["test_mod.ModTest.test_value"]
+        assert "AssertionError" in response["output"]
+
+        (project / "mod.py").write_text("def value():\n    return 1\n")
+        assert daemon.run(30)["returncode"] == 0
+    finally:
+        daemon.stop()
+
+
+def test_daemon_is_restarted_after_timeout(project):
+    daemon = TestDaemon("unittest", ["test_mod"])
+    try:
+        with pytest.raises(subprocess.TimeoutExpired):
+            daemon.run(2, env={"LOOP": "1"})
+        assert daemon.run(30)["returncode"] == 0
+    finally:
+        daemon.stop()
+
+
+def test_run_tests_with_daemon(project):
+    use_test_daemon()
+    try:
+        command = f"{sys.executable} -m unittest test_mod"
+        assert run_tests(command, 30)[0] == TOutcome.SURVIVED
+        assert run_tests(command, 2, env={"LOOP": "1"}) == (TOutcome.KILLED, "timeout")
+    finally:
+        use_test_daemon(False)
+
+
+def test_run_tests_with_another_python_does_not_use_daemon(project, venv_python):
+    assert not runs_in_this_interpreter(f"{venv_python} -m unittest test_mod")
+
+    (project / "test_prefix.py").write_text(
+        "import sys\n"
+        "import unittest\n"
+        "\n"
+        "class PrefixTest(unittest.TestCase):\n"
+        "    def test_prefix(self):\n"
+        f"        self.assertNotEqual(sys.prefix, {sys.prefix!r})\n"
+    )
+    use_test_daemon()
+    try:
+        # The daemon would run the test with Cosmic Ray's Python, and so fail it.
+        assert run_tests(f"{venv_python} -m unittest test_prefix", 30)[0] == TOutcome.SURVIVED
+    finally:
+        use_test_daemon(False)
+
+
+def test_daemon_applies_resource_limits(project):
+    daemon = TestDaemon("unittest", ["test_mod"])
+    try:
+        response = daemon.run(30, env={"LOOP": "1"}, limits=ResourceLimits(cpu_time=1))
+        assert ResourceLimits(cpu_time=1).exceeded(response["returncode"], response["output"]) == "cpu-seconds"
+    finally:
+        daemon.stop()
+
+
+def test_daemon_activates_mutant(project):
+    daemon = TestDaemon("unittest", ["test_mod"])
+    try:
+        assert daemon.run(30, mutant="good")["returncode"] == 0
+        assert daemon.run(30, mutant="bad")["failed"] == ["test_mod.ModTest.test_mutant"]
+    finally:
+        daemon.stop()
+
+
+@pytest.mark.parametrize("framework", ["unittest", "pytest"])
+def test_daemon_runs_selected_tests(project, framework):
+    daemon = TestDaemon(framework, ["test_mod.py" if framework == "pytest" else "test_mod"])
+    test_id = "test_mod.py::ModTest::test_mutant" if framework == "pytest" else "test_mod.ModTest.test_mutant"
+    try:
+        # test_value would loop forever, so only test_mutant can have been run.
+        assert daemon.run(30, env={"LOOP": "1"}, tests=[test_id])["returncode"] == 0
+        assert daemon.run(30, env={"LOOP": "1"}, mutant="bad", tests=[test_id])["failed"] == [test_id]
+    finally:
+        daemon.stop()
+
+
+def test_run_tests_with_daemon_reports_failed_tests(project):
+    use_test_daemon()
+    try:
+        test_outcome, output = run_tests(f"{sys.executable} -m unittest test_mod", 30, mutant="bad")
+    finally:
+        use_test_daemon(False)
+
+    assert test_outcome == TOutcome.KILLED
+    assert output.startswith("Failed tests:\n    test_mod.ModTest.test_mutant\n")
+
+
+def test_daemon_errors_are_logged(project, caplog):
+    daemon = TestDaemon("no_such_framework", [])
+    try:
+        with caplog.at_level(logging.WARNING, logger="cosmic_ray.daemon"):
+            with pytest.raises(DaemonError):
+                daemon.run(30)
+            deadline = time.monotonic() + 10
+            while "ModuleNotFoundError" not in caplog.text and time.monotonic() < deadline:
+                time.sleep(0.1)
+    finally:
+        daemon.stop()
+
+    assert "ModuleNotFoundError" in caplog.text
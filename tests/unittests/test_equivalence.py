@@ -0,0 +1,97 @@
+"Tests for detecting equivalent mutants."
+
+import sys
+
+from cosmic_ray.commands import execute
+from cosmic_ray.config import ConfigDict
+from cosmic_ray.equivalence import code_fingerprint, find_equivalents
+from cosmic_ray.sampling import RateTracker
+from cosmic_ray.tools.survival_rate import survival_rate
+from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkerOutcome
+
+
+def _work_item(module_path, operator_name, line, col):
+    return WorkItem(
+        mutations=[MutationSpec(module_path, operator_name, 0, (line, col), (line, col + 1))],
+        job_id=f"{operator_name}-{line}-{col}",
+    )
+
+
+def test_fingerprint_ignores_layout():
+    assert code_fingerprint("x = 1\n") == code_fingerprint("\n\n# comment\nx = (1)\n")
+
+
+def test_fingerprint_distinguishes_equal_constants():
+    assert code_fingerprint("x = 1\n") != code_fingerprint("x = 1.0\n")
+    assert code_fingerprint("x = 0.0\n") != code_fingerprint("x = -0.0\n")
+
+
+def test_fingerprint_of_invalid_code_is_none():
+    assert code_fingerprint("x = (\n") is None
+
+
+def test_find_equivalents(tmpdir_path):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 2 + 2\ny = 3 + 1\n")
+
+    equivalent_item = _work_item(module_path, "core/ReplaceBinaryOperator_Add_Mul", 1, 6)
+    representative = _work_item(module_path, "core/ReplaceBinaryOperator_Add_Mul", 2, 6)
+    duplicate = _work_item(module_path, "core/ReplaceBinaryOperator_Add_Pow", 2, 6)
+    distinct = _work_item(module_path, "core/ReplaceBinaryOperator_Add_Sub", 2, 6)
+
+    equivalences = find_equivalents([equivalent_item, representative, duplicate, distinct])
+
+    assert equivalences.equivalent == {equivalent_item.job_id}
+    assert equivalences.duplicates == {duplicate.job_id: representative.job_id}
+    assert "2 * 2" in equivalences.diffs[equivalent_item.job_id]
+
+
+def _execute_with_equivalents(module_path, session, test_command):
+    "Execute a session with an equivalent mutant, a mutant and its duplicate, returning the tracker and results."
+    module_path.write_text("x = 2 + 2\ny = 3 + 1\n")
+
+    work_items = [
+        _work_item(module_path, "core/ReplaceBinaryOperator_Add_Mul", 1, 6),
+        _work_item(module_path, "core/ReplaceBinaryOperator_Add_Mul", 2, 6),
+        _work_item(module_path, "core/ReplaceBinaryOperator_Add_Pow", 2, 6),
+    ]
+    config = ConfigDict(
+        {
+            "test-command": test_command,
+            "timeout": 30,
+            "distributor": {"name": "local"},
+            "detect-equivalent-mutants": True,
+        }
+    )
+
+    with use_db(str(session), WorkDB.Mode.create) as work_db:
+        for work_item in work_items:
+            work_db.add_work_item(work_item)
+        tracker = execute(work_db, config)
+        results = dict(work_db.results)
+        rate = survival_rate(work_db)
+        db_tracker = RateTracker.from_db(work_db)
+
+    return [results[work_item.job_id] for work_item in work_items], tracker, rate, db_tracker
+
+
+def test_execute_propagates_duplicate_results(tmpdir_path, session):
+    results, *_ = _execute_with_equivalents(tmpdir_path / "mod.py", session, f"{sys.executable} -c pass")
+
+    equivalent, representative, duplicate = results
+    assert equivalent.worker_outcome == WorkerOutcome.EQUIVALENT
+    assert representative.worker_outcome == WorkerOutcome.NORMAL
+    assert duplicate.test_outcome == representative.test_outcome
+    assert representative.diff != duplicate.diff
+
+
+def test_equivalent_mutants_are_left_out_of_survival_rate(tmpdir_path, session):
+    # The mutant and its duplicate both survive. The equivalent mutant can't be killed, so it doesn't count as killed.
+    _, tracker, rate, db_tracker = _execute_with_equivalents(
+        tmpdir_path / "mod.py", session, f"{sys.executable} -c pass"
+    )
+
+    assert rate == tracker.rate == db_tracker.rate == 100
+    assert tracker.num_items == db_tracker.num_items == 2
+    assert tracker.num_results == db_tracker.num_results == 2
@@ -0,0 +1,114 @@
+"Tests for group testing."
+
+from cosmic_ray.grouping import form_groups, run_in_groups
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+
+def _work_item(module_path, index):
+    return WorkItem(
+        mutations=[MutationSpec(module_path, "core/NumberReplacer", index, (index + 1, 0), (index + 1, 1))],
+        job_id=f"{module_path}:{index}",
+    )
+
+
+class FakeDistributor:
+    "Kills any work item which includes one of the `killers`."
+
+    def __init__(self, killers):
+        self.killers = killers
+        self.num_runs = 0
+
+    def __call__(self, pending_work, test_command, timeout, distributor_config, on_task_complete):
+        for work_item in pending_work:
+            self.num_runs += 1
+            job_ids = {f"{mutation.module_path}:{mutation.occurrence}" for mutation in work_item.mutations}
+            killed = bool(job_ids & self.killers)
+            diff = "\n".join(
+                f"--- mutation diff ---\n{mutation.module_path}:{mutation.occurrence}"
+                for mutation in work_item.mutations
+            )
+            on_task_complete(
+                work_item.job_id,
+                WorkResult(
+                    worker_outcome=WorkerOutcome.NORMAL,
+                    test_outcome=TOutcome.KILLED if killed else TOutcome.SURVIVED,
+                    diff=diff,
+                ),
+            )
+
+
+def test_groups_mutate_different_modules():
+    work_items = [_work_item(f"mod{module}.py", index) for module in range(3) for index in range(4)]
+    work_items.append(_work_item("mod0.py", 10))
+
+    groups, singles = form_groups(work_items, 2)
+
+    assert all(len(group) <= 2 for group in groups)
+    for group in groups:
+        assert len({work_item.mutations[0].module_path for work_item in group}) == len(group)
+    grouped_ids = [work_item.job_id for group in groups for work_item in group]
+    assert sorted(grouped_ids + [work_item.job_id for work_item in singles]) == sorted(
+        work_item.job_id for work_item in work_items
+    )
+    assert len(singles) <= 1
+
+
+def test_results_match_single_mutant_runs_for_independent_mutants():
+    work_items = [_work_item(f"mod{module}.py", 0) for module in range(8)]
+    killers = {"mod2.py:0", "mod5.py:0"}
+    distributor = FakeDistributor(killers)
+
+    results = {}
+    run_in_groups(distributor, work_items, 8, "test", 10, {}, lambda job_id, result: results.update({job_id: result}))
+
+    assert set(results) == {work_item.job_id for work_item in work_items}
+    for job_id, result in results.items():
+        expected = TOutcome.KILLED if job_id in killers else TOutcome.SURVIVED
+        assert result.test_outcome == expected
+        assert result.diff == f"--- mutation diff ---\n{job_id}"
+    assert distributor.num_runs < 2 * len(work_items)
+
+
+class MaskingDistributor(FakeDistributor):
+    "Like `FakeDistributor`, except that the `maskers` stop the `killers` from being killed."
+
+    def __init__(self, killers, maskers):
+        super().__init__(killers)
+        self.maskers = maskers
+
+    def __call__(self, pending_work, test_command, timeout, distributor_config, on_task_complete):
+        def complete(job_id, result):
+            work_item = next(item for item in pending_work if item.job_id == job_id)
+            job_ids = {f"{mutation.module_path}:{mutation.occurrence}" for mutation in work_item.mutations}
+            if job_ids & self.maskers:
+                result = WorkResult(
+                    worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.SURVIVED, diff=result.diff
+                )
+            on_task_complete(job_id, result)
+
+        super().__call__(pending_work, test_command, timeout, distributor_config, complete)
+
+
+def test_masked_mutants_are_recorded_as_survivors_of_their_group():
+    work_items = [_work_item(f"mod{module}.py", 0) for module in range(2)]
+    distributor = MaskingDistributor(killers={"mod0.py:0"}, maskers={"mod1.py:0"})
+
+    results = {}
+    run_in_groups(distributor, work_items, 2, "test", 10, {}, lambda job_id, result: results.update({job_id: result}))
+
+    # On its own, mod0.py:0 would be killed, but mod1.py:0 masks it in the group.
+    assert distributor.num_runs == 1
+    assert results["mod0.py:0"].test_outcome == TOutcome.SURVIVED
+    assert results["mod0.py:0"].output.startswith("Survived as one of a group of 2 mutants")
+
+
+def test_all_survivors_need_one_run():
+    work_items = [_work_item(f"mod{module}.py", 0) for module in range(8)]
+    distributor = FakeDistributor(set())
+
+    results = {}
+    run_in_groups(distributor, work_items, 8, "test", 10, {}, lambda job_id, result: results.update({job_id: result}))
+
+    assert distributor.num_runs == 1
+    assert len(results) == 8
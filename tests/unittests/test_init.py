@@ -0,0 +1,27 @@
+"Tests for the init command."
+
+from cosmic_ray.commands.init import _all_work_items
+from cosmic_ray.modules import find_modules
+
+
+def _mutations(work_items):
+    return [work_item.mutations for work_item in work_items]
+
+
+def test_work_items_are_in_module_order(resources_dirpath):
+    module_paths = list(find_modules([resources_dirpath / "example_project"]))
+    work_items = list(_all_work_items(reversed(module_paths), {}))
+
+    paths = [work_item.mutations[0].module_path for work_item in work_items]
+    assert paths == sorted(paths)
+
+
+def test_parallel_init_matches_serial_init(resources_dirpath):
+    module_paths = list(find_modules([resources_dirpath / "example_project"]))
+
+    serial = list(_all_work_items(module_paths, {}))
+    parallel = list(_all_work_items(module_paths, {}, jobs=2))
+
+    assert serial
+    assert _mutations(parallel) == _mutations(serial)
+    assert len({work_item.job_id for work_item in parallel}) == len(parallel)
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import cosmic_ray.mutating
+from cosmic_ray.bundle import BundleStore, file_digest
+from cosmic_ray.distribution.jobs import PrecomputedEdits, WorkerWorkspaces, job_parameters, run_job
+from cosmic_ray.limits import ResourceLimits
+from cosmic_ray.testing import resource_limits
+from cosmic_ray.work_item import MutationSpec, WorkItem
+
+
+@pytest.fixture
+def module_path(tmpdir_path, monkeypatch):
+    monkeypatch.chdir(tmpdir_path)
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = True\ny = True\n")
+    return module_path
+
+
+def _work_item(job_id, *mutations):
+    return WorkItem(
+        job_id=job_id,
+        mutations=[
+            MutationSpec(module_path, "core/ReplaceTrueWithFalse", occurrence, (line, 4), (line, 8))
+            for module_path, occurrence, line in mutations
+        ],
+    )
+
+
+def test_job_parameters_without_edits(module_path):
+    parameters = job_parameters(_work_item("job", (module_path, 0, 1)), "true", 10)
+
+    assert "edit" not in parameters["mutations"][0]
+    assert "source_hash" not in parameters["mutations"][0]
+
+
+def test_precomputed_edits_round_trip(module_path):
+    parameters = job_parameters(_work_item("job", (module_path, 1, 2)), "false", 10, PrecomputedEdits())
+    assert parameters["mutations"][0]["edit"] == [12, 17, " False"]
+
+    result = asyncio.run(run_job(parameters))
+
+    assert "+y = False" in result.diff
+    assert module_path.read_text() == "x = True\ny = True\n"
+
+
+def test_run_job_passes_limits_to_the_test_run(module_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(cosmic_ray.mutating, "run_tests", lambda *args, **kwargs: calls.append(kwargs) or (None, ""))
+    parameters = job_parameters(_work_item("job", (module_path, 0, 1)), "true", 10)
+    parameters["resource_limits"] = {"address_space": None, "cpu_time": 5, "processes": None}
+    parameters["max_output"] = 100
+
+    asyncio.run(run_job(parameters))
+
+    assert calls[0]["limits"] == ResourceLimits(cpu_time=5)
+    assert calls[0]["max_output"] == 100
+    # The limits are only for this job, so they aren't set for the whole process.
+    assert not resource_limits()
+
+
+def test_precomputed_edits_parse_each_module_once(module_path, monkeypatch):
+    parses = []
+    get_ast = cosmic_ray.mutating.get_ast
+    monkeypatch.setattr(cosmic_ray.mutating, "get_ast", lambda source: parses.append(source) or get_ast(source))
+    edits = PrecomputedEdits()
+
+    first = edits.for_work_item(_work_item("first", (module_path, 0, 1)))
+    second = edits.for_work_item(_work_item("second", (module_path, 1, 2)))
+
+    assert len(parses) == 1
+    assert first[0].source_hash == second[0].source_hash
+    assert first[0].edit != second[0].edit
+
+
+def test_precomputed_edits_skip_higher_order_mutations(module_path):
+    work_item = _work_item("job", (module_path, 0, 1), (module_path, 1, 2))
+
+    assert PrecomputedEdits().for_work_item(work_item) == [None, None]
+
+
+def test_precomputed_edit_for_impossible_mutation(module_path):
+    work_item = WorkItem.single("job", MutationSpec(module_path, "core/ReplaceTrueWithFalse", 5, (0, 0), (0, 1)))
+    edits = PrecomputedEdits().for_work_item(work_item)
+
+    assert edits[0] is not None
+    assert edits[0].edit is None
+
+
+def test_worker_workspaces_keep_busy_slots(tmpdir_path, monkeypatch):
+    monkeypatch.chdir(tmpdir_path)
+    store = BundleStore(tmpdir_path / "store")
+    bundles = [{"mod.py": file_digest(data)} for data in (b"x = 1\n", b"x = 2\n")]
+    for data in (b"x = 1\n", b"x = 2\n"):
+        store.add(file_digest(data), zlib.compress(data))
+
+    started = threading.Event()
+    finish = threading.Event()
+
+    def job(workspace):
+        started.set()
+        finish.wait(10)
+        return (workspace.path / "mod.py").read_text()
+
+    with ThreadPoolExecutor(2) as executor, WorkerWorkspaces(2, tmpdir_path, executor, store) as workspaces:
+        assert workspaces.sync_bundle(bundles[0]) == []
+        running = executor.submit(workspaces.slots.run, job)
+        assert started.wait(10)
+
+        with pytest.raises(ValueError, match="still running"):
+            workspaces.sync_bundle(bundles[1])
+        # Syncing to the bundle that's in use is fine.
+        assert workspaces.sync_bundle(bundles[0]) == []
+
+        finish.set()
+        assert running.result() == "x = 1\n"
+        assert workspaces.sync_bundle(bundles[1]) == []
+        assert workspaces.slots.run(lambda workspace: (workspace.path / "mod.py").read_text()) == "x = 2\n"
@@ -0,0 +1,202 @@
+"Tests for limiting the resources and output of test runs."
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import cosmic_ray.limits
+from cosmic_ray.limits import DEFAULT_MAX_OUTPUT, EXEC_FAILED, BoundedOutput, ResourceLimits, main, read_bounded
+from cosmic_ray.testing import Cancellation, resource_limits, run_tests, use_max_output, use_resource_limits
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "killpg"), reason="Sessions and resource limits are POSIX-only")
+
+
+@pytest.fixture
+def limits():
+    def use(**kwargs):
+        use_resource_limits(ResourceLimits(**kwargs))
+
+    yield use
+    use_resource_limits(ResourceLimits())
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    # A killed process that hasn't been reaped by its parent yet is a zombie.
+    with open(f"/proc/{pid}/stat", encoding="ascii") as stat:
+        return stat.read().split()[2] != "Z"
+
+
+@pytest.mark.skipif(not os.path.exists("/proc"), reason="Needs /proc to check process states")
+def test_timeout_kills_processes_started_by_tests(tmp_path):
+    pid_file = tmp_path / "pid"
+    script = tmp_path / "spawn.py"
+    script.write_text(
+        "import subprocess, sys, time\n"
+        "proc = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])\n"
+        f"open({str(pid_file)!r}, 'w').write(str(proc.pid))\n"
+        "time.sleep(60)\n"
+    )
+
+    assert run_tests(f"{sys.executable} {script}", 2) == (TOutcome.KILLED, "timeout")
+
+    grandchild = int(pid_file.read_text())
+    deadline = time.monotonic() + 10
+    while _alive(grandchild) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not _alive(grandchild)
+
+
+def test_cancellation_stops_test_run():
+    cancellation = Cancellation()
+    threading.Timer(0.5, cancellation.cancel).start()
+
+    start = time.monotonic()
+    assert run_tests(f"{sys.executable} -c 'import time; time.sleep(60)'", 60, cancellation=cancellation) == (
+        TOutcome.INCOMPETENT,
+        "cancelled",
+    )
+    assert time.monotonic() - start < 30
+
+    # A cancelled run doesn't start again.
+    assert run_tests(f"{sys.executable} -c 'pass'", 60, cancellation=cancellation) == (
+        TOutcome.INCOMPETENT,
+        "cancelled",
+    )
+
+
+def test_cpu_limit(limits):
+    limits(cpu_time=1)
+    test_outcome, output = run_tests(f"{sys.executable} -c 'while True: pass'", 30)
+    assert test_outcome == TOutcome.KILLED
+    assert output.startswith("Exceeded resource limit: cpu-seconds")
+
+
+def test_address_space_limit(limits):
+    limits(address_space=1024**3)
+    test_outcome, output = run_tests(f"{sys.executable} -c 'x = bytearray(4 * 1024 ** 3)'", 30)
+    assert test_outcome == TOutcome.KILLED
+    assert output.startswith("Exceeded resource limit: address-space-mb")
+
+
+def test_limits_are_not_reported_for_ordinary_failures(limits):
+    limits(cpu_time=10, address_space=1024**3)
+    assert run_tests(f"{sys.executable} -c 'raise SystemExit(1)'", 30) == (TOutcome.KILLED, "")
+
+
+def test_limits_are_applied_to_the_test_command(limits):
+    limits(cpu_time=10)
+    assert run_tests(
+        f"{sys.executable} -c 'import resource; assert resource.getrlimit(resource.RLIMIT_CPU) == (10, 11)'", 30
+    ) == (TOutcome.SURVIVED, "")
+
+
+def test_limits_can_be_given_for_each_test_run():
+    limits = ResourceLimits(cpu_time=10)
+    assert run_tests(
+        f"{sys.executable} -c 'import resource; assert resource.getrlimit(resource.RLIMIT_CPU) == (10, 11)'",
+        30,
+        limits=limits,
+    ) == (TOutcome.SURVIVED, "")
+    assert not resource_limits()
+
+
+def test_missing_test_command_with_limits_is_incompetent(limits):
+    limits(cpu_time=10)
+    test_outcome, output = run_tests("there-is-no-such-command", 30)
+    assert test_outcome == TOutcome.INCOMPETENT
+    assert "FileNotFoundError" in output
+
+
+@pytest.mark.skipif(hasattr(os, "geteuid") and os.geteuid() == 0, reason="root can raise its hard limits")
+@pytest.mark.parametrize("test_daemon", [False, True])
+def test_limit_above_hard_limit_is_incompetent(tmp_path, test_daemon):
+    (tmp_path / "test_nothing.py").write_text("def test_nothing():\n    pass\n")
+    script = (
+        "import resource, sys\n"
+        "from cosmic_ray.limits import ResourceLimits\n"
+        "from cosmic_ray.testing import run_tests, use_test_daemon\n"
+        "resource.setrlimit(resource.RLIMIT_CPU, (100, 100))\n"
+        f"use_test_daemon({test_daemon})\n"
+        "test_outcome, _ = run_tests(f'{sys.executable} -m pytest test_nothing.py', 60, limits=ResourceLimits(cpu_time=1000))\n"
+        "print(test_outcome.value)\n"
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, timeout=120, check=True
+    )
+    assert proc.stdout.strip().splitlines()[-1] == TOutcome.INCOMPETENT.value
+
+
+def test_wrapper_reports_limits_which_cant_be_applied(monkeypatch):
+    def setrlimit(limit, values):
+        raise ValueError("not allowed to raise maximum limit")
+
+    monkeypatch.setattr(cosmic_ray.limits.resource, "setrlimit", setrlimit)
+    with pytest.raises(SystemExit) as exc_info:
+        main(['{"address_space": null, "cpu_time": 1000, "processes": null}', sys.executable, "-c", "pass"])
+    assert exc_info.value.code == EXEC_FAILED
+
+
+def test_cpu_limit_is_only_reported_for_cpu_kills():
+    limits = ResourceLimits(cpu_time=10)
+    assert limits.exceeded(-signal.SIGXCPU, "") == "cpu-seconds"
+    assert limits.exceeded(-signal.SIGKILL, "", cpu_time=11.0) == "cpu-seconds"
+    # E.g. the OOM killer.
+    assert limits.exceeded(-signal.SIGKILL, "", cpu_time=0.5) is None
+    assert limits.exceeded(-signal.SIGKILL, "") is None
+
+
+def test_limits_from_config():
+    limits = ResourceLimits.from_config({"address-space-mb": 2, "cpu-seconds": 5})
+    assert limits == ResourceLimits(address_space=2 * 1024 * 1024, cpu_time=5)
+    assert ResourceLimits.from_dict(limits.as_dict()) == limits
+    assert limits
+    assert not ResourceLimits()
+
+
+def test_bounded_output_keeps_everything_under_the_limit():
+    output = BoundedOutput(10)
+    for chunk in (b"abc", b"defg", b"hij"):
+        output.write(chunk)
+    assert not output.truncated
+    assert output.getvalue() == "abcdefghij"
+
+
+def test_bounded_output_keeps_head_and_tail():
+    output = BoundedOutput(10)
+    for index in range(100):
+        output.write(str(index % 10).encode())
+    assert output.truncated
+    assert output.size == 100
+    assert output.getvalue() == "01234\n\n[... 90 bytes of output omitted, 100 bytes in total ...]\n\n56789"
+
+
+def test_read_bounded(tmp_path):
+    path = tmp_path / "output"
+    path.write_bytes(b"0123456789" * 10)
+    assert read_bounded(path, 10) == "01234\n\n[... 90 bytes of output omitted, 100 bytes in total ...]\n\n56789"
+    assert read_bounded(path, 1000) == "0123456789" * 10
+
+
+def test_output_is_merged_and_bounded():
+    use_max_output(100)
+    try:
+        test_outcome, output = run_tests(
+            f"{sys.executable} -c \"import sys; print('x' * 1000); print('error', file=sys.stderr); sys.exit(1)\"", 30
+        )
+    finally:
+        use_max_output(DEFAULT_MAX_OUTPUT)
+
+    assert test_outcome == TOutcome.KILLED
+    assert output.startswith("x" * 50)
+    assert "bytes of output omitted, 1007 bytes in total" in output
+    assert output.endswith("error\n")
@@ -1,9 +1,18 @@
 "Tests for worker."
 
+import importlib
+import sys
 from pathlib import Path
 
-from cosmic_ray.mutating import mutate_and_test
-from cosmic_ray.work_item import MutationSpec, WorkResult, WorkerOutcome
+import pytest
+
+import cosmic_ray.mutating
+from cosmic_ray.commands import execute
+from cosmic_ray.config import ConfigDict
+from cosmic_ray.mutating import PrecomputedEdit, SourceEdit, compile_check, mutate_and_test, source_hash
+from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
 
 
 def test_no_test_return_value(path_utils, data_dir):
@@ -30,3 +39,124 @@ def test_no_test_return_value(path_utils, data_dir):
             worker_outcome=WorkerOutcome.NO_TEST,
         )
         assert result == expected
+
+
+def test_mutant_which_does_not_compile_is_incompetent(tmpdir_path):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 2 ** -1\n")
+
+    result = mutate_and_test(
+        [MutationSpec(module_path, "core/ReplaceUnaryOperator_USub_Not", 0, (1, 9), (1, 10))],
+        # The tests must not be run, so use a command which would fail.
+        "this-command-does-not-exist",
+        1000,
+    )
+
+    assert result.worker_outcome == WorkerOutcome.NORMAL
+    assert result.test_outcome == TOutcome.INCOMPETENT
+    assert "SyntaxError" in result.output
+    assert "not 1" in result.diff
+    assert module_path.read_text() == "x = 2 ** -1\n"
+
+
+def test_compile_check(tmpdir_path):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 2 ** -1\ny = -1\n")
+    work_items = [
+        WorkItem(
+            mutations=[
+                MutationSpec(module_path, "core/ReplaceUnaryOperator_USub_Not", 0, (line, col), (line, col + 1))
+            ],
+            job_id=job_id,
+        )
+        for job_id, line, col in (("invalid", 1, 9), ("valid", 2, 4))
+    ]
+
+    results = dict(compile_check(work_items))
+
+    assert list(results) == ["invalid"]
+    assert results["invalid"].test_outcome == TOutcome.INCOMPETENT
+
+
+@pytest.mark.parametrize("detect_incompetent", [True, False])
+def test_execute_records_mutants_which_do_not_compile(tmpdir_path, session, monkeypatch, detect_incompetent):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 2 ** -1\n")
+    work_item = WorkItem(
+        mutations=[MutationSpec(module_path, "core/ReplaceUnaryOperator_USub_Not", 0, (1, 9), (1, 10))],
+        job_id="invalid",
+    )
+    config = ConfigDict(
+        {
+            "test-command": f"{sys.executable} -c pass",
+            "timeout": 30,
+            "distributor": {"name": "local"},
+            "detect-incompetent-mutants": detect_incompetent,
+        }
+    )
+    execute_module = importlib.import_module("cosmic_ray.commands.execute")
+    checked = []
+    monkeypatch.setattr(
+        execute_module, "compile_check", lambda work_items: checked.append(work_items) or compile_check(work_items)
+    )
+
+    with use_db(str(session), WorkDB.Mode.create) as work_db:
+        work_db.add_work_item(work_item)
+        execute(work_db, config)
+        results = dict(work_db.results)
+
+    # Without the check in `exec`, the worker finds that the mutant doesn't compile instead.
+    assert bool(checked) == detect_incompetent
+    assert results["invalid"].test_outcome == TOutcome.INCOMPETENT
+
+
+def test_precomputed_edit_is_applied_without_parsing(tmpdir_path, monkeypatch):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 2 ** -1\n")
+    edit = SourceEdit(8, 10, " not 1")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The module shouldn't be parsed")
+
+    monkeypatch.setattr(cosmic_ray.mutating, "get_ast", fail)
+
+    result = mutate_and_test(
+        [MutationSpec(module_path, "core/ReplaceUnaryOperator_USub_Not", 0, (1, 9), (1, 10))],
+        "this-command-does-not-exist",
+        1000,
+        edits=[PrecomputedEdit(source_hash("x = 2 ** -1\n"), edit)],
+    )
+
+    assert result.test_outcome == TOutcome.INCOMPETENT
+    assert "not 1" in result.diff
+    assert module_path.read_text() == "x = 2 ** -1\n"
+
+
+def test_precomputed_edit_for_stale_source_is_not_applied(tmpdir_path):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 2 ** -1\n")
+
+    result = mutate_and_test(
+        [MutationSpec(module_path, "core/ReplaceUnaryOperator_USub_Not", 0, (1, 9), (1, 10))],
+        "this-command-does-not-exist",
+        1000,
+        edits=[PrecomputedEdit(source_hash("x = 3 ** -1\n"), SourceEdit(8, 10, " not 1"))],
+    )
+
+    assert result.worker_outcome == WorkerOutcome.EXCEPTION
+    assert "StaleSourceError" in result.output
+    assert module_path.read_text() == "x = 2 ** -1\n"
+
+
+def test_precomputed_edit_without_mutation(tmpdir_path):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("x = 1\n")
+
+    result = mutate_and_test(
+        [MutationSpec(module_path, "core/ReplaceTrueWithFalse", 0, (0, 0), (0, 1))],
+        "this-command-does-not-exist",
+        1000,
+        edits=[PrecomputedEdit(source_hash("x = 1\n"), None)],
+    )
+
+    assert result.worker_outcome == WorkerOutcome.NO_TEST
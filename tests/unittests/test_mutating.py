@@ -0,0 +1,148 @@
+"Tests for mutation edits and diffs."
+
+import parso
+import pytest
+
+import cosmic_ray.mutating
+from cosmic_ray.mutating import (
+    ModuleCache,
+    ParsedModule,
+    SourceEdit,
+    make_diff,
+    mutate_and_test,
+    mutation_edit,
+    use_module_cache,
+)
+from cosmic_ray.operators.binary_operator_replacement import ReplaceBinaryOperator_Add_Mul
+from cosmic_ray.operators.remove_decorator import RemoveDecorator
+from cosmic_ray.work_item import MutationSpec
+
+
+def _module(num_lines, trailing_newline=True):
+    code = "\n".join(f"x{idx} = a + b" for idx in range(num_lines))
+    return code + "\n" if trailing_newline else code
+
+
+def test_source_edit_apply():
+    assert SourceEdit(4, 5, "*").apply("x = 1 + 2") == "x = * + 2"
+
+
+def test_source_edit_rejects_bad_span():
+    with pytest.raises(ValueError):
+        SourceEdit(5, 4, "")
+
+
+def test_mutation_edit_only_covers_mutated_node():
+    code = _module(100)
+    edit = mutation_edit(code, ReplaceBinaryOperator_Add_Mul(), 50)
+
+    assert edit.end - edit.start < 5
+    assert edit.apply(code) == code.replace("x50 = a + b", "x50 = a * b")
+
+
+def test_mutation_edit_is_none_when_there_is_no_mutation():
+    code = _module(3)
+    assert mutation_edit(code, ReplaceBinaryOperator_Add_Mul(), 10) is None
+
+
+@pytest.mark.parametrize("occurrence", [0, 1, 50, 98, 99])
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_localized_diff_matches_full_diff(occurrence, trailing_newline):
+    code = _module(100, trailing_newline)
+    edit = mutation_edit(code, ReplaceBinaryOperator_Add_Mul(), occurrence)
+    mutated = edit.apply(code)
+
+    assert make_diff(code, mutated, "mod.py", edit) == make_diff(code, mutated, "mod.py")
+
+
+@pytest.mark.parametrize("occurrence", [0, 1, 2])
+def test_localized_diff_of_deletion_matches_full_diff(occurrence):
+    code = "x = 1\n\n@a\n@b\n@c\ndef foo():\n    pass\n\ny = 2\n"
+    edit = mutation_edit(code, RemoveDecorator(), occurrence)
+    mutated = edit.apply(code)
+
+    assert make_diff(code, mutated, "mod.py", edit) == make_diff(code, mutated, "mod.py")
+
+
+_KEY = ("core/ReplaceBinaryOperator_Add_Mul", "{}")
+
+
+@pytest.mark.parametrize("occurrence", [0, 1, 50, 99, 100, -1])
+def test_parsed_module_edit_matches_mutation_edit(occurrence):
+    code = _module(100)
+    module = ParsedModule(code)
+    operator = ReplaceBinaryOperator_Add_Mul()
+
+    # Without a position, the occurrence index is used.
+    assert module.mutation_edit(_KEY, operator, occurrence) == mutation_edit(code, operator, occurrence)
+
+
+def test_parsed_module_checks_occurrence_of_position_match(caplog):
+    code = _module(10)
+    module = ParsedModule(code)
+    operator = ReplaceBinaryOperator_Add_Mul()
+
+    edit = module.mutation_edit(_KEY, operator, 2, (3, 7), (3, 8))
+    assert not caplog.records
+
+    # The position wins, but the mismatch suggests the module has changed.
+    assert module.mutation_edit(_KEY, operator, 5, (3, 7), (3, 8)) == edit
+    assert "isn't occurrence 5" in caplog.text
+
+
+def test_parsed_module_only_indexes_occurrences_once(monkeypatch):
+    module = ParsedModule(_module(10))
+    operator = ReplaceBinaryOperator_Add_Mul()
+    calls = []
+    mutation_positions = operator.mutation_positions
+    monkeypatch.setattr(operator, "mutation_positions", lambda node: calls.append(node) or mutation_positions(node))
+
+    module.mutation_edit(_KEY, operator, 3)
+    num_calls = len(calls)
+    module.mutation_edit(_KEY, operator, 7)
+
+    assert num_calls > 0
+    assert len(calls) == num_calls
+
+
+def test_module_cache_is_keyed_by_source():
+    cache = ModuleCache()
+
+    module = cache.get(_module(3))
+    assert cache.get(_module(3)) is module
+    assert cache.get(_module(4)) is not module
+
+
+def test_module_cache_evicts_least_recently_used():
+    cache = ModuleCache(max_modules=2)
+    first, second = cache.get(_module(1)), cache.get(_module(2))
+
+    assert cache.get(_module(1)) is first
+    cache.get(_module(3))
+
+    assert cache.get(_module(1)) is first
+    assert cache.get(_module(2)) is not second
+
+
+def test_mutate_and_test_uses_module_cache(tmpdir_path, monkeypatch):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text(_module(10))
+    parses = []
+    monkeypatch.setattr(cosmic_ray.mutating, "get_ast", lambda source: parses.append(source) or parso.parse(source))
+
+    use_module_cache(ModuleCache())
+    try:
+        results = [
+            mutate_and_test(
+                [MutationSpec(module_path, "core/ReplaceBinaryOperator_Add_Mul", occurrence, (0, 0), (0, 1))],
+                "true",
+                1000,
+            )
+            for occurrence in range(3)
+        ]
+    finally:
+        use_module_cache(None)
+
+    assert len(parses) == 1
+    assert [result.diff.count("a * b") for result in results] == [1, 1, 1]
+    assert module_path.read_text() == _module(10)
@@ -0,0 +1,107 @@
+"Tests for the on-disk parse cache."
+
+import os
+
+import pytest
+
+from cosmic_ray.ast import get_ast, parse_cache, use_parse_cache
+from cosmic_ray.ast.cache import ParseCache, cache_key
+
+SOURCE = "def foo(x):\n    return x + 1\n"
+
+
+@pytest.fixture
+def cache(tmpdir_path):
+    return ParseCache(tmpdir_path / "cache")
+
+
+def test_miss_returns_none(cache):
+    assert cache.get(SOURCE) is None
+
+
+def test_parse_stores_tree(cache):
+    tree = cache.parse(SOURCE)
+    cached = cache.get(SOURCE)
+
+    assert cached is not tree
+    assert cached.get_code() == tree.get_code() == SOURCE
+
+
+def test_cached_trees_are_independent(cache):
+    cache.parse(SOURCE)
+    first = cache.get(SOURCE)
+    first.children = []
+
+    assert cache.get(SOURCE).get_code() == SOURCE
+
+
+def test_key_depends_on_source():
+    assert cache_key(SOURCE) == cache_key(SOURCE)
+    assert cache_key(SOURCE) != cache_key(SOURCE + "\n")
+
+
+def test_corrupt_entries_are_discarded(cache):
+    cache.parse(SOURCE)
+    (entry,) = cache.directory.iterdir()
+    entry.write_bytes(b"not a pickle")
+
+    assert cache.get(SOURCE) is None
+    assert not entry.exists()
+
+
+def test_eviction_bounds_size(tmpdir_path):
+    cache = ParseCache(tmpdir_path / "cache", max_size=0)
+    cache.parse(SOURCE)
+
+    assert not list(cache.directory.iterdir())
+
+
+def test_eviction_removes_least_recently_used(tmpdir_path):
+    sources = [f"x = {idx}\n" for idx in range(3)]
+    cache = ParseCache(tmpdir_path / "cache")
+    for idx, source in enumerate(sources):
+        cache.parse(source)
+        os.utime(cache.directory / f"{cache_key(source)}.tree", (idx, idx))
+
+    entry_size = max(path.stat().st_size for path in cache.directory.iterdir())
+    bounded = ParseCache(cache.directory, max_size=2 * entry_size)
+    bounded.evict()
+
+    assert bounded.get(sources[0]) is None
+    assert bounded.get(sources[2]) is not None
+
+
+def test_get_ast_uses_installed_cache(cache):
+    previous = parse_cache()
+    use_parse_cache(cache)
+    try:
+        get_ast(SOURCE)
+    finally:
+        use_parse_cache(previous)
+
+    assert cache.get(SOURCE) is not None
+
+
+def test_put_does_not_scan_directory_on_every_write(cache, monkeypatch):
+    scans = []
+    entries = ParseCache._entries  # pylint: disable=protected-access
+    monkeypatch.setattr(ParseCache, "_entries", lambda self: scans.append(self) or entries(self))
+
+    for idx in range(10):
+        cache.parse(f"x = {idx}\n")
+
+    assert len(scans) == 1
+
+
+def test_eviction_leaves_room_below_limit(tmpdir_path):
+    sources = [f"x = {idx}\n" for idx in range(10)]
+    sizing = ParseCache(tmpdir_path / "sizing")
+    sizing.parse(sources[0])
+    (entry,) = sizing.directory.iterdir()
+    cache = ParseCache(tmpdir_path / "cache", max_size=5 * entry.stat().st_size)
+    for source in sources:
+        cache.parse(source)
+
+    total = sum(path.stat().st_size for path in cache.directory.iterdir())
+    assert total <= cache.max_size
+    assert cache.get(sources[-1]) is not None
@@ -0,0 +1,146 @@
+"Tests for sampling the mutants of a session."
+
+import random
+import sys
+
+import pytest
+
+from cosmic_ray.commands import execute
+from cosmic_ray.config import ConfigDict
+from cosmic_ray.sampling import MIN_SAMPLE_SIZE, RateTracker, run_until, stratified_order
+from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+
+def _work_items(module_path, operator_name, count):
+    return [
+        WorkItem(
+            mutations=[MutationSpec(module_path, operator_name, index, (index + 1, 0), (index + 1, 1))],
+            job_id=f"{module_path}-{operator_name}-{index}",
+        )
+        for index in range(count)
+    ]
+
+
+def _result(test_outcome):
+    return WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=test_outcome)
+
+
+def test_stratified_order_is_a_permutation():
+    work_items = _work_items("a.py", "op", 10) + _work_items("b.py", "op", 20)
+    ordered = stratified_order(work_items, random.Random(0))
+    assert sorted(ordered, key=lambda item: item.job_id) == sorted(work_items, key=lambda item: item.job_id)
+
+
+def test_stratified_order_is_proportional():
+    small = _work_items("a.py", "op", 10)
+    large = _work_items("a.py", "other-op", 90)
+    ordered = stratified_order(large + small, random.Random(0))
+
+    small_ids = {work_item.job_id for work_item in small}
+    num_small = 0
+    for index, work_item in enumerate(ordered, start=1):
+        num_small += work_item.job_id in small_ids
+        assert abs(num_small - index / 10) <= 1
+
+
+def test_sample_stops_when_interval_is_narrow_enough():
+    work_items = _work_items("a.py", "op", 1000)
+    tracker = RateTracker(len(work_items), 0, 0)
+
+    num_run = 0
+    for index, _ in enumerate(run_until(work_items, tracker, lambda: 2 * tracker.interval(1.96) < 20)):
+        tracker.add(_result(TOutcome.SURVIVED if index % 4 == 0 else TOutcome.KILLED))
+        num_run += 1
+
+    assert MIN_SAMPLE_SIZE <= num_run < len(work_items)
+    assert 2 * tracker.interval(1.96) < 20
+    assert abs(tracker.rate - 25) < 5
+
+
+def test_sample_runs_everything_if_interval_stays_wide():
+    work_items = _work_items("a.py", "op", 50)
+    tracker = RateTracker(len(work_items), 0, 0)
+
+    num_run = 0
+    for index, _ in enumerate(run_until(work_items, tracker, lambda: 2 * tracker.interval(1.96) < 0.001)):
+        tracker.add(_result(TOutcome.SURVIVED if index % 2 else TOutcome.KILLED))
+        num_run += 1
+
+    assert num_run == len(work_items)
+
+
+def test_sample_does_not_stop_when_all_results_agree():
+    work_items = _work_items("a.py", "op", 1000)
+    tracker = RateTracker(len(work_items), 0, 0)
+
+    num_run = 0
+    for _ in run_until(work_items, tracker, lambda: 2 * tracker.interval(1.96) < 5):
+        tracker.add(_result(TOutcome.KILLED))
+        num_run += 1
+
+    # With no survivors at all, the interval is roughly [0, 3.84 / n], so it takes more than 30 results to narrow it.
+    assert num_run > MIN_SAMPLE_SIZE
+    assert tracker.rate == 0
+    assert 0 < 2 * tracker.interval(1.96) < 5
+
+
+def test_exceeds():
+    assert RateTracker(1000, 100, 10).exceeds(50, 1.96) is True
+    assert RateTracker(1000, 100, 90).exceeds(50, 1.96) is False
+    assert RateTracker(1000, 100, 50).exceeds(50, 1.96) is None
+    assert RateTracker(100, 100, 50).exceeds(50, 1.96) is False
+    # Every result so far survived, but that's not yet enough to say the rate is above 95%.
+    assert RateTracker(1000, 30, 0).exceeds(95, 1.96) is None
+
+
+def test_execute_stops_once_fail_over_verdict_is_known(tmpdir_path, session):
+    module_path = tmpdir_path / "mod.py"
+    module_path.write_text("".join(f"x{index} = 1 + 2\n" for index in range(100)))
+    config = ConfigDict(
+        {
+            # Every mutant survives.
+            "test-command": f"{sys.executable} -c pass",
+            "timeout": 30,
+            "distributor": {"name": "local"},
+        }
+    )
+
+    with use_db(str(session), WorkDB.Mode.create) as work_db:
+        for index in range(100):
+            work_db.add_work_item(
+                WorkItem(
+                    mutations=[
+                        MutationSpec(
+                            module_path, "core/ReplaceBinaryOperator_Add_Sub", 0, (index + 1, 7), (index + 1, 8)
+                        )
+                    ],
+                    job_id=str(index),
+                )
+            )
+
+        tracker = execute(work_db, config, fail_over=50)
+        results = [result for _, result in work_db.results]
+        num_pending = len(work_db.pending_work_items)
+
+    assert tracker.exceeds(50, 1.96)
+    assert len(results) == tracker.num_results < 100
+    assert num_pending == 100 - len(results)
+    assert not any(result.worker_outcome == WorkerOutcome.SKIPPED for result in results)
+
+
+def test_sampling_is_not_combined_with_schemata(session):
+    config = ConfigDict(
+        {
+            "test-command": f"{sys.executable} -c pass",
+            "timeout": 30,
+            "distributor": {"name": "local", "local": {"schemata": True}},
+        }
+    )
+
+    with use_db(str(session), WorkDB.Mode.create) as work_db:
+        with pytest.raises(ValueError):
+            execute(work_db, config, sample_width=10)
+        with pytest.raises(ValueError):
+            execute(work_db, config, fail_over=50)
@@ -0,0 +1,186 @@
+"Tests for scheduling pending work."
+
+import random
+
+import pytest
+
+from cosmic_ray.config import ConfigDict, ConfigValueError
+from cosmic_ray.cost import CostModel
+from cosmic_ray.scheduling import LongestFirst, ModuleAffinity, schedule, work_queue
+from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+
+def _work_item(job_id, definition_name):
+    return WorkItem.single(
+        job_id, MutationSpec("mod.py", "core/NumberReplacer", 0, (1, 0), (1, 1), definition_name=definition_name)
+    )
+
+
+def _result(duration):
+    return WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.KILLED, duration=duration)
+
+
+def test_longest_first_uses_recorded_durations():
+    model = CostModel()
+    model.add(_work_item("a", "slow"), 10.0)
+    model.add(_work_item("b", "fast"), 1.0)
+    work_items = [_work_item("fast-1", "fast"), _work_item("slow-1", "slow"), _work_item("fast-2", "fast")]
+
+    assert [item.job_id for item in LongestFirst(work_items, model)][0] == "slow-1"
+
+
+def test_longest_first_updates_estimates_as_results_arrive():
+    model = CostModel()
+    model.add(_work_item("a", "f"), 2.0)
+    model.add(_work_item("b", "g"), 1.5)
+    work_items = [_work_item(f"{definition}-{index}", definition) for definition in ("f", "g") for index in range(2)]
+    scheduler = LongestFirst(work_items, model)
+    order = iter(scheduler)
+
+    first = next(order)
+    assert first.mutations[0].definition_name == "f"
+
+    # f turns out to be quicker than expected, so g is now the longest.
+    scheduler.record(first.job_id, _result(0.0))
+    assert [item.mutations[0].definition_name for item in order] == ["g", "g", "f"]
+
+
+def test_longest_first_estimates_new_modules_from_all_durations():
+    model = CostModel()
+    model.add(WorkItem.single("a", MutationSpec("a.py", "op", 0, (1, 0), (1, 1), definition_name="f")), 1.0)
+    model.add(WorkItem.single("c", MutationSpec("c.py", "op", 0, (1, 0), (1, 1), definition_name="h")), 9.0)
+    work_items = [
+        WorkItem.single(
+            f"{module}-{index}", MutationSpec(f"{module}.py", "op", index, (1, 0), (1, 1), definition_name="f")
+        )
+        for module in ("a", "b")
+        for index in range(2)
+    ]
+    scheduler = LongestFirst(work_items, model)
+    order = iter(scheduler)
+
+    # There are no durations for b.py, so it's estimated from the mean of all of them.
+    first = next(order)
+    assert first.job_id.startswith("b-")
+
+    scheduler.record(first.job_id, _result(0.0))
+    assert [item.job_id[0] for item in order] == ["a", "a", "b"]
+
+
+def test_longest_first_matches_exhaustive_search():
+    rng = random.Random(0)
+    work_items = [
+        WorkItem.single(
+            str(index),
+            MutationSpec(
+                f"{rng.choice('abcd')}.py",
+                rng.choice(["op1", "op2"]),
+                index,
+                (1, 0),
+                (1, 1),
+                definition_name=rng.choice("fgh"),
+            ),
+        )
+        for index in range(200)
+    ]
+    model = CostModel()
+    model.add(work_items[0], 1.0)
+    reference = CostModel()
+    reference.add(work_items[0], 1.0)
+    remaining = {work_item.job_id: work_item for work_item in work_items}
+
+    scheduler = LongestFirst(work_items, model)
+    for work_item in scheduler:
+        assert reference.estimate(work_item) == max(map(reference.estimate, remaining.values()))
+        del remaining[work_item.job_id]
+        duration = rng.uniform(0, 10)
+        scheduler.record(work_item.job_id, _result(duration))
+        reference.add(work_item, duration)
+
+    assert not remaining
+
+
+def _module_items(**counts):
+    return [
+        WorkItem.single(f"{module}-{index}", MutationSpec(f"{module}.py", "core/NumberReplacer", index, (1, 0), (1, 1)))
+        for module, count in counts.items()
+        for index in range(count)
+    ]
+
+
+def _modules(work_items):
+    return [str(work_item.mutations[0].module_path) for work_item in work_items]
+
+
+def test_module_affinity_gives_each_worker_one_module():
+    work = ModuleAffinity(_module_items(a=3, b=4, c=1))
+
+    first = [work.take("w1") for _ in range(4)]
+    second = [work.take("w2") for _ in range(3)]
+
+    assert _modules(first) == ["b.py"] * 4
+    assert _modules(second) == ["a.py"] * 3
+    assert _modules([work.take("w1")]) == ["c.py"]
+    assert work.take("w1") is None
+
+
+def test_module_affinity_steals_half_of_the_largest_remaining_work():
+    work = ModuleAffinity(_module_items(a=6, b=1))
+    assert _modules([work.take("w1"), work.take("w2")]) == ["a.py", "b.py"]
+
+    # w2 has run out, and there are no more modules, so it takes half of what w1 has left.
+    stolen = [work.take("w2") for _ in range(3)]
+    assert [item.job_id for item in stolen] == ["a-3", "a-4", "a-5"]
+    assert [work.take("w1").job_id for _ in range(2)] == ["a-1", "a-2"]
+    assert work.take("w1") is None
+    assert work.take("w2") is None
+
+
+def test_module_affinity_iterates_module_by_module():
+    work_items = _module_items(a=2, b=3)
+
+    assert _modules(ModuleAffinity(reversed(work_items))) == ["b.py"] * 3 + ["a.py"] * 2
+
+
+def test_work_queue_takes_work_in_order():
+    work_items = _module_items(a=2, b=1)
+    work = work_queue(iter(work_items))
+
+    assert [work.take("w1"), work.take("w2"), work.take("w1"), work.take("w2")] == work_items + [None]
+
+
+def test_pending_does_not_take_work():
+    work = ModuleAffinity(_module_items(a=1, b=1))
+    assert work.pending()
+    assert [work.take("w1"), work.take("w2")] == _module_items(a=1, b=1)[::-1]
+    assert not work.pending()
+
+    model = CostModel()
+    scheduler = LongestFirst([_work_item("a", "f")], model)
+    assert work_queue(scheduler).pending()
+    assert [item.job_id for item in scheduler] == ["a"]
+    assert not work_queue(scheduler).pending()
+
+    work_items = _module_items(a=2)
+    queue = work_queue(item for item in work_items)
+    assert queue.pending()
+    assert [queue.take("w1"), queue.take("w1")] == work_items
+    assert not queue.pending()
+    assert queue.take("w1") is None
+
+
+def test_schedule_defaults_to_given_order():
+    work_items = [_work_item(str(index), None) for index in range(3)]
+
+    with use_db(":memory:", WorkDB.Mode.create) as work_db:
+        ordered, record = schedule(work_db, work_items, ConfigDict())
+
+    assert ordered == work_items
+    assert record is None
+
+
+def test_unknown_schedule():
+    with pytest.raises(ConfigValueError):
+        ConfigDict({"schedule": "shortest-first"}).schedule
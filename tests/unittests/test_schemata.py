@@ -0,0 +1,112 @@
+"Tests for mutant schemata."
+
+import os
+import sys
+
+import pytest
+
+from cosmic_ray.mutating import SourceEdit, mutation_edit
+from cosmic_ray.operators.binary_operator_replacement import ReplaceBinaryOperator_Add_Mul
+from cosmic_ray.schemata import ACTIVE_MUTANT_VAR, build_schema
+from cosmic_ray.testing import run_tests
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+SOURCE = '''"""A module."""
+from __future__ import annotations
+
+TEXT = """a + b
+    c + d"""
+
+
+class Thing:
+    def calc(self, a, b):
+        if a + b > 10:
+            return a + b
+        return (a +
+                b)
+
+
+def calc(a): return a + 1
+'''
+
+
+def _edits(source, operator=ReplaceBinaryOperator_Add_Mul()):
+    edits = {}
+    while True:
+        edit = mutation_edit(source, operator, len(edits))
+        if edit is None:
+            return edits
+        edits[f"mutant-{len(edits)}"] = edit
+
+
+def _run(source, active, monkeypatch):
+    if active is None:
+        monkeypatch.delenv(ACTIVE_MUTANT_VAR, raising=False)
+    else:
+        monkeypatch.setenv(ACTIVE_MUTANT_VAR, active)
+    namespace = {}
+    exec(compile(source, "<test>", "exec"), namespace)  # pylint: disable=exec-used
+    return namespace["TEXT"], namespace["Thing"]().calc(3, 4), namespace["Thing"]().calc(5, 6), namespace["calc"](2)
+
+
+def test_all_mutants_are_guarded():
+    edits = _edits(SOURCE)
+    _, guarded = build_schema(SOURCE, edits)
+    assert guarded == set(edits)
+
+
+def test_schema_without_active_mutant_is_original(monkeypatch):
+    schema, _ = build_schema(SOURCE, _edits(SOURCE))
+    assert _run(schema, None, monkeypatch) == _run(SOURCE, None, monkeypatch)
+
+
+def test_active_mutant_matches_mutated_source(monkeypatch):
+    edits = _edits(SOURCE)
+    schema, _ = build_schema(SOURCE, edits)
+
+    for key, edit in edits.items():
+        assert _run(schema, key, monkeypatch) == _run(edit.apply(SOURCE), None, monkeypatch)
+
+
+def test_switch_comes_after_docstring_and_future_imports():
+    schema, _ = build_schema(SOURCE, _edits(SOURCE))
+    lines = schema.splitlines()
+    assert lines[1] == "from __future__ import annotations"
+    assert ACTIVE_MUTANT_VAR in lines[2]
+
+
+def test_tab_indentation(monkeypatch):
+    source = "class Thing:\n\tdef calc(self, a, b):\n\t\treturn a + b\n\nTEXT = calc = None\n"
+    edits = _edits(source)
+    schema, guarded = build_schema(source, edits)
+
+    assert guarded == set(edits)
+    monkeypatch.setenv(ACTIVE_MUTANT_VAR, "mutant-0")
+    namespace = {}
+    exec(compile(schema, "<test>", "exec"), namespace)  # pylint: disable=exec-used
+    assert namespace["Thing"]().calc(3, 4) == 12
+
+
+def test_invalid_mutants_are_not_guarded():
+    source = "x = 1 + 2\ny = 3 + 4\n"
+    edits = _edits(source)
+    edits["broken"] = SourceEdit(source.index("3"), source.index("3") + 1, "(")
+
+    schema, guarded = build_schema(source, edits)
+
+    assert guarded == set(edits) - {"broken"}
+    compile(schema, "<test>", "exec")
+
+
+@pytest.mark.parametrize("source", ["", "x = 1\n"])
+def test_no_mutants(source):
+    assert build_schema(source, {}) == (source, frozenset())
+
+
+def test_run_tests_passes_active_mutant(monkeypatch):
+    monkeypatch.delenv(ACTIVE_MUTANT_VAR, raising=False)
+    command = f"{sys.executable} -c \"import os, sys; sys.exit(os.environ['{ACTIVE_MUTANT_VAR}'] != 'abc')\""
+
+    assert run_tests(command, 30, mutant="abc")[0] == TOutcome.SURVIVED
+    assert run_tests(command, 30, mutant="xyz")[0] == TOutcome.KILLED
+    assert ACTIVE_MUTANT_VAR not in os.environ
@@ -0,0 +1,97 @@
+"Tests for sharding and merging sessions."
+
+import pytest
+
+from cosmic_ray.bundle import Bundle
+from cosmic_ray.commands import merge, shard, shard_paths
+from cosmic_ray.commands.shard import assign_shards
+from cosmic_ray.cost import DEFAULT_COST, CostModel
+from cosmic_ray.work_db import ConflictingResultsError, WorkDB, use_db
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+
+def _work_item(job_id, module_path="a.py", operator="core/NumberReplacer"):
+    return WorkItem.single(job_id, MutationSpec(module_path, operator, 0, (1, 0), (1, 1)))
+
+
+def _result(duration=None, test_outcome=TOutcome.KILLED):
+    return WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=test_outcome, duration=duration)
+
+
+def test_cost_model_falls_back_to_coarser_estimates():
+    model = CostModel.from_results(
+        [
+            (_work_item("1", "a.py", "op1"), _result(1.0)),
+            (_work_item("2", "a.py", "op1"), _result(3.0)),
+            (_work_item("3", "a.py", "op2"), _result(8.0)),
+            (_work_item("4", "b.py", "op1"), _result(None)),
+        ]
+    )
+
+    assert model.num_durations == 3
+    assert model.estimate(_work_item("x", "a.py", "op1")) == 2.0
+    assert model.estimate(_work_item("x", "a.py", "op3")) == 4.0
+    assert model.estimate(_work_item("x", "c.py", "op1")) == 4.0
+    assert CostModel().estimate(_work_item("x")) == DEFAULT_COST
+
+
+def test_assign_shards_balances_cost():
+    model = CostModel()
+    model.add(_work_item("slow", "slow.py"), 10.0)
+    model.add(_work_item("fast", "fast.py"), 1.0)
+    work_items = [_work_item(f"slow-{i}", "slow.py") for i in range(3)] + [
+        _work_item(f"fast-{i}", "fast.py") for i in range(20)
+    ]
+
+    shards = assign_shards(work_items, 2, model)
+
+    assert sorted(len(items) for items in shards) == [7, 16]
+    assert [sum(model.estimate(item) for item in items) for items in shards] == [25.0, 25.0]
+
+
+def test_shard_paths(tmpdir_path):
+    assert shard_paths(tmpdir_path / "session.sqlite", 2) == [
+        tmpdir_path / "session-shard-1-of-2.sqlite",
+        tmpdir_path / "session-shard-2-of-2.sqlite",
+    ]
+
+
+@pytest.fixture
+def session(tmpdir_path):
+    with use_db(tmpdir_path / "session.sqlite") as work_db:
+        work_db.add_work_items(_work_item(f"job-{i}") for i in range(10))
+        work_db.set_result("job-0", _result(1.0))
+        work_db.set_bundle(Bundle({"a.py": "1234"}, {"1234": b"data"}))
+        yield work_db
+
+
+def test_shard_and_merge(session, tmpdir_path):
+    paths = shard_paths(tmpdir_path / "session.sqlite", 3)
+
+    costs = shard(session, paths)
+
+    assert costs == [3.0, 3.0, 3.0]
+    job_ids = []
+    for path in paths:
+        with use_db(path, WorkDB.Mode.open) as shard_db:
+            assert shard_db.bundle == session.bundle
+            for work_item in shard_db.pending_work_items:
+                job_ids.append(work_item.job_id)
+                shard_db.set_result(work_item.job_id, _result(1.0))
+    assert sorted(job_ids) == [f"job-{i}" for i in range(1, 10)]
+
+    assert merge(session, paths) == 9
+    assert not session.pending_work_items
+
+
+def test_merge_detects_conflicts(session, tmpdir_path):
+    paths = shard_paths(tmpdir_path / "session.sqlite", 2)
+    shard(session, paths)
+    with use_db(paths[0], WorkDB.Mode.open) as shard_db:
+        work_item = shard_db.pending_work_items[0]
+        shard_db.set_result(work_item.job_id, _result(test_outcome=TOutcome.SURVIVED))
+    session.set_result(work_item.job_id, _result())
+
+    with pytest.raises(ConflictingResultsError):
+        merge(session, paths)
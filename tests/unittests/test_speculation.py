@@ -0,0 +1,119 @@
+"Tests for speculative re-execution of running jobs."
+
+import asyncio
+import time
+
+import cosmic_ray.distribution.http
+import cosmic_ray.distribution.local
+from cosmic_ray.distribution.http import HttpDistributor
+from cosmic_ray.distribution.speculation import Speculation
+from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+
+
+def _work_item(job_id):
+    return WorkItem.single(job_id, MutationSpec(f"{job_id}.py", "core/NumberReplacer", 0, (1, 0), (1, 1)))
+
+
+def _killed():
+    return WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.KILLED)
+
+
+def test_oldest_jobs_are_candidates_first():
+    speculation = Speculation()
+    first, second = _work_item("first"), _work_item("second")
+    speculation.started(first)
+    speculation.started(second)
+
+    assert speculation.candidates() == [first, second]
+
+    speculation.started(first)
+    assert speculation.candidates() == [second]
+
+
+def test_jobs_are_candidates_once_old_enough():
+    speculation = Speculation(min_age=60)
+    speculation.started(_work_item("job"))
+
+    assert speculation.candidates() == []
+    assert 0 < speculation.delay() <= 60
+
+
+def test_first_result_is_kept():
+    speculation = Speculation()
+    work_item = _work_item("job")
+    speculation.started(work_item)
+    speculation.started(work_item)
+
+    result = speculation.finished("job", _killed())
+    assert result == _killed()
+    assert result.attempts == 2
+    assert speculation.finished("job", WorkResult(worker_outcome=WorkerOutcome.NORMAL)) is None
+
+
+def test_abnormal_result_waits_for_other_attempts():
+    speculation = Speculation()
+    work_item = _work_item("job")
+    speculation.started(work_item)
+    speculation.started(work_item)
+
+    assert speculation.finished("job", WorkResult(worker_outcome=WorkerOutcome.ABNORMAL)) is None
+    assert speculation.finished("job", _killed()) == _killed()
+
+
+def test_local_slots_run_stragglers_again(monkeypatch):
+    attempts = []
+
+    def mutate_and_test(mutations, test_command, timeout, workspace, cancellation):
+        job = str(mutations[0].module_path)
+        attempts.append(job)
+        if job == "slow.py" and attempts.count(job) == 1:
+            # The first attempt at the slow job hangs until it's cancelled.
+            deadline = time.monotonic() + 30
+            while not cancellation.cancelled and time.monotonic() < deadline:
+                time.sleep(0.01)
+            return WorkResult(
+                worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.INCOMPETENT, output="cancelled"
+            )
+        return _killed()
+
+    monkeypatch.setattr(cosmic_ray.distribution.local, "mutate_and_test", mutate_and_test)
+    results = {}
+    cosmic_ray.distribution.local._run_in_slots(
+        ["slot-1", "slot-2"],
+        [_work_item("slow"), _work_item("fast")],
+        "true",
+        10,
+        lambda job_id, result: results.setdefault(job_id, result),
+        Speculation(),
+    )
+
+    assert results == {"slow": _killed(), "fast": _killed()}
+    assert results["slow"].attempts == 2
+    assert attempts.count("slow.py") == 2
+
+
+def test_http_runs_stragglers_again_on_another_worker(monkeypatch):
+    requests = []
+
+    async def send_request(url, work_item, test_command, timeout, edits=None):
+        requests.append((url, work_item.job_id))
+        if work_item.job_id == "slow" and url == requests[0][0]:
+            await asyncio.sleep(30)
+        return _killed()
+
+    monkeypatch.setattr(cosmic_ray.distribution.http, "send_request", send_request)
+    results = {}
+    start = time.monotonic()
+    HttpDistributor()(
+        [_work_item("slow"), _work_item("fast")],
+        "true",
+        10,
+        {"worker-urls": ["http://a", "http://b"], "speculate": True},
+        lambda job_id, result: results.setdefault(job_id, result),
+    )
+
+    assert time.monotonic() - start < 20
+    assert results == {"slow": _killed(), "fast": _killed()}
+    assert results["slow"].attempts == 2
+    assert len({url for url, job_id in requests if job_id == "slow"}) == 2
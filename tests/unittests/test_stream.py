@@ -0,0 +1,92 @@
+import asyncio
+import sys
+
+import pytest
+
+from cosmic_ray.distribution.stream import StreamDistributor, read_frame, write_frame
+from cosmic_ray.scheduling import ModuleAffinity
+from cosmic_ray.work_item import MutationSpec, WorkItem
+
+
+class _Writer:
+    "Just enough of an `asyncio.StreamWriter` for `write_frame`."
+
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+
+def _reader(data, eof=True):
+    reader = asyncio.StreamReader()
+    reader.feed_data(data)
+    if eof:
+        reader.feed_eof()
+    return reader
+
+
+def _frames(*messages):
+    writer = _Writer()
+    for message in messages:
+        write_frame(writer, message)
+    return writer.data
+
+
+def test_frames_round_trip():
+    messages = [{"slots": 4}, {"id": 1, "output": "café\n" * 1000}, []]
+
+    async def read_all():
+        reader = _reader(_frames(*messages))
+        return [await read_frame(reader) for _ in range(len(messages) + 1)]
+
+    assert asyncio.run(read_all()) == messages + [None]
+
+
+def test_frame_is_length_prefixed():
+    assert _frames({}) == b"\x00\x00\x00\x02{}"
+
+
+def test_truncated_frame_raises_error():
+    async def read():
+        return await read_frame(_reader(_frames({"id": 1})[:-1]))
+
+    with pytest.raises(asyncio.IncompleteReadError):
+        asyncio.run(read())
+
+
+def test_truncated_header_raises_error():
+    async def read():
+        return await read_frame(_reader(b"\x00\x00"))
+
+    with pytest.raises(asyncio.IncompleteReadError):
+        asyncio.run(read())
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Needs Unix domain sockets")
+def test_distributor_notices_workers_closing_without_jobs(tmp_path):
+    async def hello_and_close(reader, writer):  # pylint: disable=unused-argument
+        # With no slots, the worker is never sent a job, so its closing doesn't produce any results.
+        write_frame(writer, {"slots": 0})
+        await writer.drain()
+        writer.close()
+
+    work_items = [WorkItem.single("job", MutationSpec("mod.py", "op", 0, (1, 0), (1, 1)))]
+    work = ModuleAffinity(work_items)
+
+    async def distribute():
+        address = str(tmp_path / "worker.sock")
+        server = await asyncio.start_unix_server(hello_and_close, address)
+        async with server:
+            distributor = StreamDistributor()
+            await asyncio.wait_for(
+                distributor._process(  # pylint: disable=protected-access
+                    work, "true", 10, {"worker-addresses": [address]}, lambda *args: None
+                ),
+                timeout=10,
+            )
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(distribute())
+    # Finding out whether there was work left didn't take any.
+    assert list(work) == work_items
@@ -1,8 +1,11 @@
 "Tests for the WorkDB"
 
+import sqlite3
+
 import pytest
 
-from cosmic_ray.work_db import WorkDB, use_db
+from cosmic_ray.bundle import Bundle
+from cosmic_ray.work_db import ConflictingResultsError, Lease, WorkDB, use_db
 from cosmic_ray.work_item import MutationSpec, WorkItem, WorkResult, WorkerOutcome
 from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
 
@@ -198,3 +201,149 @@ def test_adding_result_completes_work_item(work_db):
             ),
         )
         work_db.set_result(*result)
+
+
+def test_bundle(work_db):
+    assert work_db.bundle is None
+
+    bundle = Bundle({"a.py": "1234", "b/c.py": "1234"}, {"1234": b"data"}, {"b/c.py"})
+    work_db.set_bundle(bundle)
+    assert work_db.bundle == bundle
+
+    work_db.set_bundle(None)
+    assert work_db.bundle is None
+
+
+def _add_items(work_db, count):
+    work_db.add_work_items(
+        WorkItem.single(f"job-{index}", MutationSpec("path", "operator", index, (1, 0), (1, 1)))
+        for index in range(count)
+    )
+
+
+def test_claims_are_disjoint(work_db):
+    _add_items(work_db, 25)
+    first, second = Lease(batch_size=10), Lease(batch_size=10)
+
+    claims = [work_db.claim_work_items(lease) for lease in (first, second, first, second)]
+
+    assert [len(claim) for claim in claims] == [10, 10, 5, 0]
+    job_ids = [item.job_id for claim in claims for item in claim]
+    assert sorted(job_ids) == sorted(f"job-{index}" for index in range(25))
+
+
+def test_completed_work_is_not_claimed(work_db):
+    _add_items(work_db, 3)
+    work_db.set_result("job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL))
+
+    claimed = work_db.claim_work_items(Lease())
+
+    assert sorted(item.job_id for item in claimed) == ["job-1", "job-2"]
+
+
+def test_expired_leases_are_claimed_again(work_db):
+    _add_items(work_db, 3)
+    expired = Lease(duration=-1)
+    assert len(work_db.claim_work_items(expired)) == 3
+
+    other = Lease()
+    assert len(work_db.claim_work_items(other)) == 3
+
+    # The original holder's results are no longer accepted.
+    assert not work_db.set_leased_result(expired, "job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL))
+    assert work_db.set_leased_result(other, "job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL))
+    assert work_db.num_results == 1
+
+
+def test_expired_lease_still_counts_until_claimed(work_db):
+    _add_items(work_db, 1)
+    expired = Lease(duration=-1)
+    work_db.claim_work_items(expired)
+
+    assert work_db.set_leased_result(expired, "job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL))
+    # The lease is released along with the result.
+    assert not work_db.set_leased_result(expired, "job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL))
+
+
+def test_renewed_leases_are_not_claimed(work_db):
+    _add_items(work_db, 2)
+    lease = Lease(duration=-1)
+    work_db.claim_work_items(lease)
+
+    work_db.renew_leases(Lease(holder=lease.holder, duration=600))
+
+    assert not work_db.claim_work_items(Lease())
+
+
+def test_released_leases_can_be_claimed(work_db):
+    _add_items(work_db, 2)
+    lease = Lease()
+    work_db.claim_work_items(lease)
+
+    work_db.release_leases(lease)
+
+    assert len(work_db.claim_work_items(Lease())) == 2
+
+
+def test_duration_round_trip(work_db):
+    work_db.add_work_item(WorkItem.single("job_id", MutationSpec("path", "operator", 0, (0, 0), (0, 1))))
+    work_db.set_result(
+        "job_id", WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.KILLED, duration=1.5)
+    )
+
+    ((_, result),) = work_db.results
+    assert result.duration == 1.5
+
+
+def test_missing_columns_are_added(tmpdir_path):
+    path = tmpdir_path / "old.sqlite"
+    with use_db(path) as db:
+        _add_items(db, 1)
+        db.set_result("job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.KILLED))
+    with sqlite3.connect(str(path)) as connection:
+        connection.execute("ALTER TABLE work_results DROP COLUMN duration")
+
+    with use_db(path, WorkDB.Mode.open) as db:
+        ((_, result),) = db.results
+        assert result.duration is None
+
+
+def _killed(duration=None):
+    return WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.KILLED, duration=duration)
+
+
+@pytest.fixture
+def other_db_path(tmpdir_path):
+    return tmpdir_path / "other.sqlite"
+
+
+def test_merge_results(work_db, other_db_path):
+    _add_items(work_db, 3)
+    work_db.set_result("job-0", _killed())
+    with use_db(other_db_path) as other:
+        _add_items(other, 3)
+        other.set_result("job-0", _killed())
+        other.set_result("job-1", _killed(2.0))
+
+    assert work_db.merge_results(other_db_path) == 1
+    assert dict(work_db.results) == {"job-0": _killed(), "job-1": _killed()}
+    assert dict(work_db.results)["job-1"].duration == 2.0
+
+    assert work_db.merge_results(other_db_path) == 0
+
+
+def test_merge_conflicting_results(work_db, other_db_path):
+    _add_items(work_db, 2)
+    work_db.set_result("job-0", _killed())
+    with use_db(other_db_path) as other:
+        _add_items(other, 3)
+        other.set_result("job-0", WorkResult(worker_outcome=WorkerOutcome.NORMAL, test_outcome=TOutcome.SURVIVED))
+        other.set_result("job-1", _killed())
+        other.set_result("job-2", _killed())
+
+    with pytest.raises(ConflictingResultsError) as exc_info:
+        work_db.merge_results(other_db_path)
+
+    assert exc_info.value.conflicting_job_ids == ["job-0"]
+    assert exc_info.value.unknown_job_ids == ["job-2"]
+    assert dict(work_db.results) == {"job-0": _killed()}
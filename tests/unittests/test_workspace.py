@@ -0,0 +1,96 @@
+"Tests for workspace pools."
+
+import importlib.metadata
+import json
+import sys
+
+import pytest
+
+from cosmic_ray.mutating import mutate_and_test
+from cosmic_ray.work_item import MutationSpec, WorkerOutcome
+from cosmic_ray.work_item import TestOutcome as TOutcome  # We do this to prevent pytest from "collecting" TOutcome
+from cosmic_ray.workspace import WORKSPACES_DIR, WorkspacePool, editable_installs
+
+
+def _project(root):
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "mod.py").write_text("def value():\n    return 2 + 2\n")
+    (root / "test_mod.py").write_text("import sys\nfrom pkg import mod\nsys.exit(mod.value() != 4)\n")
+    return root
+
+
+def test_slots_share_unmutated_files(tmp_path):
+    project = _project(tmp_path / "project")
+    with WorkspacePool(project, 2, tmp_path) as pool:
+        for slot in pool.slots:
+            assert (slot.path / "pkg" / "mod.py").read_text() == (project / "pkg" / "mod.py").read_text()
+            assert (slot.path / "test_mod.py").stat().st_ino == (project / "test_mod.py").stat().st_ino
+        root = pool.slots[0].path.parent
+
+    assert not root.exists()
+
+
+def test_broken_out_files_are_private(tmp_path):
+    project = _project(tmp_path / "project")
+    with WorkspacePool(project, 1, tmp_path) as pool:
+        slot = pool.slots[0]
+        path = slot.break_out("pkg/mod.py")
+        assert path == slot.path / "pkg" / "mod.py"
+        path.write_text("changed")
+        assert (project / "pkg" / "mod.py").read_text() == "def value():\n    return 2 + 2\n"
+
+        slot.reset()
+        assert path.read_text() == "def value():\n    return 2 + 2\n"
+
+
+def test_mutate_and_test_in_slot(tmp_path, monkeypatch):
+    project = _project(tmp_path / "project")
+    monkeypatch.chdir(project)
+    mutation = MutationSpec("pkg/mod.py", "core/ReplaceBinaryOperator_Add_Mul", 0, (2, 13), (2, 14))
+    with WorkspacePool(project, 1, tmp_path) as pool:
+        result = mutate_and_test([mutation], f"{sys.executable} test_mod.py", 30, workspace=pool.slots[0])
+
+    assert result.worker_outcome == WorkerOutcome.NORMAL
+    assert result.test_outcome == TOutcome.SURVIVED
+    assert "--- apkg/mod.py" in result.diff
+
+    mutation = MutationSpec("pkg/mod.py", "core/ReplaceBinaryOperator_Add_Sub", 0, (2, 13), (2, 14))
+    with WorkspacePool(project, 1, tmp_path) as pool:
+        result = mutate_and_test([mutation], f"{sys.executable} test_mod.py", 30, workspace=pool.slots[0])
+
+    assert result.test_outcome == TOutcome.KILLED
+    assert (project / "pkg" / "mod.py").read_text() == "def value():\n    return 2 + 2\n"
+
+
+def test_slots_are_in_the_project_by_default(tmp_path):
+    project = _project(tmp_path / "project")
+    with WorkspacePool(project, 2) as pool:
+        assert all(slot.path.parent.parent == project / WORKSPACES_DIR for slot in pool.slots)
+        # Slots don't contain the other slots.
+        assert not (pool.slots[1].path / WORKSPACES_DIR).exists()
+
+    assert not (project / WORKSPACES_DIR).exists()
+
+
+class _Distribution:
+    def __init__(self, name, direct_url):
+        self.metadata = {"Name": name}
+        self._direct_url = direct_url
+
+    def read_text(self, filename):
+        return json.dumps(self._direct_url) if filename == "direct_url.json" and self._direct_url else None
+
+
+def test_editable_installs_of_the_project_are_refused(tmp_path, monkeypatch):
+    project = _project(tmp_path / "project")
+    distributions = [
+        _Distribution("project", {"url": project.as_uri(), "dir_info": {"editable": True}}),
+        _Distribution("installed", {"url": project.as_uri(), "dir_info": {}}),
+        _Distribution("elsewhere", {"url": tmp_path.as_uri(), "dir_info": {"editable": True}}),
+        _Distribution("from-pypi", None),
+    ]
+    monkeypatch.setattr(importlib.metadata, "distributions", lambda: distributions)
+
+    assert editable_installs(project) == ["project"]
+    with pytest.raises(ValueError, match="project installed in editable mode"):
+        WorkspacePool(project, 1, tmp_path)